@@ -1 +1,2 @@
-from .api import app, configure_api_app
+from .api import app, configure_api_app, start_warm_up
+from .warmup import WarmUp, read_warm_up_queries
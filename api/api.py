@@ -1,17 +1,144 @@
 from enum import Enum, unique
 from datetime import date
+import hmac
 from typing import List, Optional
 
-from fastapi import FastAPI, Query, Path
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Query, Path, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
 
 from gazettes import GazetteAccessInterface, GazetteRequest
+from monitoring import (
+    BlockingCallMiddleware,
+    BlockingCallSettings,
+    EventLoopMonitor,
+    MetricsMiddleware,
+    QueryStatistics,
+    ServerTimingMiddleware,
+    SamplingProfiler,
+    ServerTimingSettings,
+    TracingMiddleware,
+    counter,
+    elasticsearch_profiles,
+    gauge,
+    record_timing,
+    set_span_attribute,
+    span,
+    start_elasticsearch_profiling,
+    stop_elasticsearch_profiling,
+    timed,
+)
+from monitoring.event_loop import DEFAULT_THRESHOLD_MS as DEFAULT_STALL_THRESHOLD_MS
+from monitoring.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render
+from .caching import conditional_response, create_etag, http_date
+from .compression import (
+    DEFAULT_BROTLI_LEVEL,
+    DEFAULT_GZIP_LEVEL,
+    DEFAULT_MINIMUM_SIZE,
+    DEFAULT_RESPONSE_CACHE_SIZE,
+    CachedResponse,
+    CompressionMiddleware,
+    CompressionSettings,
+    ResponseCache,
+    negotiate_encoding,
+)
+from .health import DEFAULT_INTERVAL as DEFAULT_HEALTH_CHECK_INTERVAL, HealthMonitor
+from .serialization import JSON, compact, negotiate_media_type, serialize
+from .warmup import WarmUp, save_top_queries
 
 app = FastAPI(
     title="Querido Diário",
     description="API to access the gazettes from all Brazilian cities",
     version="0.10.0",
 )
+app.compression = CompressionSettings()
+app.response_cache = ResponseCache()
+app.server_timing = ServerTimingSettings()
+app.blocking_calls = BlockingCallSettings()
+app.event_loop_monitor = EventLoopMonitor()
+app.query_statistics = QueryStatistics()
+# Where the top queries are saved at the shutdown. Empty disables it.
+app.top_queries_file = ""
+app.warm_up = WarmUp()
+app.health = HealthMonitor()
+# Empty disables the admin features
+app.admin_token = ""
+app.add_middleware(CompressionMiddleware, settings=app.compression)
+app.add_middleware(ServerTimingMiddleware, settings=app.server_timing)
+app.add_middleware(BlockingCallMiddleware, settings=app.blocking_calls)
+# Added after the compression, so it wraps it and records the bytes sent
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+
+
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    app.event_loop_monitor.start()
+
+
+@app.on_event("shutdown")
+async def stop_event_loop_monitor():
+    await app.event_loop_monitor.stop()
+
+
+def check_health():
+    return app.gazettes.get_health()
+
+
+@app.on_event("startup")
+def start_health_monitor():
+    app.health.start()
+
+
+@app.on_event("shutdown")
+def stop_health_monitor():
+    app.health.stop()
+
+
+@app.on_event("shutdown")
+def store_top_queries():
+    if app.top_queries_file:
+        save_top_queries(app.top_queries_file, app.query_statistics)
+
+
+RESPONSE_CACHE_LOOKUPS = counter(
+    "querido_diario_response_cache_lookups",
+    "Lookups in the response cache by result (hit or miss)",
+    ("result",),
+)
+RESPONSE_CACHE_HITS = RESPONSE_CACHE_LOOKUPS.labels("hit")
+RESPONSE_CACHE_MISSES = RESPONSE_CACHE_LOOKUPS.labels("miss")
+
+
+def response_cache_hit_ratio():
+    lookups = RESPONSE_CACHE_HITS.value + RESPONSE_CACHE_MISSES.value
+    return RESPONSE_CACHE_HITS.value / lookups if lookups > 0 else 0.0
+
+
+gauge(
+    "querido_diario_response_cache_hit_ratio",
+    "Fraction of the response cache lookups which were hits",
+).set_function(response_cache_hit_ratio)
+gauge(
+    "querido_diario_response_cache_entries", "Responses stored in the response cache"
+).set_function(lambda: len(app.response_cache))
+
+
+@unique
+class CityLevel(str, Enum):
+    ZERO = "0"
+    ONE = "1"
+    TWO = "2"
+    THREE = "3"
+
+
+class City(BaseModel):
+    territory_id: str
+    territory_name: str
+    state_code: str
+    publication_urls: Optional[List[str]]
+    level: CityLevel
 
 
 class GazetteItem(BaseModel):
@@ -24,6 +151,8 @@ class GazetteItem(BaseModel):
     edition: Optional[str]
     is_extra_edition: Optional[bool]
     file_raw_txt: Optional[str]
+    copies: Optional[int]
+    city: Optional[City]
 
 
 class GazetteSearchResponse(BaseModel):
@@ -31,27 +160,249 @@ class GazetteSearchResponse(BaseModel):
     gazettes: List[GazetteItem]
 
 
-@unique
-class CityLevel(str, Enum):
-    ZERO = "0"
-    ONE = "1"
-    TWO = "2"
-    THREE = "3"
+class CitiesSearchResponse(BaseModel):
+    cities: List[City]
 
 
-class City(BaseModel):
+class CitySuggestion(BaseModel):
     territory_id: str
     territory_name: str
     state_code: str
-    publication_urls: Optional[List[str]]
     level: CityLevel
 
 
-class CitiesSearchResponse(BaseModel):
-    cities: List[City]
+class CitySuggestionsResponse(BaseModel):
+    cities: List[CitySuggestion]
+
+
+class CitiesBatchRequest(BaseModel):
+    territory_ids: List[str] = Field(
+        ...,
+        min_items=1,
+        max_items=1000,
+        title="IBGE ids of the cities",
+        description="IBGE ids of the cities to return. Unknown ids are ignored",
+    )
+
+
+def response_fields(model):
+    """
+    Fields of the model in the format used by compact
+    """
+    return {
+        name: response_fields(field.type_)
+        if isinstance(field.type_, type) and issubclass(field.type_, BaseModel)
+        else None
+        for name, field in model.__fields__.items()
+    }
+
+
+# The cities data changes rarely. Suggestions are requested on every keystroke,
+# so let the clients and proxies cache them.
+SUGGESTIONS_CACHE_CONTROL = "public, max-age=3600"
+# The cities data only changes when the census file changes.
+CITY_CACHE_CONTROL = "public, max-age=86400"
+# New gazettes are indexed during the day. Clients revalidate with the ETag.
+GAZETTES_CACHE_CONTROL = "public, max-age=300"
+
+
+def request_media_type(request: Request, response: Response):
+    """
+    Media type negotiated from the Accept header. The responses change with
+    the header, so it is added to Vary.
+    """
+    response.headers["Vary"] = "Accept"
+    return negotiate_media_type(request.headers.get("accept", ""))
+
+
+def representation(parameters: dict, media_type: str):
+    """
+    Parameters used in the ETag. The media type is added only for the binary
+    representations, so the JSON ETags do not change.
+    """
+    if media_type == JSON:
+        return parameters
+    return {**parameters, "media_type": media_type}
+
+
+def cities_conditional_response(
+    request: Request,
+    response: Response,
+    cache_control: str,
+    parameters: dict,
+    media_type: str = JSON,
+):
+    last_modified = app.gazettes.get_cities_last_modified()
+    etag = None
+    if last_modified is not None:
+        etag = create_etag(
+            http_date(last_modified),
+            representation({"path": request.url.path, **parameters}, media_type),
+        )
+    return conditional_response(request, response, cache_control, etag, last_modified)
+
+
+def binary_response(response: Response, media_type: str, content: dict, model):
+    """
+    Encode the internal result structures straight to MessagePack or CBOR,
+    without the validation done for JSON responses.
+    """
+    with timed("serialize", media_type):
+        body = serialize(compact(content, response_fields(model)), media_type)
+    return Response(body, media_type=media_type, headers=response.headers)
+
+
+def serialized_response(content: dict, media_type: str, response_model):
+    with timed("serialize", media_type):
+        if media_type == JSON:
+            content = jsonable_encoder(
+                response_model(**content), exclude_unset=True, exclude_none=True,
+            )
+            body = JSONResponse(content).body
+        else:
+            body = serialize(
+                compact(content, response_fields(response_model)), media_type
+            )
+    return CachedResponse(body, media_type)
+
+
+def cached_response(
+    request: Request,
+    response: Response,
+    etag: str,
+    media_type: str,
+    response_model,
+    create_content,
+):
+    """
+    Return the response stored in the response cache with the given ETag,
+    compressed as the client accepts. On a miss, create_content is called and
+    its serialized result is cached. Nothing is cached without ETag.
+    """
+    entry = None
+    if etag is not None:
+        entry = app.response_cache.get(etag)
+        (RESPONSE_CACHE_MISSES if entry is None else RESPONSE_CACHE_HITS).inc()
+        record_timing("cache", 0, "miss" if entry is None else "hit")
+        set_span_attribute("response_cache", "miss" if entry is None else "hit")
+    if entry is None:
+        entry = serialized_response(create_content(), media_type, response_model)
+        if etag is not None:
+            app.response_cache.put(etag, entry)
+    encoding = negotiate_encoding(
+        request.headers.get("accept-encoding", ""), app.compression.encodings
+    )
+    body, encoding = entry.variant(encoding, app.compression)
+    cached = Response(body, media_type=entry.media_type, headers=response.headers)
+    if encoding is not None:
+        cached.headers["Content-Encoding"] = encoding
+    cached.headers.add_vary_header("Accept-Encoding")
+    return cached
+
+
+ADMIN_CACHE_CONTROL = "no-store"
+PROBE_CACHE_CONTROL = "no-store"
+
 
+def query_flag(request: Request, name: str):
+    return request.query_params.get(name, "").lower() in ("1", "true")
 
+
+def is_admin(request: Request):
+    """
+    Check the token in the Authorization header: Bearer <admin token>
+    """
+    if not app.admin_token:
+        return False
+    authorization = request.headers.get("authorization", "")
+    return hmac.compare_digest(
+        authorization.encode("utf-8"), f"Bearer {app.admin_token}".encode("utf-8")
+    )
+
+
+def admin_mode(request: Request):
+    """
+    Return "profile" or "dry_run" when the search has been requested with
+    the _profile or the _dry_run query parameter. They are not in the API
+    schema and require the admin token.
+    """
+    mode = None
+    if query_flag(request, "_profile"):
+        mode = "profile"
+    elif query_flag(request, "_dry_run"):
+        mode = "dry_run"
+    if mode is not None and not is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    return mode
+
+
+def profiled_response(search):
+    """
+    Run the search with the Python code sampled and the Elasticsearch
+    profile enabled, and add both to the response in the _profile field
+    """
+    token = start_elasticsearch_profiling()
+    try:
+        with SamplingProfiler() as profiler:
+            content = jsonable_encoder(
+                GazetteSearchResponse(**search()),
+                exclude_unset=True,
+                exclude_none=True,
+            )
+        content["_profile"] = {
+            "python": profiler.result(),
+            "elasticsearch": elasticsearch_profiles(),
+        }
+    finally:
+        stop_elasticsearch_profiling(token)
+    return JSONResponse(content, headers={"Cache-Control": ADMIN_CACHE_CONTROL})
+
+
+def gazettes_etag(filters: GazetteRequest, media_type: str):
+    """
+    ETag of the search response. None when the index has no version.
+    """
+    version = app.gazettes.get_gazettes_version()
+    if filters.include_city:
+        last_modified = app.gazettes.get_cities_last_modified()
+        version = f"{version}-{last_modified}" if version is not None else None
+    if version is None:
+        return None
+    return create_etag(version, representation(vars(filters), media_type))
+
+
+def search_gazettes(filters: GazetteRequest):
+    gazettes_count, gazettes = app.gazettes.get_gazettes(filters)
+    search_response = {
+        "total_gazettes": 0,
+        "gazettes": [],
+    }
+    if gazettes_count > 0 and gazettes:
+        search_response["gazettes"] = gazettes
+        search_response["total_gazettes"] = gazettes_count
+    return search_response
+
+
+def warm_up_gazettes_search(filters: GazetteRequest):
+    """
+    Run the search and store its JSON response in the response cache, as
+    the first request without conditional headers would
+    """
+    etag = gazettes_etag(filters, JSON)
+    if etag is not None and etag in app.response_cache:
+        return
+    entry = serialized_response(search_gazettes(filters), JSON, GazetteSearchResponse)
+    for encoding in app.compression.encodings:
+        entry.variant(encoding, app.compression)
+    if etag is not None:
+        app.response_cache.put(etag, entry)
+
+
+@span("api.trigger_gazettes_search")
+@timed("search", "trigger_gazettes_search")
 def trigger_gazettes_search(
+    request: Request,
+    response: Response,
     territory_id: str = None,
     since: date = None,
     until: date = None,
@@ -62,29 +413,45 @@ def trigger_gazettes_search(
     number_of_fragments: int = 1,
     pre_tags: List[str] = [""],
     post_tags: List[str] = [""],
+    collapse: bool = False,
+    include_city: bool = False,
 ):
-    gazettes_count, gazettes = app.gazettes.get_gazettes(
-        GazetteRequest(
-            territory_id,
-            since=since,
-            until=until,
-            keywords=keywords,
-            offset=offset,
-            size=size,
-            fragment_size=fragment_size,
-            number_of_fragments=number_of_fragments,
-            pre_tags=pre_tags,
-            post_tags=post_tags,
+    media_type = request_media_type(request, response)
+    filters = GazetteRequest(
+        territory_id,
+        since=since,
+        until=until,
+        keywords=keywords,
+        offset=offset,
+        size=size,
+        fragment_size=fragment_size,
+        number_of_fragments=number_of_fragments,
+        pre_tags=pre_tags,
+        post_tags=post_tags,
+        collapse=collapse,
+        include_city=include_city,
+    )
+    mode = admin_mode(request)
+    if mode is None:
+        app.query_statistics.record(vars(filters))
+    if mode == "dry_run":
+        return JSONResponse(
+            jsonable_encoder(app.gazettes.explain_gazettes(filters)),
+            headers={"Cache-Control": ADMIN_CACHE_CONTROL},
         )
+    etag = gazettes_etag(filters, media_type)
+    not_modified = conditional_response(request, response, GAZETTES_CACHE_CONTROL, etag)
+    if not_modified is not None:
+        return not_modified
+
+    def search():
+        return search_gazettes(filters)
+
+    if mode == "profile":
+        return profiled_response(search)
+    return cached_response(
+        request, response, etag, media_type, GazetteSearchResponse, search
     )
-    response = {
-        "total_gazettes": 0,
-        "gazettes": [],
-    }
-    if gazettes_count > 0 and gazettes:
-        response["gazettes"] = gazettes
-        response["total_gazettes"] = gazettes_count
-    return response
 
 
 @app.get(
@@ -96,6 +463,8 @@ def trigger_gazettes_search(
     response_model_exclude_none=True,
 )
 async def get_gazettes(
+    request: Request,
+    response: Response,
     since: Optional[date] = Query(
         None,
         title="Since date",
@@ -139,8 +508,20 @@ async def get_gazettes(
         title="Post tags of fragments of highlight.",
         description="Post tags of fragments of highlight. This is a list of strings (usually HTML tags) that will appear after the text which matches the query",
     ),
+    collapse: bool = Query(
+        False,
+        title="Return each gazette file once",
+        description="Return only one item for gazette files indexed more than once (e.g. republished editions). The number of indexed documents for the file is returned in the copies field",
+    ),
+    include_city: bool = Query(
+        False,
+        title="Include the city data",
+        description="Add the city of each gazette, with its openness level and publication URLs, in the city field",
+    ),
 ):
     return trigger_gazettes_search(
+        request,
+        response,
         None,
         since,
         until,
@@ -151,6 +532,8 @@ async def get_gazettes(
         number_of_fragments,
         pre_tags,
         post_tags,
+        collapse,
+        include_city,
     )
 
 
@@ -163,6 +546,8 @@ async def get_gazettes(
     response_model_exclude_none=True,
 )
 async def get_gazettes_by_territory_id(
+    request: Request,
+    response: Response,
     territory_id: str = Path(..., description="City's IBGE ID"),
     since: Optional[date] = Query(
         None,
@@ -207,8 +592,20 @@ async def get_gazettes_by_territory_id(
         title="Post tags of fragments of highlight.",
         description="Post tags of fragments of highlight. This is a list of strings (usually HTML tags) that will appear after the text which matches the query",
     ),
+    collapse: bool = Query(
+        False,
+        title="Return each gazette file once",
+        description="Return only one item for gazette files indexed more than once (e.g. republished editions). The number of indexed documents for the file is returned in the copies field",
+    ),
+    include_city: bool = Query(
+        False,
+        title="Include the city data",
+        description="Add the city of each gazette, with its openness level and publication URLs, in the city field",
+    ),
 ):
     return trigger_gazettes_search(
+        request,
+        response,
         territory_id,
         since,
         until,
@@ -219,6 +616,8 @@ async def get_gazettes_by_territory_id(
         number_of_fragments,
         pre_tags,
         post_tags,
+        collapse,
+        include_city,
     )
 
 
@@ -230,15 +629,224 @@ async def get_gazettes_by_territory_id(
     response_model_exclude_unset=True,
     response_model_exclude_none=True,
 )
-async def get_cities(city_name: str):
-    cities = app.gazettes.get_cities(city_name)
+async def get_cities(
+    request: Request,
+    response: Response,
+    city_name: str,
+    limit: Optional[int] = Query(
+        None,
+        ge=1,
+        title="Number of cities to return",
+        description="Define the maximum number of cities returned. The most relevant cities come first",
+    ),
+):
+    media_type = request_media_type(request, response)
+    not_modified = cities_conditional_response(
+        request,
+        response,
+        CITY_CACHE_CONTROL,
+        {"city_name": city_name, "limit": limit},
+        media_type,
+    )
+    if not_modified is not None:
+        return not_modified
+    return cached_response(
+        request,
+        response,
+        response.headers.get("etag"),
+        media_type,
+        CitiesSearchResponse,
+        lambda: {"cities": app.gazettes.get_cities(city_name, limit)},
+    )
+
+
+@app.get(
+    "/cities/suggest",
+    response_model=CitySuggestionsResponse,
+    name="Suggest cities while the user types",
+    description="Get the most relevant cities with the name, a word in the name or the state code starting with the prefix",
+)
+async def suggest_cities(
+    request: Request,
+    response: Response,
+    prefix: str = Query(
+        ..., min_length=1, title="Prefix of the city name or the state code",
+    ),
+    limit: int = Query(10, ge=1, le=50, title="Number of cities to return",),
+):
+    media_type = request_media_type(request, response)
+    not_modified = cities_conditional_response(
+        request,
+        response,
+        SUGGESTIONS_CACHE_CONTROL,
+        {"prefix": prefix, "limit": limit},
+        media_type,
+    )
+    if not_modified is not None:
+        return not_modified
+    cities = app.gazettes.suggest_cities(prefix, limit)
+    if media_type != JSON:
+        return binary_response(
+            response, media_type, {"cities": cities}, CitySuggestionsResponse
+        )
+    return {"cities": cities}
+
+
+@app.get(
+    "/cities/{territory_id}",
+    response_model=City,
+    name="Get the city with the given IBGE id",
+    description="Get the city with the given IBGE id",
+    response_model_exclude_unset=True,
+    response_model_exclude_none=True,
+    responses={404: {"description": "City not found"}},
+)
+async def get_city(
+    request: Request,
+    response: Response,
+    territory_id: str = Path(..., description="City's IBGE ID"),
+):
+    media_type = request_media_type(request, response)
+    not_modified = cities_conditional_response(
+        request, response, CITY_CACHE_CONTROL, {}, media_type
+    )
+    if not_modified is not None:
+        return not_modified
+    city = app.gazettes.get_city(territory_id)
+    if city is None:
+        raise HTTPException(status_code=404, detail="City not found")
+    if media_type != JSON:
+        return binary_response(response, media_type, city, City)
+    return city
+
+
+@app.post(
+    "/cities/_batch",
+    response_model=CitiesSearchResponse,
+    name="Get the cities with the given IBGE ids",
+    description="Get the cities with the given IBGE ids in the same order. Unknown and repeated ids are ignored",
+    response_model_exclude_unset=True,
+    response_model_exclude_none=True,
+)
+async def get_cities_by_ids(
+    http_request: Request, response: Response, request: CitiesBatchRequest
+):
+    media_type = request_media_type(http_request, response)
+    cities = app.gazettes.get_cities_by_ids(request.territory_ids)
+    last_modified = app.gazettes.get_cities_last_modified()
+    response.headers["Cache-Control"] = CITY_CACHE_CONTROL
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+    if media_type != JSON:
+        return binary_response(
+            response, media_type, {"cities": cities}, CitiesSearchResponse
+        )
     return {"cities": cities}
 
 
-def configure_api_app(gazettes: GazetteAccessInterface, api_root_path=None):
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return PlainTextResponse(render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.get("/health", include_in_schema=False)
+async def get_health():
+    """
+    Liveness: the process answers. It does not depend on Elasticsearch, so
+    the pods are not restarted when the cluster is down.
+    """
+    return JSONResponse(
+        {"status": "ok"}, headers={"Cache-Control": PROBE_CACHE_CONTROL}
+    )
+
+
+@app.get("/ready", include_in_schema=False)
+async def get_ready():
+    """
+    Readiness, from the last health snapshot taken in the background and the
+    warm-up. 503 while any check fails. The errors are only logged, as the
+    endpoint is public.
+    """
+    checks = app.health.readiness()
+    checks["warm_up"] = app.warm_up.ready
+    ready = all(checks.values())
+    snapshot = app.health.snapshot or {}
+    return JSONResponse(
+        {
+            "status": "ready" if ready else "not_ready",
+            "checks": checks,
+            "checked_at": snapshot.get("checked_at"),
+            "warm_up": {
+                "status": app.warm_up.status(),
+                "queries": len(app.warm_up.queries),
+                "warmed": app.warm_up.warmed,
+                "failed": app.warm_up.failed,
+            },
+        },
+        status_code=200 if ready else 503,
+        headers={"Cache-Control": PROBE_CACHE_CONTROL},
+    )
+
+
+@app.get("/stats/top-queries", include_in_schema=False)
+async def get_top_queries(
+    request: Request, limit: Optional[int] = Query(None, ge=1),
+):
+    """
+    Most frequent searches, territories and keywords since the start. The
+    counts are estimates, above the real ones by at most error_bound (98%
+    of the time with the default sketch).
+    """
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    return JSONResponse(
+        app.query_statistics.report(limit),
+        headers={"Cache-Control": ADMIN_CACHE_CONTROL},
+    )
+
+
+def configure_api_app(
+    gazettes: GazetteAccessInterface,
+    api_root_path=None,
+    compression_minimum_size: int = DEFAULT_MINIMUM_SIZE,
+    gzip_level: int = DEFAULT_GZIP_LEVEL,
+    brotli_level: int = DEFAULT_BROTLI_LEVEL,
+    response_cache_size: int = DEFAULT_RESPONSE_CACHE_SIZE,
+    server_timing: bool = False,
+    admin_token: str = "",
+    event_loop_stall_threshold_ms: float = DEFAULT_STALL_THRESHOLD_MS,
+    top_queries_file: str = "",
+    health_check_interval: float = DEFAULT_HEALTH_CHECK_INTERVAL,
+):
     if not isinstance(gazettes, GazetteAccessInterface):
         raise Exception("Only GazetteAccessInterface object are accepted")
     if api_root_path is not None and type(api_root_path) != str:
         raise Exception("Invalid api_root_path")
+    if not 0 <= gzip_level <= 9:
+        raise Exception("Invalid gzip_level")
+    if not 0 <= brotli_level <= 11:
+        raise Exception("Invalid brotli_level")
     app.gazettes = gazettes
     app.root_path = api_root_path
+    app.compression.minimum_size = compression_minimum_size
+    app.compression.gzip_level = gzip_level
+    app.compression.brotli_level = brotli_level
+    app.response_cache = ResponseCache(response_cache_size)
+    app.query_statistics = QueryStatistics()
+    app.top_queries_file = top_queries_file
+    app.warm_up = WarmUp()
+    app.health.stop()
+    app.health = HealthMonitor(check_health, health_check_interval)
+    app.server_timing.enabled = server_timing
+    app.admin_token = admin_token
+    app.event_loop_monitor.threshold_ms = event_loop_stall_threshold_ms
+
+
+def start_warm_up(queries: List[GazetteRequest], budget: float):
+    """
+    Warm up the caches with the queries in a thread. The API is not ready
+    until it finishes or the budget (seconds) runs out.
+    """
+    app.warm_up = WarmUp(queries, warm_up_gazettes_search, budget)
+    app.warm_up.start()
+    return app.warm_up
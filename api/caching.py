@@ -0,0 +1,93 @@
+from datetime import datetime
+from email.utils import format_datetime, parsedate_to_datetime
+from hashlib import sha1
+import json
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+def create_etag(version: str, request: dict):
+    """
+    Create a weak ETag from the data version and the canonical request (the
+    parsed parameters). Weak, because the same content can be sent with
+    different encodings.
+    """
+    canonical = json.dumps(
+        {"version": version, "request": request}, sort_keys=True, default=str
+    )
+    return f'W/"{sha1(canonical.encode("utf-8")).hexdigest()}"'
+
+
+def http_date(moment: datetime):
+    return format_datetime(moment, usegmt=True)
+
+
+def etag_matches(if_none_match: str, etag: str):
+    """
+    Weak comparison of the ETag with the If-None-Match header value
+    """
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque_tag:
+            return True
+    return False
+
+
+def not_modified_since(if_modified_since: str, last_modified: datetime):
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since is None or since.tzinfo is None:
+        return False
+    return last_modified.replace(microsecond=0) <= since
+
+
+def add_cache_headers(
+    response: Response,
+    cache_control: str,
+    etag: str = None,
+    last_modified: datetime = None,
+):
+    response.headers["Cache-Control"] = cache_control
+    if etag is not None:
+        response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+
+
+def conditional_response(
+    request: Request,
+    response: Response,
+    cache_control: str,
+    etag: str = None,
+    last_modified: datetime = None,
+):
+    """
+    Add the validators and the Cache-Control to the response. Return a 304
+    response when the client already has the current representation.
+    Otherwise, None and the request should be processed.
+
+    If-Modified-Since is ignored when the request has If-None-Match.
+    """
+    add_cache_headers(response, cache_control, etag, last_modified)
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        modified = etag is None or not etag_matches(if_none_match, etag)
+    elif request.headers.get("if-modified-since") is not None:
+        modified = last_modified is None or not not_modified_since(
+            request.headers["if-modified-since"], last_modified
+        )
+    else:
+        modified = True
+    if modified:
+        return None
+    not_modified = Response(status_code=304)
+    add_cache_headers(not_modified, cache_control, etag, last_modified)
+    return not_modified
@@ -0,0 +1,199 @@
+from collections import OrderedDict
+import gzip
+import threading
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from monitoring import timed
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MINIMUM_SIZE = 500
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_LEVEL = 5
+DEFAULT_RESPONSE_CACHE_SIZE = 1000
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/msgpack",
+    "application/cbor",
+    "text/",
+)
+
+
+class CompressionSettings:
+    """
+    Compression used in the API responses. Brotli is available only when the
+    brotli package is installed.
+    """
+
+    def __init__(
+        self,
+        minimum_size: int = DEFAULT_MINIMUM_SIZE,
+        gzip_level: int = DEFAULT_GZIP_LEVEL,
+        brotli_level: int = DEFAULT_BROTLI_LEVEL,
+    ):
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_level = brotli_level
+
+    @property
+    def encodings(self):
+        """
+        Available encodings in the order of preference
+        """
+        return ("br", "gzip") if brotli is not None else ("gzip",)
+
+    def compress(self, body: bytes, encoding: str):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_level)
+        if encoding == "gzip":
+            return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        raise Exception(f"Unsupported encoding: {encoding}")
+
+
+def negotiate_encoding(accept_encoding: str, encodings):
+    """
+    Choose the encoding from the Accept-Encoding header value. The greatest
+    quality wins and ties are decided by the order of encodings. None means
+    the response should not be compressed.
+    """
+    if not accept_encoding:
+        return None
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, parameters = item.strip().partition(";")
+        quality = 1.0
+        parameter, _, value = parameters.strip().partition("=")
+        if parameter.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    best = None
+    best_quality = 0.0
+    for encoding in encodings:
+        quality = qualities.get(encoding, qualities.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CachedResponse:
+    """
+    Serialized response body and its compressed variants. Each variant is
+    compressed once, when it is requested for the first time.
+    """
+
+    __slots__ = ("body", "media_type", "variants", "_lock")
+
+    def __init__(self, body: bytes, media_type: str):
+        self.body = body
+        self.media_type = media_type
+        self.variants = {}
+        self._lock = threading.Lock()
+
+    def variant(self, encoding: str, settings: CompressionSettings):
+        if encoding is None or len(self.body) < settings.minimum_size:
+            return self.body, None
+        with self._lock:
+            if encoding not in self.variants:
+                with timed("compress", encoding):
+                    self.variants[encoding] = settings.compress(self.body, encoding)
+        return self.variants[encoding], encoding
+
+
+class ResponseCache:
+    """
+    LRU cache of serialized responses. The keys are the ETags, which already
+    change when the data or the request change.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str):
+        return key in self._entries
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: str, entry: CachedResponse):
+        if self.max_entries <= 0:
+            return entry
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CompressionMiddleware:
+    """
+    Compress the responses not compressed by the endpoints when the client
+    accepts it and the body is bigger than the minimum size.
+    """
+
+    def __init__(self, app, settings: CompressionSettings):
+        self.app = app
+        self.settings = settings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(
+            Headers(scope=scope).get("accept-encoding", ""), self.settings.encodings
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start_message = None
+        body = []
+
+        async def compress_response(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            body.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+            content = b"".join(body)
+            headers = MutableHeaders(raw=start_message["headers"])
+            if (
+                len(content) >= self.settings.minimum_size
+                and "content-encoding" not in headers
+                and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            ):
+                with timed("compress", encoding):
+                    content = self.settings.compress(content, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(content))
+                headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": content})
+
+        await self.app(scope, receive, compress_response)
@@ -0,0 +1,85 @@
+"""
+Health of the dependencies, checked in the background.
+
+Kubernetes probes every pod every few seconds. Checking Elasticsearch and the
+database on each probe would add load to them proportional to the number of
+pods, so a thread checks them every interval seconds and the probes read the
+last snapshot.
+"""
+import logging
+import threading
+import time
+from typing import Callable
+
+DEFAULT_INTERVAL = 5
+# Snapshots older than this number of intervals are not trusted: the thread
+# checking the health is stuck or gone
+STALE_INTERVALS = 3
+READY_STATUSES = ("green", "yellow")
+
+
+class HealthMonitor:
+    """
+    Call check every interval seconds and keep its result in snapshot, with
+    the time it was taken. The exceptions are kept in the snapshot error.
+    """
+
+    def __init__(self, check: Callable[[], dict] = None, interval=DEFAULT_INTERVAL):
+        self.check = check
+        self.interval = interval
+        self.snapshot = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def refresh(self):
+        try:
+            state = {"error": None, **self.check()}
+        except Exception as exception:
+            logging.exception("Health check failed")
+            state = {"error": f"{type(exception).__name__}: {exception}"}
+        self.snapshot = {"checked_at": time.time(), **state}
+        return self.snapshot
+
+    def start(self):
+        if self.check is None or self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._refresh_periodically, name="health-check", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._thread.join(self.interval)
+        self._thread = None
+
+    def _refresh_periodically(self):
+        self.refresh()
+        while not self._stop.wait(self.interval):
+            self.refresh()
+
+    def readiness(self, now: float = None):
+        """
+        Checks of the last snapshot: Elasticsearch green or yellow, the index
+        created and the cities loaded. All False without a recent snapshot.
+        """
+        snapshot = self.snapshot
+        now = time.time() if now is None else now
+        if (
+            snapshot is None
+            or snapshot["error"] is not None
+            or now - snapshot["checked_at"] > STALE_INTERVALS * self.interval
+        ):
+            return {"elasticsearch": False, "index": False, "database": False}
+        return {
+            "elasticsearch": snapshot["index"]["status"] in READY_STATUSES,
+            "index": snapshot["index"]["index_exists"] is True,
+            "database": snapshot["database"]["cities"] > 0,
+        }
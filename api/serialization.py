@@ -0,0 +1,107 @@
+from datetime import date
+from enum import Enum
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+# Other names used by the clients for the same formats
+MEDIA_TYPE_ALIASES = {"application/x-msgpack": MSGPACK}
+
+
+def available_media_types():
+    """
+    Media types the API can send in the order of preference. JSON is the
+    default, so it wins the ties.
+    """
+    media_types = [JSON]
+    if msgpack is not None:
+        media_types.append(MSGPACK)
+    if cbor2 is not None:
+        media_types.append(CBOR)
+    return media_types
+
+
+def negotiate_media_type(accept: str, media_types=None):
+    """
+    Choose the media type from the Accept header value. JSON is returned when
+    the client accepts any type or none of the available ones.
+    """
+    media_types = media_types or available_media_types()
+    if not accept:
+        return JSON
+    qualities = {}
+    for item in accept.split(","):
+        media_type, *parameters = item.split(";")
+        media_type = media_type.strip().lower()
+        media_type = MEDIA_TYPE_ALIASES.get(media_type, media_type)
+        quality = 1.0
+        for parameter in parameters:
+            name, _, value = parameter.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type] = max(quality, qualities.get(media_type, 0.0))
+    best = JSON
+    best_quality = 0.0
+    for media_type in media_types:
+        quality = qualities.get(
+            media_type,
+            qualities.get(media_type.split("/")[0] + "/*", qualities.get("*/*", 0.0)),
+        )
+        if quality > best_quality:
+            best, best_quality = media_type, quality
+    return best
+
+
+def plain_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (list, tuple)):
+        return [plain_value(item) for item in value]
+    return value
+
+
+def compact(item: dict, fields: dict):
+    """
+    Return the given item with the same keys the JSON responses have: only
+    the fields in the response model and no null values. fields maps the
+    field names to the fields of the nested items, or None for plain values.
+    Dates are sent as ISO 8601 strings, as in JSON.
+    """
+    result = {}
+    for name, value in item.items():
+        if value is None or name not in fields:
+            continue
+        nested = fields[name]
+        if nested is None:
+            result[name] = plain_value(value)
+        elif isinstance(value, (list, tuple)):
+            result[name] = [compact(nested_item, nested) for nested_item in value]
+        else:
+            result[name] = compact(value, nested)
+    return result
+
+
+def serialize(content, media_type: str):
+    """
+    Encode the content with the given binary media type
+    """
+    if media_type == MSGPACK:
+        return msgpack.packb(content, use_bin_type=True)
+    if media_type == CBOR:
+        return cbor2.dumps(content)
+    raise Exception(f"Unsupported media type: {media_type}")
@@ -0,0 +1,177 @@
+"""
+Warm-up of the caches before the API reports it is ready.
+
+After a deploy, the first requests find the response cache empty and the
+Elasticsearch caches cold. The warm-up runs the most frequent searches,
+recorded in a query log or in the top queries saved by the previous process,
+before the readiness endpoint reports the API as ready. It runs in a thread,
+so the API answers meanwhile, and gives up when its time budget runs out.
+"""
+from datetime import date
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Iterable, List
+
+from gazettes import GazetteRequest
+from index import read_query_log
+from index.query_log import serialize_value
+from monitoring import QueryStatistics
+from monitoring.heavy_hitters import canonical_query
+
+DEFAULT_BUDGET = 60
+DEFAULT_MAX_QUERIES = 100
+
+REQUEST_FIELDS = (
+    "territory_id",
+    "since",
+    "until",
+    "keywords",
+    "offset",
+    "size",
+    "fragment_size",
+    "number_of_fragments",
+    "pre_tags",
+    "post_tags",
+    "collapse",
+    "include_city",
+)
+
+
+def parse_request(request: dict):
+    """
+    Search recorded in the query log or in the top queries file
+    """
+    parameters = {
+        field: request[field]
+        for field in REQUEST_FIELDS
+        if request.get(field) is not None
+    }
+    for field in ("since", "until"):
+        if field in parameters:
+            parameters[field] = date.fromisoformat(parameters[field])
+    return GazetteRequest(**parameters)
+
+
+def read_warm_up_queries(file_names: Iterable[str], max_queries: int):
+    """
+    The max_queries searches found most often in the files, which are query
+    logs or top queries files. The missing files are ignored.
+    """
+    counts = {}
+    for file_name in file_names:
+        if not file_name or not os.path.exists(file_name):
+            continue
+        for entry in read_query_log(file_name):
+            key = canonical_query(entry["request"])
+            counts[key] = counts.get(key, 0) + entry.get("count", 1)
+    queries = sorted(counts, key=lambda query: -counts[query])[:max_queries]
+    return [parse_request(json.loads(query)) for query in queries]
+
+
+def save_top_queries(file_name: str, statistics: QueryStatistics):
+    """
+    Write the most frequent searches in the format of the query log, so the
+    next process can warm up with them
+    """
+    temporary = f"{file_name}.tmp"
+    with open(temporary, "w", encoding="utf-8") as top_queries:
+        for request, count in statistics.top_queries():
+            entry = {"request": request, "count": count}
+            top_queries.write(
+                json.dumps(entry, default=serialize_value, ensure_ascii=False) + "\n"
+            )
+    os.replace(temporary, file_name)
+
+
+class WarmUp:
+    """
+    Run each query with warm_up_query until all of them have run or the
+    budget (seconds) runs out. Without queries, it is finished from the start.
+    """
+
+    def __init__(
+        self,
+        queries: List[GazetteRequest] = (),
+        warm_up_query: Callable[[GazetteRequest], None] = None,
+        budget: float = DEFAULT_BUDGET,
+    ):
+        self.queries = list(queries)
+        self.warm_up_query = warm_up_query
+        self.budget = budget
+        self.warmed = 0
+        self.failed = 0
+        self._started = None
+        self._out_of_budget = False
+        self._finished = threading.Event()
+        self._thread = None
+        if len(self.queries) == 0:
+            self._finished.set()
+
+    @property
+    def finished(self):
+        return self._finished.is_set()
+
+    @property
+    def timed_out(self):
+        if self.finished:
+            return self._out_of_budget
+        return (
+            self._started is not None
+            and time.monotonic() - self._started >= self.budget
+        )
+
+    @property
+    def ready(self):
+        """
+        True when the warm-up finished or its budget ran out, even if a
+        search is still running
+        """
+        return self.finished or self.timed_out
+
+    def status(self):
+        if self.timed_out:
+            return "timed_out"
+        if self.finished:
+            return "done"
+        return "pending" if self._started is None else "running"
+
+    def start(self):
+        if self.finished or self._thread is not None:
+            return
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self.run, name="warm-up", daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout: float = None):
+        return self._finished.wait(timeout)
+
+    def run(self):
+        self._started = self._started or time.monotonic()
+        try:
+            for query in self.queries:
+                if time.monotonic() - self._started >= self.budget:
+                    self._out_of_budget = True
+                    logging.warning(
+                        "Warm-up budget of %s s ran out after %d of %d searches",
+                        self.budget,
+                        self.warmed + self.failed,
+                        len(self.queries),
+                    )
+                    break
+                try:
+                    self.warm_up_query(query)
+                    self.warmed += 1
+                except Exception:
+                    self.failed += 1
+                    logging.exception("Warm-up search failed")
+            logging.info(
+                "Warm-up finished in %.1f s: %d searches, %d failed",
+                time.monotonic() - self._started,
+                self.warmed,
+                self.failed,
+            )
+        finally:
+            self._finished.set()
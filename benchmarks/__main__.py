@@ -0,0 +1,34 @@
+import pyperf
+
+from benchmarks import (
+    bench_api,
+    bench_compression,
+    bench_database,
+    bench_gazette_decoding,
+    bench_gazettes,
+    bench_index,
+    bench_monitoring,
+    bench_serialization,
+)
+
+BENCHMARK_MODULES = [
+    bench_index,
+    bench_gazette_decoding,
+    bench_gazettes,
+    bench_database,
+    bench_api,
+    bench_compression,
+    bench_serialization,
+    bench_monitoring,
+]
+
+
+def main():
+    runner = pyperf.Runner()
+    runner.metadata["description"] = "Querido Diário API hot paths"
+    for module in BENCHMARK_MODULES:
+        module.add_benchmarks(runner)
+
+
+if __name__ == "__main__":
+    main()
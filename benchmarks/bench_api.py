@@ -0,0 +1,71 @@
+import os
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from benchmarks.fixtures import census_file, create_mapper, generate_search_response
+from database.csv import CSVDatabase
+from gazettes import create_gazettes_interface
+
+HITS_COUNTS = [10, 100, 1000]
+GENERATION_RESPONSE = {
+    "hits": {"total": {"value": 1000, "relation": "eq"}, "hits": []},
+    "aggregations": {
+        "newest_date": {"value": 1609459200000, "value_as_string": "2021-01-01"}
+    },
+}
+
+
+def bench_get_gazettes(client, size, headers=None):
+    client.get(
+        "/gazettes/3304557",
+        params={"keywords": ["licitação"], "size": size},
+        headers=headers,
+    )
+
+
+def bench_get_gazettes_uncached(client, size, headers=None):
+    app.response_cache.clear()
+    bench_get_gazettes(client, size, headers)
+
+
+def add_benchmarks(runner):
+    """
+    Requests handled by the whole API stack with Elasticsearch answering
+    instantly. This is the time the API adds on top of the search itself.
+    The cached benchmarks are served from the response cache, already
+    compressed.
+    """
+    responses = {
+        hits_count: generate_search_response(hits_count) for hits_count in HITS_COUNTS
+    }
+    responses[0] = GENERATION_RESPONSE
+    mapper = create_mapper()
+    mapper._es.search.side_effect = lambda body, index: responses[body["size"]]
+    with patch.dict(os.environ, {"QUERIDO_DIARIO_DATABASE_CSV": census_file()}):
+        database = CSVDatabase()
+    configure_api_app(create_gazettes_interface(mapper, database))
+    client = TestClient(app)
+    gzip = {"Accept-Encoding": "gzip"}
+    for hits_count in HITS_COUNTS:
+        runner.bench_func(
+            f"api_get_gazettes[{hits_count}]",
+            bench_get_gazettes_uncached,
+            client,
+            hits_count,
+        )
+        runner.bench_func(
+            f"api_get_gazettes_gzip[{hits_count}]",
+            bench_get_gazettes_uncached,
+            client,
+            hits_count,
+            gzip,
+        )
+        runner.bench_func(
+            f"api_get_gazettes_cached_gzip[{hits_count}]",
+            bench_get_gazettes,
+            client,
+            hits_count,
+            gzip,
+        )
@@ -0,0 +1,55 @@
+import json
+import time
+
+from api.compression import CompressionSettings
+from benchmarks.fixtures import generate_gazettes, generate_census_rows
+
+HITS_COUNTS = [10, 100, 1000]
+GZIP_LEVELS = [1, 6, 9]
+BROTLI_LEVELS = [1, 5, 9]
+
+
+def response_bodies():
+    bodies = {}
+    for hits_count in HITS_COUNTS:
+        gazettes = generate_gazettes(hits_count)
+        bodies[f"gazettes_{hits_count}"] = json.dumps(
+            {"total_gazettes": hits_count, "gazettes": gazettes}, default=str
+        ).encode("utf-8")
+    bodies["cities"] = json.dumps({"cities": list(generate_census_rows())}).encode(
+        "utf-8"
+    )
+    return bodies
+
+
+def encoding_levels(settings):
+    for level in GZIP_LEVELS:
+        yield "gzip", level, CompressionSettings(gzip_level=level)
+    if "br" in settings.encodings:
+        for level in BROTLI_LEVELS:
+            yield "br", level, CompressionSettings(brotli_level=level)
+
+
+def add_benchmarks(runner):
+    """
+    CPU time to compress the API responses with each encoding and level. The
+    bytes saved are stored in the metadata, e.g. compression[gzip-6,cities].
+    """
+    bodies = response_bodies()
+    for encoding, level, settings in encoding_levels(CompressionSettings()):
+        for name, body in bodies.items():
+            start = time.perf_counter()
+            compressed = settings.compress(body, encoding)
+            elapsed = time.perf_counter() - start
+            runner.metadata[f"compression[{encoding}-{level},{name}]"] = (
+                f"{len(body)} -> {len(compressed)} bytes, "
+                f"{len(body) - len(compressed)} saved "
+                f"({1 - len(compressed) / len(body):.1%}), "
+                f"{elapsed * 1000:.2f} ms"
+            )
+            runner.bench_func(
+                f"compress_{encoding}_{level}[{name}]",
+                settings.compress,
+                body,
+                encoding,
+            )
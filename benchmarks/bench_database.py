@@ -0,0 +1,47 @@
+import os
+import tempfile
+from unittest.mock import patch
+
+from benchmarks.fixtures import census_file
+from database.csv import CSVDatabase
+from database.snapshot import SnapshotDatabase, compile_snapshot
+
+CITY_NAMES = ["são", "pira", "taquara", "sao paolo", "does not exist"]
+PREFIXES = ["s", "sa", "sao p", "sp"]
+
+
+def snapshot_file():
+    file_name = os.path.join(tempfile.gettempdir(), "querido-diario-censo.snapshot")
+    compile_snapshot(census_file(), file_name)
+    return file_name
+
+
+def open_snapshot(file_name):
+    SnapshotDatabase(file_name).close()
+
+
+def add_benchmarks(runner):
+    with patch.dict(os.environ, {"QUERIDO_DIARIO_DATABASE_CSV": census_file()}):
+        database = CSVDatabase(0)
+    snapshot_name = snapshot_file()
+    snapshot = SnapshotDatabase(snapshot_name)
+    runner.bench_func("csv_database_load", database.load)
+    runner.bench_func("snapshot_database_open", open_snapshot, snapshot_name)
+    for city_name in CITY_NAMES:
+        runner.bench_func(
+            f"csv_database_get_cities[{city_name}]", database.get_cities, city_name
+        )
+        runner.bench_func(
+            f"snapshot_database_get_cities[{city_name}]",
+            snapshot.get_cities,
+            city_name,
+        )
+    for prefix in PREFIXES:
+        runner.bench_func(
+            f"csv_database_suggest_cities[{prefix}]", database.suggest_cities, prefix
+        )
+        runner.bench_func(
+            f"snapshot_database_suggest_cities[{prefix}]",
+            snapshot.suggest_cities,
+            prefix,
+        )
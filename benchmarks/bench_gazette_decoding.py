@@ -0,0 +1,72 @@
+"""
+Compare the gazette decoding with the dict-backed representation used before
+Gazette had __slots__. Run the suite with --tracemalloc to compare the memory
+allocated by both.
+"""
+from datetime import datetime
+
+from benchmarks.fixtures import create_mapper, generate_search_response
+
+HITS_COUNT = 1000
+
+
+class DictGazette:
+    def __init__(
+        self,
+        territory_id,
+        date,
+        url,
+        checksum,
+        territory_name,
+        state_code,
+        highlight_texts,
+        edition=None,
+        is_extra_edition=None,
+        file_raw_txt=None,
+    ):
+        self.territory_id = territory_id
+        self.date = date
+        self.url = url
+        self.territory_name = territory_name
+        self.state_code = state_code
+        self.highlight_texts = highlight_texts
+        self.edition = edition
+        self.is_extra_edition = is_extra_edition
+        self.checksum = checksum
+        self.file_raw_txt = file_raw_txt
+
+
+def assemble_dict_gazette(gazette):
+    return DictGazette(
+        gazette["_source"]["territory_id"],
+        datetime.strptime(gazette["_source"]["date"], "%Y-%m-%d").date(),
+        gazette["_source"]["url"],
+        gazette["_source"]["file_checksum"],
+        gazette["_source"]["territory_name"],
+        gazette["_source"]["state_code"],
+        gazette["highlight"].get("source_text", []) if "highlight" in gazette else [],
+        gazette["_source"].get("edition_number", None),
+        gazette["_source"].get("is_extra_edition", None),
+        gazette["_source"].get("file_raw_txt", None),
+    )
+
+
+def decode_dict_gazettes(hits):
+    return [vars(assemble_dict_gazette(hit)) for hit in hits]
+
+
+def decode_gazettes(mapper, hits):
+    return [
+        gazette.as_dict() for gazette in mapper.create_list_with_gazette_objects(hits)
+    ]
+
+
+def add_benchmarks(runner):
+    mapper = create_mapper()
+    hits = generate_search_response(HITS_COUNT)["hits"]["hits"]
+    runner.bench_func(
+        f"decode_gazettes_dict_backed[{HITS_COUNT}]", decode_dict_gazettes, hits
+    )
+    runner.bench_func(
+        f"decode_gazettes[{HITS_COUNT}]", mapper.create_list_with_gazette_objects, hits
+    )
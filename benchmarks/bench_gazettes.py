@@ -0,0 +1,20 @@
+from unittest.mock import MagicMock
+
+from benchmarks.fixtures import generate_gazettes
+from gazettes import GazetteAccess, GazetteRequest
+
+GAZETTES_COUNTS = [10, 100, 1000, 10000]
+
+
+def add_benchmarks(runner):
+    request = GazetteRequest("3304557", keywords=["licitação"])
+    for gazettes_count in GAZETTES_COUNTS:
+        gazettes = generate_gazettes(gazettes_count)
+        data_gateway = MagicMock()
+        data_gateway.get_gazettes = MagicMock(return_value=(len(gazettes), gazettes))
+        gazette_access = GazetteAccess(data_gateway, MagicMock())
+        runner.bench_func(
+            f"gazette_access_get_gazettes[{gazettes_count}]",
+            gazette_access.get_gazettes,
+            request,
+        )
@@ -0,0 +1,59 @@
+import itertools
+from datetime import date, timedelta
+
+from benchmarks.fixtures import create_mapper, generate_search_response
+
+HITS_COUNTS = [10, 100, 1000, 10000]
+
+
+def build_query_parameters():
+    """
+    All the combinations of filters accepted by ElasticSearchDataMapper.build_query
+    """
+    today = date.today()
+    territories = [None, "3304557"]
+    since_dates = [None, today - timedelta(days=30)]
+    until_dates = [None, today]
+    keywords = [None, ["licitação"], ["licitação", "pregão", "000.000.000-00"]]
+    return [
+        {
+            "territory_id": territory_id,
+            "since": since,
+            "until": until,
+            "keywords": keyword_list,
+        }
+        for territory_id, since, until, keyword_list in itertools.product(
+            territories, since_dates, until_dates, keywords
+        )
+    ]
+
+
+def bench_build_query(mapper, parameters):
+    for kwargs in parameters:
+        mapper.build_query(**kwargs)
+
+
+def add_benchmarks(runner):
+    mapper = create_mapper()
+
+    parameters = build_query_parameters()
+    runner.bench_func(
+        "build_query",
+        bench_build_query,
+        mapper,
+        parameters,
+        inner_loops=len(parameters),
+    )
+
+    single_hit = generate_search_response(1)["hits"]["hits"][0]
+    runner.bench_func(
+        "assemble_gazette_object", mapper._assemble_gazette_object, single_hit
+    )
+
+    for hits_count in HITS_COUNTS:
+        hits = generate_search_response(hits_count)["hits"]["hits"]
+        runner.bench_func(
+            f"create_list_with_gazette_objects[{hits_count}]",
+            mapper.create_list_with_gazette_objects,
+            hits,
+        )
@@ -0,0 +1,63 @@
+from datetime import date
+
+from monitoring import (
+    Counter,
+    Histogram,
+    InMemoryExporter,
+    QueryStatistics,
+    Registry,
+    Tracer,
+    render,
+)
+
+
+def create_registry():
+    registry = Registry()
+    requests = registry.register(Counter("requests", "Requests", ("route",)))
+    latency = registry.register(
+        Histogram("latency", "Latency", ("method", "route", "status"))
+    )
+    for number in range(20):
+        requests.labels(f"/route/{number}").inc()
+        latency.labels("GET", f"/route/{number}", 200).observe(0.01)
+    return registry, requests, latency
+
+
+def nested_spans(tracer):
+    with tracer.span("parent"):
+        with tracer.span("child", {"key": "value"}):
+            pass
+
+
+def add_benchmarks(runner):
+    """
+    Cost of the instrumentation added to every request and of a scrape
+    """
+    registry, requests, latency = create_registry()
+    runner.bench_func("metrics_counter_inc", requests.labels("/route/1").inc)
+    runner.bench_func(
+        "metrics_histogram_observe", latency.labels("GET", "/route/1", 200).observe, 0.1
+    )
+    runner.bench_func(
+        "metrics_histogram_labels_observe",
+        lambda: latency.labels("GET", "/route/1", 200).observe(0.1),
+    )
+    runner.bench_func("metrics_render", render, registry)
+    runner.bench_func("tracing_disabled_spans", nested_spans, Tracer())
+    exporter = InMemoryExporter()
+
+    def enabled_spans():
+        nested_spans(Tracer(exporter))
+        exporter.clear()
+
+    runner.bench_func("tracing_enabled_spans", enabled_spans)
+    statistics = QueryStatistics()
+    request = {
+        "territory_id": "4205902",
+        "since": date(2021, 1, 1),
+        "until": None,
+        "keywords": ["licitação", "saúde"],
+        "offset": 0,
+        "size": 10,
+    }
+    runner.bench_func("query_statistics_record", statistics.record, request)
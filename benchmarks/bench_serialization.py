@@ -0,0 +1,62 @@
+import json
+
+import cbor2
+import msgpack
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from api.api import GazetteSearchResponse, response_fields
+from api.serialization import CBOR, MSGPACK, compact, serialize
+from benchmarks.fixtures import generate_gazettes
+
+HITS_COUNTS = [10, 100, 1000]
+DECODERS = {
+    "json": json.loads,
+    "msgpack": msgpack.unpackb,
+    "cbor": cbor2.loads,
+}
+
+
+def search_response(hits_count: int):
+    return {
+        "total_gazettes": hits_count,
+        "gazettes": [gazette.as_dict() for gazette in generate_gazettes(hits_count)],
+    }
+
+
+def encode_json(content):
+    return JSONResponse(
+        jsonable_encoder(
+            GazetteSearchResponse(**content), exclude_unset=True, exclude_none=True
+        )
+    ).body
+
+
+def encode_binary(content, media_type):
+    return serialize(
+        compact(content, response_fields(GazetteSearchResponse)), media_type
+    )
+
+
+def add_benchmarks(runner):
+    """
+    Time to encode the search responses in the API and to decode them in the
+    clients for each media type. The response sizes are stored in the
+    metadata, e.g. response_size[msgpack,100].
+    """
+    for hits_count in HITS_COUNTS:
+        content = search_response(hits_count)
+        encoders = {
+            "json": (encode_json, ()),
+            "msgpack": (encode_binary, (MSGPACK,)),
+            "cbor": (encode_binary, (CBOR,)),
+        }
+        for name, (encode, arguments) in encoders.items():
+            body = encode(content, *arguments)
+            runner.metadata[
+                f"response_size[{name},{hits_count}]"
+            ] = f"{len(body)} bytes"
+            runner.bench_func(
+                f"encode_{name}[{hits_count}]", encode, content, *arguments
+            )
+            runner.bench_func(f"decode_{name}[{hits_count}]", DECODERS[name], body)
@@ -0,0 +1,190 @@
+import csv
+import os
+import random
+import tempfile
+from datetime import date, timedelta
+from unittest.mock import patch
+
+from index import ElasticSearchDataMapper
+
+CENSUS_SIZE = 5570
+STATES = [
+    "AC",
+    "AL",
+    "AM",
+    "AP",
+    "BA",
+    "CE",
+    "ES",
+    "GO",
+    "MA",
+    "MG",
+    "MS",
+    "MT",
+    "PA",
+    "PB",
+    "PE",
+    "PI",
+    "PR",
+    "RJ",
+    "RN",
+    "RO",
+    "RR",
+    "RS",
+    "SC",
+    "SE",
+    "SP",
+    "TO",
+]
+NAME_PARTS = [
+    "São",
+    "Santa",
+    "Santo",
+    "Nova",
+    "Bom Jesus",
+    "Águas",
+    "Pira",
+    "Taquara",
+    "Itá",
+    "Campo",
+    "Rio",
+    "Serra",
+    "Porto",
+    "Alto",
+    "Jardim",
+]
+NAME_SUFFIXES = [
+    "do Norte",
+    "do Sul",
+    "da Serra",
+    "dos Campos",
+    "de Minas",
+    "Paulista",
+    "Grande",
+    "Velho",
+    "",
+]
+
+
+def create_mapper(index: str = "gazettes") -> ElasticSearchDataMapper:
+    """
+    Create a data mapper without talking to a real Elasticsearch cluster
+    """
+    with patch("elasticsearch.Elasticsearch"):
+        return ElasticSearchDataMapper("localhost", index)
+
+
+def generate_hit(number: int, day: date):
+    checksum = f"{number:032x}"
+    territory_id = str(1100015 + number % CENSUS_SIZE)
+    return {
+        "_index": "gazettes",
+        "_type": "_doc",
+        "_id": checksum,
+        "_score": None,
+        "_source": {
+            "source_text": "This is a fake gazette content",
+            "date": day.strftime("%Y-%m-%d"),
+            "edition_number": f"{number}.{number % 100}",
+            "is_extra_edition": number % 10 == 0,
+            "power": "executive",
+            "file_checksum": checksum,
+            "file_path": f"{territory_id}/{day}/{checksum}",
+            "file_raw_txt": f"{territory_id}/{day}/{checksum}.txt",
+            "url": f"https://querido-diario.org.br/{territory_id}/{day}/{checksum}",
+            "file_url": "https://doweb.rio.rj.gov.br/portal/edicoes/download/4067",
+            "scraped_at": "2020-10-30T07:04:29.796347",
+            "created_at": "2020-10-30T07:05:33.094289",
+            "territory_id": territory_id,
+            "territory_name": "Rio de Janeiro",
+            "state_code": "RJ",
+        },
+        "highlight": {
+            "source_text": [
+                "This is a fake <em>gazette</em> content with some highlight"
+            ]
+        },
+        "sort": [1609372800000],
+    }
+
+
+def generate_search_response(hits_count: int):
+    """
+    Build a search response shaped like the ones returned by Elasticsearch 7.9
+    """
+    today = date.today()
+    return {
+        "took": 4,
+        "timed_out": False,
+        "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+        "hits": {
+            "total": {"value": hits_count, "relation": "eq"},
+            "max_score": None,
+            "hits": [
+                generate_hit(number, today - timedelta(days=number // 10))
+                for number in range(hits_count)
+            ],
+        },
+    }
+
+
+def generate_gazettes(count: int):
+    mapper = create_mapper()
+    return mapper.create_list_with_gazette_objects(
+        generate_search_response(count)["hits"]["hits"]
+    )
+
+
+def generate_census_rows(count: int = CENSUS_SIZE):
+    randomizer = random.Random(count)
+    for number in range(count):
+        name = " ".join(
+            part
+            for part in (
+                randomizer.choice(NAME_PARTS),
+                randomizer.choice(NAME_PARTS).lower(),
+                randomizer.choice(NAME_SUFFIXES),
+            )
+            if part
+        )
+        urls = [
+            f"https://diario{number}.{randomizer.choice(STATES).lower()}.gov.br"
+            for _ in range(randomizer.randint(0, 2))
+        ]
+        yield {
+            "city_name": name,
+            "ibge_id": str(1100015 + number),
+            "uf": randomizer.choice(STATES),
+            "openness_level": str(randomizer.randint(0, 3)),
+            "gazettes_urls": ",".join(urls),
+        }
+
+
+def census_file():
+    """
+    Return the path to the census CSV file used by the benchmarks.
+
+    It uses the same file used by the API when QUERIDO_DIARIO_DATABASE_CSV is
+    defined. Otherwise, a synthetic file with the same number of cities is
+    created.
+    """
+    database_file = os.environ.get("QUERIDO_DIARIO_DATABASE_CSV", "")
+    if len(database_file) > 0 and os.path.exists(database_file):
+        return database_file
+    database_file = os.path.join(tempfile.gettempdir(), "querido-diario-censo.csv")
+    if os.path.exists(database_file):
+        return database_file
+    with open(database_file, "w", newline="") as csvfile:
+        writer = csv.DictWriter(
+            csvfile,
+            fieldnames=[
+                "city_name",
+                "ibge_id",
+                "uf",
+                "openness_level",
+                "gazettes_urls",
+            ],
+        )
+        writer.writeheader()
+        writer.writerows(generate_census_rows())
+    return database_file
@@ -0,0 +1,429 @@
+"""
+Soak test: send the API a realistic mix of requests for hours, sampling the
+memory used by the process, and fail when it keeps growing.
+
+Leaks in the hits assembly or in the caches take days to show in
+production. The RSS, the memory traced by tracemalloc and the garbage
+collector statistics are sampled every --sample-interval seconds. The
+report has the samples, the growth rate of the memory after the warm-up
+and the lines which allocated more memory since the end of the warm-up.
+
+The memory in use swings by tens of MB with the large responses being
+built, so the growth is measured on the floor of each interval, the least
+memory probed in it, with an estimator insensitive to the outliers. The
+short runs are still noisy: leaks are found in runs of hours.
+
+    python -m benchmarks.soak --duration 3h --output soak.json
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import argparse
+import gc
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from api.compression import DEFAULT_RESPONSE_CACHE_SIZE
+from benchmarks.bench_api import GENERATION_RESPONSE
+from benchmarks.fixtures import CENSUS_SIZE, census_file, create_mapper, generate_hit
+from database.csv import CSVDatabase
+from gazettes import create_gazettes_interface
+
+DEFAULT_DURATION = "1h"
+DEFAULT_SAMPLE_INTERVAL = 60
+DEFAULT_WARMUP = 0.2
+# MB per hour after the warm-up
+DEFAULT_MAX_SLOPE = 5.0
+TOTAL_GAZETTES = 100_000
+KEYWORDS = ["licitação", "saúde", "educação", "decreto", "nomeação", "contrato"]
+TOP_ALLOCATORS = 15
+# Seconds between the probes of the memory floor
+PROBE_INTERVAL = 1.0
+
+
+class GeneratedElasticsearch:
+    """
+    Elasticsearch client answering the searches with generated hits, with
+    as many highlight fragments as requested. It does not record the calls,
+    unlike a mock, so it does not grow with the number of requests.
+    """
+
+    def search(self, body, index, **options):
+        size = body.get("size", 10)
+        if size == 0:
+            return GENERATION_RESPONSE
+        offset = body.get("from", 0)
+        highlight = body.get("highlight", {}).get("fields", {}).get("source_text", {})
+        fragment = "x" * highlight.get("fragment_size", 150)
+        fragments = [fragment] * highlight.get("number_of_fragments", 1)
+        today = date.today()
+        hits = []
+        for number in range(offset, min(offset + size, TOTAL_GAZETTES)):
+            hit = generate_hit(number, today - timedelta(days=number // 10))
+            hit["highlight"] = {"source_text": fragments}
+            hits.append(hit)
+        return {
+            "took": 4,
+            "timed_out": False,
+            "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+            "hits": {
+                "total": {"value": TOTAL_GAZETTES, "relation": "eq"},
+                "max_score": None,
+                "hits": hits,
+            },
+        }
+
+
+def territory_id(randomizer):
+    return str(1100015 + randomizer.randrange(CENSUS_SIZE))
+
+
+def search_request(randomizer):
+    params = {"keywords": randomizer.sample(KEYWORDS, randomizer.randint(1, 2))}
+    if randomizer.random() < 0.3:
+        params["since"] = str(date(2020, 1, 1) + timedelta(randomizer.randrange(365)))
+    path = "/gazettes/"
+    if randomizer.random() < 0.5:
+        path += territory_id(randomizer)
+    return path, params
+
+
+def small_search(randomizer):
+    path, params = search_request(randomizer)
+    params["offset"] = randomizer.choice([0, 0, 0, 10, 20])
+    return "get", path, {"params": params}
+
+
+def large_search(randomizer):
+    path, params = search_request(randomizer)
+    params["size"] = randomizer.choice([100, 500, 1000])
+    params["include_city"] = randomizer.random() < 0.5
+    params["collapse"] = randomizer.random() < 0.3
+    return "get", path, {"params": params}
+
+
+def many_fragments_search(randomizer):
+    path, params = search_request(randomizer)
+    params["size"] = randomizer.choice([10, 100])
+    params["number_of_fragments"] = randomizer.choice([10, 50, 100])
+    params["fragment_size"] = randomizer.choice([150, 1000])
+    params["pre_tags"] = ["<b>"]
+    params["post_tags"] = ["</b>"]
+    return "get", path, {"params": params}
+
+
+def cities_search(randomizer):
+    name = randomizer.choice(["são", "santa", "rio", "porto", "campo", "nova"])
+    return "get", "/cities/", {"params": {"city_name": name}}
+
+
+def cities_suggestion(randomizer):
+    prefix = randomizer.choice(["s", "sa", "san", "r", "ri", "p", "po", "c"])
+    return "get", "/cities/suggest", {"params": {"prefix": prefix}}
+
+
+def city(randomizer):
+    return "get", f"/cities/{territory_id(randomizer)}", {}
+
+
+def cities_batch(randomizer):
+    territory_ids = [territory_id(randomizer) for _ in range(randomizer.randint(1, 50))]
+    return "post", "/cities/_batch", {"json": {"territory_ids": territory_ids}}
+
+
+# Request generator and its weight
+REQUEST_MIX = [
+    (small_search, 50),
+    (large_search, 8),
+    (many_fragments_search, 7),
+    (cities_search, 10),
+    (cities_suggestion, 15),
+    (city, 7),
+    (cities_batch, 3),
+]
+ENCODINGS = [{}, {"Accept-Encoding": "gzip"}, {"Accept-Encoding": "br, gzip"}]
+MEDIA_TYPES = [{}, {}, {}, {"Accept": "application/msgpack"}]
+
+
+def create_client(response_cache_size: int = DEFAULT_RESPONSE_CACHE_SIZE):
+    mapper = create_mapper()
+    mapper._es = GeneratedElasticsearch()
+    with patch.dict(os.environ, {"QUERIDO_DIARIO_DATABASE_CSV": census_file()}):
+        database = CSVDatabase()
+    configure_api_app(
+        create_gazettes_interface(mapper, database),
+        response_cache_size=response_cache_size,
+    )
+    return TestClient(app)
+
+
+def rss_bytes():
+    """
+    Resident memory of the process. The maximum RSS is used where /proc is
+    not available.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        maximum = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maximum if sys.platform == "darwin" else maximum * 1024
+
+
+class MemoryFloor:
+    """
+    Least RSS and traced memory probed since the last sample
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.rss = None
+        self.traced = None
+
+    def probe(self):
+        rss, (traced, _) = rss_bytes(), tracemalloc.get_traced_memory()
+        self.rss = rss if self.rss is None else min(self.rss, rss)
+        self.traced = traced if self.traced is None else min(self.traced, traced)
+
+
+def take_sample(started, requests, errors, floor: MemoryFloor):
+    floor.probe()
+    traced, traced_peak = tracemalloc.get_traced_memory()
+    sample = {
+        "elapsed": round(time.monotonic() - started, 3),
+        "requests": requests,
+        "errors": errors,
+        "rss": rss_bytes(),
+        "rss_floor": floor.rss,
+        "traced": traced,
+        "traced_floor": floor.traced,
+        "traced_peak": traced_peak,
+        "gc_counts": gc.get_count(),
+        "gc_collections": [stats["collections"] for stats in gc.get_stats()],
+        "gc_objects": len(gc.get_objects()),
+        "response_cache_entries": len(app.response_cache),
+        "threads": threading.active_count(),
+    }
+    floor.reset()
+    return sample
+
+
+def slope(samples, field):
+    """
+    Growth of the field in bytes per second: the median of the slopes
+    between every pair of samples (Theil-Sen), so a few outliers do not move it
+    """
+    slopes = [
+        (second[field] - first[field]) / (second["elapsed"] - first["elapsed"])
+        for index, first in enumerate(samples)
+        for second in samples[index + 1 :]
+        if second["elapsed"] > first["elapsed"]
+    ]
+    if len(slopes) == 0:
+        return 0.0
+    return statistics.median(slopes)
+
+
+def top_allocators(snapshot, baseline):
+    filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    statistics = snapshot.filter_traces(filters).compare_to(
+        baseline.filter_traces(filters), "lineno"
+    )
+    return [
+        {
+            "location": f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}",
+            "size": statistic.size,
+            "size_diff": statistic.size_diff,
+            "count_diff": statistic.count_diff,
+        }
+        for statistic in statistics[:TOP_ALLOCATORS]
+    ]
+
+
+def parse_duration(value: str):
+    """
+    Seconds in a duration like 90, 30s, 15m or 3h
+    """
+    units = {"s": 1, "m": 60, "h": 3600}
+    if value[-1:] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+class SoakTest:
+    def __init__(
+        self,
+        duration: float,
+        sample_interval: float,
+        warmup: float,
+        concurrency: int,
+        seed: int,
+        response_cache_size: int = DEFAULT_RESPONSE_CACHE_SIZE,
+    ):
+        self.duration = duration
+        self.sample_interval = sample_interval
+        self.warmup = warmup
+        self.concurrency = concurrency
+        self.seed = seed
+        self.response_cache_size = response_cache_size
+        self.requests = 0
+        self.errors = 0
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def send_requests(self, client, worker, deadline):
+        randomizer = random.Random(self.seed + worker)
+        generators = [generator for generator, _ in REQUEST_MIX]
+        weights = [weight for _, weight in REQUEST_MIX]
+        while time.monotonic() < deadline:
+            (generator,) = randomizer.choices(generators, weights)
+            method, path, arguments = generator(randomizer)
+            headers = {**randomizer.choice(ENCODINGS), **randomizer.choice(MEDIA_TYPES)}
+            response = getattr(client, method)(path, headers=headers, **arguments)
+            with self._lock:
+                self.requests += 1
+                if response.status_code >= 500:
+                    self.errors += 1
+
+    def run(self):
+        client = create_client(self.response_cache_size)
+        tracemalloc.start()
+        started = time.monotonic()
+        deadline = started + self.duration
+        warmup_end = started + self.duration * self.warmup
+        baseline = None
+        floor = MemoryFloor()
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            workers = [
+                executor.submit(self.send_requests, client, worker, deadline)
+                for worker in range(self.concurrency)
+            ]
+            next_sample = started + self.sample_interval
+            while time.monotonic() < deadline:
+                now = time.monotonic()
+                time.sleep(
+                    max(0.0, min(PROBE_INTERVAL, next_sample - now, deadline - now))
+                )
+                if time.monotonic() < min(next_sample, deadline):
+                    floor.probe()
+                    continue
+                self.samples.append(
+                    take_sample(started, self.requests, self.errors, floor)
+                )
+                next_sample += self.sample_interval
+                if baseline is None and time.monotonic() >= warmup_end:
+                    baseline = tracemalloc.take_snapshot()
+            for worker in workers:
+                worker.result()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        return self.report(started, warmup_end, snapshot, baseline or snapshot)
+
+    def report(self, started, warmup_end, snapshot, baseline):
+        warmup_elapsed = warmup_end - started
+        measured = [
+            sample for sample in self.samples if sample["elapsed"] >= warmup_elapsed
+        ]
+        return {
+            "duration": self.duration,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rss_slope_mb_per_hour": slope(measured, "rss_floor") * 3600 / 2 ** 20,
+            "traced_slope_mb_per_hour": slope(measured, "traced_floor")
+            * 3600
+            / 2 ** 20,
+            "top_allocators": top_allocators(snapshot, baseline),
+            "samples": self.samples,
+        }
+
+
+def print_report(report, max_slope):
+    print(
+        f"{report['requests']} requests ({report['errors']} errors) in "
+        f"{report['duration']:.0f} s"
+    )
+    for sample in report["samples"]:
+        print(
+            f"{sample['elapsed']:10.0f} s {sample['requests']:10d} requests "
+            f"RSS {sample['rss_floor'] / 2 ** 20:8.1f} MB "
+            f"traced {sample['traced_floor'] / 2 ** 20:8.1f} MB "
+            f"objects {sample['gc_objects']:9d} "
+            f"cache {sample['response_cache_entries']:5d}"
+        )
+    print(
+        f"RSS growth: {report['rss_slope_mb_per_hour']:.2f} MB/h, "
+        f"traced growth: {report['traced_slope_mb_per_hour']:.2f} MB/h "
+        f"(limit: {max_slope} MB/h)"
+    )
+    print("Allocations which grew after the warm-up:")
+    for allocator in report["top_allocators"]:
+        print(
+            f"  {allocator['size_diff'] / 1024:+10.1f} KiB "
+            f"{allocator['count_diff']:+8d} blocks {allocator['location']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", default=DEFAULT_DURATION, type=parse_duration)
+    parser.add_argument(
+        "--sample-interval",
+        default=DEFAULT_SAMPLE_INTERVAL,
+        type=parse_duration,
+        help="Time between the memory samples",
+    )
+    parser.add_argument(
+        "--warmup",
+        default=DEFAULT_WARMUP,
+        type=float,
+        help="Fraction of the duration ignored while the caches fill up",
+    )
+    parser.add_argument(
+        "--max-slope",
+        default=DEFAULT_MAX_SLOPE,
+        type=float,
+        help="Maximum growth of the memory after the warm-up in MB/h",
+    )
+    parser.add_argument(
+        "--response-cache-size",
+        default=DEFAULT_RESPONSE_CACHE_SIZE,
+        type=int,
+        help="Smaller caches fill up sooner, for shorter runs",
+    )
+    parser.add_argument("--concurrency", default=4, type=int)
+    parser.add_argument("--seed", default=42, type=int)
+    parser.add_argument("--output", help="File where the JSON report is written")
+    args = parser.parse_args()
+
+    report = SoakTest(
+        args.duration,
+        args.sample_interval,
+        args.warmup,
+        args.concurrency,
+        args.seed,
+        args.response_cache_size,
+    ).run()
+    print_report(report, args.max_slope)
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    slopes = [report["rss_slope_mb_per_hour"], report["traced_slope_mb_per_hour"]]
+    if max(slopes) > args.max_slope:
+        print("Memory grew faster than the limit", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,65 @@ class Configuration:
         self.index = os.environ.get("QUERIDO_DIARIO_ELASTICSEARCH_INDEX", "")
         self.root_path = os.environ.get("QUERIDO_DIARIO_API_ROOT_PATH", "")
         self.url_prefix = os.environ.get("QUERIDO_DIARIO_URL_PREFIX", "")
+        self.query_log_file = os.environ.get("QUERIDO_DIARIO_QUERY_LOG_FILE", "")
+        self.query_log_max_bytes = int(
+            os.environ.get("QUERIDO_DIARIO_QUERY_LOG_MAX_BYTES", 100 * 1024 * 1024)
+        )
+        self.query_log_backup_count = int(
+            os.environ.get("QUERIDO_DIARIO_QUERY_LOG_BACKUP_COUNT", 10)
+        )
+        self.database_url = os.environ.get("QUERIDO_DIARIO_DATABASE_URL", "")
+        self.database_pool_size = int(
+            os.environ.get("QUERIDO_DIARIO_DATABASE_POOL_SIZE", 5)
+        )
+        self.database_max_overflow = int(
+            os.environ.get("QUERIDO_DIARIO_DATABASE_MAX_OVERFLOW", 10)
+        )
+        self.database_pool_timeout = int(
+            os.environ.get("QUERIDO_DIARIO_DATABASE_POOL_TIMEOUT", 30)
+        )
+        self.database_pool_recycle = int(
+            os.environ.get("QUERIDO_DIARIO_DATABASE_POOL_RECYCLE", 1800)
+        )
+        self.compression_minimum_size = int(
+            os.environ.get("QUERIDO_DIARIO_COMPRESSION_MINIMUM_SIZE", 500)
+        )
+        self.gzip_level = int(os.environ.get("QUERIDO_DIARIO_GZIP_LEVEL", 6))
+        self.brotli_level = int(os.environ.get("QUERIDO_DIARIO_BROTLI_LEVEL", 5))
+        self.response_cache_size = int(
+            os.environ.get("QUERIDO_DIARIO_RESPONSE_CACHE_SIZE", 1000)
+        )
+        self.slow_query_log_file = os.environ.get(
+            "QUERIDO_DIARIO_SLOW_QUERY_LOG_FILE", ""
+        )
+        self.slow_query_threshold_ms = float(
+            os.environ.get("QUERIDO_DIARIO_SLOW_QUERY_THRESHOLD_MS", 1000)
+        )
+        self.slow_query_log_rate = float(
+            os.environ.get("QUERIDO_DIARIO_SLOW_QUERY_LOG_RATE", 1)
+        )
+        self.slow_query_log_burst = int(
+            os.environ.get("QUERIDO_DIARIO_SLOW_QUERY_LOG_BURST", 10)
+        )
+        self.server_timing = os.environ.get(
+            "QUERIDO_DIARIO_SERVER_TIMING", ""
+        ).lower() in ("1", "true")
+        self.admin_token = os.environ.get("QUERIDO_DIARIO_ADMIN_TOKEN", "")
+        self.trace_file = os.environ.get("QUERIDO_DIARIO_TRACE_FILE", "")
+        self.event_loop_stall_threshold_ms = float(
+            os.environ.get("QUERIDO_DIARIO_EVENT_LOOP_STALL_THRESHOLD_MS", 100)
+        )
+        self.warm_up_queries_file = os.environ.get(
+            "QUERIDO_DIARIO_WARM_UP_QUERIES_FILE", ""
+        )
+        self.top_queries_file = os.environ.get("QUERIDO_DIARIO_TOP_QUERIES_FILE", "")
+        self.warm_up_budget = float(os.environ.get("QUERIDO_DIARIO_WARM_UP_BUDGET", 60))
+        self.warm_up_max_queries = int(
+            os.environ.get("QUERIDO_DIARIO_WARM_UP_MAX_QUERIES", 100)
+        )
+        self.health_check_interval = float(
+            os.environ.get("QUERIDO_DIARIO_HEALTH_CHECK_INTERVAL", 5)
+        )
 
 
 def load_configuration():
@@ -1,6 +1,26 @@
+import os
+
 from gazettes import DatabaseInterface
 from .csv import CSVDatabase
+from .snapshot import SnapshotDatabase, compile_snapshot
+from .sql import SQLDatabase
 
 
-def create_database_interface() -> DatabaseInterface:
+def create_database_interface(
+    database_url: str = None,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_timeout: int = 30,
+    pool_recycle: int = 1800,
+) -> DatabaseInterface:
+    """
+    Return the SQL database when database_url is defined. Otherwise, the
+    cities snapshot or the CSV file.
+    """
+    if database_url is not None and len(database_url.strip()) > 0:
+        return SQLDatabase(
+            database_url, pool_size, max_overflow, pool_timeout, pool_recycle
+        )
+    if len(os.environ.get("QUERIDO_DIARIO_DATABASE_SNAPSHOT", "").strip()) > 0:
+        return SnapshotDatabase()
     return CSVDatabase()
@@ -1,36 +1,381 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from types import MappingProxyType
 import csv
+import functools
+import heapq
+import logging
+import math
 import os
+import re
+import threading
+import time
+from typing import List
+import unicodedata
 
 from gazettes import DatabaseInterface, City, OpennessLevel
+from monitoring import histogram, span
+
+DEFAULT_RELOAD_INTERVAL = 60
+DEFAULT_SUGGESTION_WEIGHT = "openness_level"
+SIMILARITY_THRESHOLD = 0.3
+NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+
+LOOKUP_DURATION = histogram(
+    "querido_diario_csv_database_lookup_duration_seconds",
+    "Time to look up the cities in the CSV database",
+    ("operation",),
+    (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005),
+)
+
+
+def timed_lookup(method):
+    """
+    Record the duration of the decorated lookup method
+    """
+    duration = LOOKUP_DURATION.labels(method.__name__)
+
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            duration.observe(time.perf_counter() - started)
+
+    return timed
+
+
+def normalize_name(name: str):
+    """
+    Remove accents, punctuation and case from the name. E.g.: "Embu-Guaçu"
+    becomes "embu guacu".
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    return NON_ALPHANUMERIC.sub(" ", name.casefold()).strip()
+
+
+def trigrams(normalized_name: str):
+    """
+    Trigrams of each word padded with two spaces in the beginning and one
+    in the end, as PostgreSQL pg_trgm does.
+    """
+    result = set()
+    for word in normalized_name.split():
+        padded = f"  {word} "
+        result.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return result
+
+
+# Functions returning how relevant a city is among the suggestions with the
+# same prefix. The greater, the better.
+SUGGESTION_WEIGHTS = {
+    "openness_level": lambda city: int(city.level.value),
+    "publication_urls": lambda city: len(city.publication_urls or ()),
+}
+
+# Suggestion matches: the name starts with the prefix, a word in the name
+# starts with the prefix or the state code starts with the prefix.
+NAME_PREFIX = 0
+WORD_PREFIX = 1
+STATE_PREFIX = 2
+
+
+class CitiesIndex:
+    """
+    Immutable indexes over the cities loaded from the database file. A new
+    object is built when the file changes, so readers never see a partially
+    loaded database.
+    """
+
+    __slots__ = (
+        "cities",
+        "by_id",
+        "by_state",
+        "names",
+        "names_text",
+        "names_offsets",
+        "names_trigrams",
+        "trigrams",
+        "suggestion_keys",
+        "suggestion_matches",
+        "weights",
+        "version",
+    )
+
+    def __init__(self, cities, version=None, weight=None):
+        self.cities = tuple(cities)
+        self.by_id = MappingProxyType({city.territory_id: city for city in self.cities})
+        by_state = {}
+        for city in self.cities:
+            by_state.setdefault(city.state_code, []).append(city)
+        self.by_state = MappingProxyType(
+            {state: tuple(cities) for state, cities in by_state.items()}
+        )
+        self.names = tuple(normalize_name(city.territory_name) for city in self.cities)
+        # All the names in a single string allow substring search in C speed.
+        # The offsets map the position of a match back to the city.
+        self.names_text = "\n".join(self.names)
+        offsets = []
+        offset = 0
+        for name in self.names:
+            offsets.append(offset)
+            offset += len(name) + 1
+        self.names_offsets = tuple(offsets)
+        self.names_trigrams = tuple(frozenset(trigrams(name)) for name in self.names)
+        postings = {}
+        for position, name_trigrams in enumerate(self.names_trigrams):
+            for trigram in name_trigrams:
+                postings.setdefault(trigram, []).append(position)
+        self.trigrams = MappingProxyType(
+            {trigram: tuple(positions) for trigram, positions in postings.items()}
+        )
+        # Sorted array of the keys used by the suggestions. The positions with
+        # a given prefix are found by binary search.
+        suggestions = []
+        for position, (city, name) in enumerate(zip(self.cities, self.names)):
+            suggestions.append((name, NAME_PREFIX, position))
+            for index, char in enumerate(name):
+                if char == " ":
+                    suggestions.append((name[index + 1 :], WORD_PREFIX, position))
+            suggestions.append((city.state_code.lower(), STATE_PREFIX, position))
+        suggestions.sort()
+        self.suggestion_keys = tuple(key for key, _, _ in suggestions)
+        self.suggestion_matches = tuple(
+            (match, position) for _, match, position in suggestions
+        )
+        if weight is None:
+            weight = SUGGESTION_WEIGHTS[DEFAULT_SUGGESTION_WEIGHT]
+        self.weights = tuple(weight(city) for city in self.cities)
+        self.version = version
+
+    def __len__(self):
+        return len(self.cities)
+
+    def substring_matches(self, name: str):
+        """
+        Return the rank, the length and the position of the names containing
+        the given name. Exact matches rank first, then names and words starting
+        with the given name.
+        """
+        matches = []
+        names_text = self.names_text
+        offsets = self.names_offsets
+        start = names_text.find(name)
+        while start >= 0:
+            position = bisect_right(offsets, start) - 1
+            length = len(self.names[position])
+            if start != offsets[position]:
+                rank = 2 if names_text[start - 1] == " " else 3
+            else:
+                rank = 0 if length == len(name) else 1
+            matches.append((rank, length, position))
+            # A name is matched once. Skip to the next one.
+            start = names_text.find(name, offsets[position] + length + 1)
+        return matches
+
+    def similar_names(self, name: str, threshold: float):
+        """
+        Return the similarity and the position of the names sharing enough
+        trigrams with the given name.
+
+        A name with similarity above the threshold shares at least
+        threshold * len(name_trigrams) trigrams with the given name. So only the
+        postings of the rarest trigrams are read to find the candidates.
+        """
+        name_trigrams = trigrams(name)
+        if len(name_trigrams) == 0:
+            return []
+        postings = sorted(
+            (self.trigrams.get(trigram, ()) for trigram in name_trigrams), key=len
+        )
+        required = max(1, math.ceil(threshold * len(name_trigrams)))
+        candidates = set()
+        for positions in postings[: len(postings) - required + 1]:
+            candidates.update(positions)
+        names_trigrams = self.names_trigrams
+        similar = []
+        for position in candidates:
+            candidate_trigrams = names_trigrams[position]
+            shared = len(name_trigrams & candidate_trigrams)
+            similarity = shared / (
+                len(name_trigrams) + len(candidate_trigrams) - shared
+            )
+            if similarity >= threshold:
+                similar.append((-similarity, position))
+        return similar
+
+    def search(self, name: str, limit: int = None, threshold=SIMILARITY_THRESHOLD):
+        """
+        Search the cities with the given name. Names containing the given
+        name come first. Then the names with similar trigrams (e.g. typos), the
+        most similar first.
+        """
+        name = normalize_name(name)
+        if len(name) == 0:
+            return list(self.cities[:limit])
+        matches = self.substring_matches(name)
+        if limit is None:
+            matches.sort()
+        else:
+            matches = heapq.nsmallest(limit, matches)
+        ranked = [position for _, _, position in matches]
+        if limit is None or len(ranked) < limit:
+            found = set(ranked)
+            similar = sorted(
+                item
+                for item in self.similar_names(name, threshold)
+                if item[1] not in found
+            )
+            ranked.extend(position for _, position in similar)
+        return [self.cities[position] for position in ranked[:limit]]
+
+    def suggest(self, prefix: str, limit: int = 10):
+        """
+        Return the cities with the name, a word in the name or the state code
+        starting with the given prefix. Name matches come first, then the
+        cities with the greatest weight.
+        """
+        prefix = normalize_name(prefix)
+        if len(prefix) == 0:
+            return []
+        start = bisect_left(self.suggestion_keys, prefix)
+        end = bisect_left(self.suggestion_keys, prefix + chr(0x10FFFF), start)
+        matches = {}
+        for match, position in self.suggestion_matches[start:end]:
+            if match < matches.get(position, STATE_PREFIX + 1):
+                matches[position] = match
+        best = heapq.nsmallest(
+            limit,
+            (
+                (match, -self.weights[position], len(self.names[position]), position)
+                for position, match in matches.items()
+            ),
+        )
+        return [self.cities[position] for _, _, _, position in best]
+
+
+def read_cities(database_file: str):
+    with open(database_file) as database:
+        for row in csv.DictReader(database):
+            urls = row["gazettes_urls"].strip().split(",")
+            if len(urls) == 1 and len(urls[0]) == 0:
+                urls = None
+            yield City(
+                row["city_name"],
+                row["ibge_id"],
+                row["uf"],
+                OpennessLevel(row["openness_level"]),
+                urls,
+            )
+
+
+def file_version(database_file: str):
+    status = os.stat(database_file)
+    return (status.st_mtime_ns, status.st_size)
 
 
 class CSVDatabase(DatabaseInterface):
     """
     A simple database interface implementation to allow load data from file.
-    This is not intent to be used in production. But it can be used to avoid blocking
-    other code changes for now.
+
+    The file is loaded once in memory. A background thread checks the file
+    modification time every reload_interval seconds (or the value in the
+    QUERIDO_DIARIO_DATABASE_CSV_RELOAD_INTERVAL envvar) and loads it again
+    when it changes. Zero disables the reload.
+
+    suggestion_weight (or the QUERIDO_DIARIO_DATABASE_CSV_SUGGESTION_WEIGHT
+    envvar) is the name of the function in SUGGESTION_WEIGHTS used to rank the
+    city suggestions.
     """
 
-    def __init__(self):
+    def __init__(self, reload_interval: float = None, suggestion_weight: str = None):
         self.database_file = os.environ["QUERIDO_DIARIO_DATABASE_CSV"]
         if not os.path.exists(self.database_file):
             raise Exception("Missing databasefile")
+        if reload_interval is None:
+            reload_interval = float(
+                os.environ.get(
+                    "QUERIDO_DIARIO_DATABASE_CSV_RELOAD_INTERVAL",
+                    DEFAULT_RELOAD_INTERVAL,
+                )
+            )
+        self.reload_interval = reload_interval
+        if suggestion_weight is None:
+            suggestion_weight = os.environ.get(
+                "QUERIDO_DIARIO_DATABASE_CSV_SUGGESTION_WEIGHT",
+                DEFAULT_SUGGESTION_WEIGHT,
+            )
+        if suggestion_weight not in SUGGESTION_WEIGHTS:
+            raise Exception("Invalid suggestion weight")
+        self.suggestion_weight = suggestion_weight
+        self._index = self.load()
+        self._stop_reload = threading.Event()
+        self._reload_thread = None
+        if self.reload_interval > 0:
+            self._reload_thread = threading.Thread(
+                target=self.watch_database_file,
+                name="csv-database-reload",
+                daemon=True,
+            )
+            self._reload_thread.start()
+
+    def load(self):
+        version = file_version(self.database_file)
+        return CitiesIndex(
+            read_cities(self.database_file),
+            version,
+            SUGGESTION_WEIGHTS[self.suggestion_weight],
+        )
+
+    def reload_if_changed(self):
+        """
+        Load the database file again when its modification time or size
+        changed. Return True when the database has been reloaded.
+        """
+        try:
+            if file_version(self.database_file) == self._index.version:
+                return False
+            self._index = self.load()
+            return True
+        except Exception:
+            logging.exception(
+                "Could not reload %s. Keeping the previous data.", self.database_file
+            )
+            return False
+
+    def watch_database_file(self):
+        while not self._stop_reload.wait(self.reload_interval):
+            self.reload_if_changed()
+
+    def close(self):
+        self._stop_reload.set()
+        if self._reload_thread is not None:
+            self._reload_thread.join()
+            self._reload_thread = None
+
+    @span("database.get_cities")
+    @timed_lookup
+    def get_cities(self, city_name: str = None, limit: int = None):
+        return self._index.search(city_name or "", limit)
+
+    @timed_lookup
+    def suggest_cities(self, prefix: str, limit: int = 10):
+        return self._index.suggest(prefix, limit)
+
+    @timed_lookup
+    def get_city(self, territory_id: str):
+        return self._index.by_id.get(territory_id)
+
+    @timed_lookup
+    def get_cities_by_ids(self, territory_ids: List[str]):
+        by_id = self._index.by_id
+        return [by_id[id] for id in dict.fromkeys(territory_ids) if id in by_id]
+
+    def count_cities(self):
+        return len(self._index)
 
-    def get_cities(self, city_name: str = None):
-        results = []
-        with open(self.database_file) as database:
-            reader = csv.DictReader(database)
-            for row in reader:
-                if city_name.lower() in row["city_name"].lower():
-                    urls = row["gazettes_urls"].strip().split(",")
-                    if len(urls) == 1 and len(urls[0]) == 0:
-                        urls = None
-                    city = City(
-                        row["city_name"],
-                        row["ibge_id"],
-                        row["uf"],
-                        OpennessLevel(row["openness_level"]),
-                        urls,
-                    )
-                    results.append(city)
-        return results
+    def get_last_modified(self):
+        modification_time, _ = self._index.version
+        return datetime.fromtimestamp(modification_time / 1e9, timezone.utc)
@@ -0,0 +1,469 @@
+"""
+Compact binary snapshot of the cities database.
+
+The CSV file is compiled once (e.g. when the Docker image is built) and the
+API reads the snapshot through mmap. So the worker processes share the same
+page cache pages and nothing is parsed at startup. All the integers are
+little-endian.
+
+Layout:
+    header
+    string table: ids, names, publication URLs and state codes (UTF-8)
+    names: normalized names in the CSV file order joined by "\\n"
+    name offsets: uint32 offset of each normalized name plus the end
+    trigram counts: uint16 number of trigrams of each normalized name
+    weights: uint8 suggestion weight of each city
+    records: fixed-width records in the CSV file order
+    territory ids: uint32 record numbers sorted by territory id
+    trigrams: sorted trigrams with the start and length of their postings
+    postings: uint32 record numbers
+    suggestions: sorted keys (name, word and state code prefixes)
+    suggestion records: uint32 record number of each suggestion
+    suggestion matches: uint8 kind of match of each suggestion
+"""
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List
+import argparse
+import heapq
+import mmap
+import os
+import struct
+import sys
+
+from gazettes import DatabaseInterface, City, OpennessLevel
+from .csv import (
+    DEFAULT_SUGGESTION_WEIGHT,
+    NAME_PREFIX,
+    SIMILARITY_THRESHOLD,
+    STATE_PREFIX,
+    SUGGESTION_WEIGHTS,
+    WORD_PREFIX,
+    normalize_name,
+    read_cities,
+    trigrams,
+)
+
+MAGIC = b"QDCS"
+FORMAT_VERSION = 1
+
+# magic, version, number of cities and the offset of each section
+HEADER = struct.Struct("<4sHxx14I")
+# territory id, name and publication URLs (offset and length in the string
+# table), state code and openness level
+RECORD = struct.Struct("<IHIHIH2s1s")
+# trigram, first posting and number of postings
+TRIGRAM = struct.Struct("<3sxII")
+# key offset and length
+SUGGESTION = struct.Struct("<IH")
+
+
+def align(buffer: bytearray):
+    buffer.extend(b"\0" * (-len(buffer) % 4))
+
+
+def compile_snapshot(
+    database_file: str, snapshot_file: str, weight: str = DEFAULT_SUGGESTION_WEIGHT
+):
+    """
+    Compile the CSV database file into a snapshot file. weight is the name of
+    the function in SUGGESTION_WEIGHTS used to rank the city suggestions.
+    The snapshot is written in a temporary file and renamed, so readers never
+    see a partial file.
+    """
+    if weight not in SUGGESTION_WEIGHTS:
+        raise Exception("Invalid suggestion weight")
+    weight = SUGGESTION_WEIGHTS[weight]
+    cities = list(read_cities(database_file))
+    names = [normalize_name(city.territory_name) for city in cities]
+
+    buffer = bytearray(HEADER.size)
+    strings = {}
+
+    def add_string(value: str):
+        if value not in strings:
+            encoded = value.encode("utf-8")
+            strings[value] = (len(buffer), len(encoded))
+            buffer.extend(encoded)
+        return strings[value]
+
+    records = []
+    for city in cities:
+        records.append(
+            RECORD.pack(
+                *add_string(city.territory_id),
+                *add_string(city.territory_name),
+                *add_string(",".join(city.publication_urls or [])),
+                city.state_code.encode("ascii"),
+                city.level.value.encode("ascii"),
+            )
+        )
+    states = {city.state_code: add_string(city.state_code.lower()) for city in cities}
+    align(buffer)
+
+    names_offset = len(buffer)
+    name_offsets = []
+    for name in names:
+        name_offsets.append(len(buffer) - names_offset)
+        buffer.extend(name.encode("ascii") + b"\n")
+    names_size = len(buffer) - names_offset
+    name_offsets.append(names_size)
+    align(buffer)
+
+    name_offsets_offset = len(buffer)
+    buffer.extend(struct.pack(f"<{len(name_offsets)}I", *name_offsets))
+
+    names_trigrams = [trigrams(name) for name in names]
+    trigram_counts_offset = len(buffer)
+    buffer.extend(struct.pack(f"<{len(cities)}H", *map(len, names_trigrams)))
+    align(buffer)
+
+    weights_offset = len(buffer)
+    buffer.extend(struct.pack(f"<{len(cities)}B", *(weight(c) for c in cities)))
+    align(buffer)
+
+    records_offset = len(buffer)
+    buffer.extend(b"".join(records))
+    territory_ids_offset = len(buffer)
+    by_id = sorted(range(len(cities)), key=lambda record: cities[record].territory_id)
+    buffer.extend(struct.pack(f"<{len(by_id)}I", *by_id))
+
+    postings = {}
+    for record, name_trigrams in enumerate(names_trigrams):
+        for trigram in name_trigrams:
+            postings.setdefault(trigram, []).append(record)
+    trigrams_offset = len(buffer)
+    first_posting = 0
+    for trigram in sorted(postings):
+        buffer.extend(
+            TRIGRAM.pack(trigram.encode("ascii"), first_posting, len(postings[trigram]))
+        )
+        first_posting += len(postings[trigram])
+    postings_offset = len(buffer)
+    for trigram in sorted(postings):
+        buffer.extend(struct.pack(f"<{len(postings[trigram])}I", *postings[trigram]))
+
+    suggestions = []
+    for record, (city, name) in enumerate(zip(cities, names)):
+        name_offset = names_offset + name_offsets[record]
+        suggestions.append((name, NAME_PREFIX, record, name_offset))
+        for index, char in enumerate(name):
+            if char == " ":
+                suggestions.append(
+                    (name[index + 1 :], WORD_PREFIX, record, name_offset + index + 1)
+                )
+        state = city.state_code.lower()
+        suggestions.append((state, STATE_PREFIX, record, states[city.state_code][0]))
+    suggestions.sort()
+    suggestions_offset = len(buffer)
+    for key, _, _, key_offset in suggestions:
+        buffer.extend(SUGGESTION.pack(key_offset, len(key)))
+    align(buffer)
+    suggestion_records_offset = len(buffer)
+    buffer.extend(struct.pack(f"<{len(suggestions)}I", *(s[2] for s in suggestions)))
+    buffer.extend(struct.pack(f"<{len(suggestions)}B", *(s[1] for s in suggestions)))
+
+    HEADER.pack_into(
+        buffer,
+        0,
+        MAGIC,
+        FORMAT_VERSION,
+        len(cities),
+        names_offset,
+        names_size,
+        name_offsets_offset,
+        trigram_counts_offset,
+        weights_offset,
+        records_offset,
+        territory_ids_offset,
+        trigrams_offset,
+        len(postings),
+        postings_offset,
+        suggestions_offset,
+        len(suggestions),
+        suggestion_records_offset,
+    )
+    temporary_file = f"{snapshot_file}.tmp"
+    with open(temporary_file, "wb") as snapshot:
+        snapshot.write(buffer)
+    os.replace(temporary_file, snapshot_file)
+
+
+class SnapshotDatabase(DatabaseInterface):
+    """
+    Database interface implementation reading the snapshot compiled by
+    compile_snapshot through mmap. The file name comes from the
+    QUERIDO_DIARIO_DATABASE_SNAPSHOT envvar when it is not given.
+
+    The snapshot is immutable. A new snapshot requires a restart.
+    """
+
+    def __init__(self, snapshot_file: str = None):
+        if snapshot_file is None:
+            snapshot_file = os.environ.get("QUERIDO_DIARIO_DATABASE_SNAPSHOT", "")
+        if not os.path.exists(snapshot_file):
+            raise Exception("Missing snapshot file")
+        if sys.byteorder != "little":
+            raise Exception("Snapshot files are supported in little-endian only")
+        self.snapshot_file = snapshot_file
+        with open(snapshot_file, "rb") as snapshot:
+            self._mmap = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+            self._last_modified = datetime.fromtimestamp(
+                os.fstat(snapshot.fileno()).st_mtime, timezone.utc
+            )
+        (
+            magic,
+            version,
+            self._count,
+            self._names_offset,
+            self._names_size,
+            name_offsets_offset,
+            trigram_counts_offset,
+            weights_offset,
+            self._records_offset,
+            territory_ids_offset,
+            self._trigrams_offset,
+            self._trigrams_length,
+            self._postings_offset,
+            self._suggestions_offset,
+            self._suggestions_length,
+            suggestion_records_offset,
+        ) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mmap.close()
+            raise Exception("Invalid snapshot file")
+        view = memoryview(self._mmap)
+        self._name_offsets = view[
+            name_offsets_offset : name_offsets_offset + (self._count + 1) * 4
+        ].cast("I")
+        self._trigram_counts = view[
+            trigram_counts_offset : trigram_counts_offset + self._count * 2
+        ].cast("H")
+        self._weights = view[weights_offset : weights_offset + self._count]
+        self._territory_ids = view[
+            territory_ids_offset : territory_ids_offset + self._count * 4
+        ].cast("I")
+        self._postings = view[self._postings_offset : self._suggestions_offset].cast(
+            "I"
+        )
+        suggestion_matches_offset = (
+            suggestion_records_offset + self._suggestions_length * 4
+        )
+        self._suggestion_records = view[
+            suggestion_records_offset:suggestion_matches_offset
+        ].cast("I")
+        self._suggestion_matches = view[
+            suggestion_matches_offset : suggestion_matches_offset
+            + self._suggestions_length
+        ]
+        self._views = [
+            self._name_offsets,
+            self._trigram_counts,
+            self._weights,
+            self._territory_ids,
+            self._postings,
+            self._suggestion_records,
+            self._suggestion_matches,
+            view,
+        ]
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
+        self._mmap.close()
+
+    def _string(self, offset: int, length: int):
+        return self._mmap[offset : offset + length].decode("utf-8")
+
+    def _city(self, record: int):
+        (
+            id_offset,
+            id_length,
+            name_offset,
+            name_length,
+            urls_offset,
+            urls_length,
+            state_code,
+            level,
+        ) = RECORD.unpack_from(self._mmap, self._records_offset + record * RECORD.size)
+        urls = self._string(urls_offset, urls_length)
+        return City(
+            self._string(name_offset, name_length),
+            self._string(id_offset, id_length),
+            state_code.decode("ascii"),
+            OpennessLevel(level.decode("ascii")),
+            urls.split(",") if urls else None,
+        )
+
+    def _territory_id(self, record: int):
+        id_offset, id_length = struct.unpack_from(
+            "<IH", self._mmap, self._records_offset + record * RECORD.size
+        )
+        return self._mmap[id_offset : id_offset + id_length].decode("utf-8")
+
+    def _name_length(self, record: int):
+        return self._name_offsets[record + 1] - self._name_offsets[record] - 1
+
+    def _find_record(self, territory_id: str):
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._territory_id(self._territory_ids[middle]) < territory_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self._count:
+            return None
+        record = self._territory_ids[low]
+        return record if self._territory_id(record) == territory_id else None
+
+    def _find_trigram(self, trigram: bytes):
+        low, high = 0, self._trigrams_length
+        while low < high:
+            middle = (low + high) // 2
+            key, first, length = TRIGRAM.unpack_from(
+                self._mmap, self._trigrams_offset + middle * TRIGRAM.size
+            )
+            if key == trigram:
+                return self._postings[first : first + length]
+            if key < trigram:
+                low = middle + 1
+            else:
+                high = middle
+        return ()
+
+    def _suggestion_bound(self, key: bytes):
+        """
+        Return the first suggestion with a key equal or greater than key
+        """
+        low, high = 0, self._suggestions_length
+        while low < high:
+            middle = (low + high) // 2
+            offset, length = SUGGESTION.unpack_from(
+                self._mmap, self._suggestions_offset + middle * SUGGESTION.size
+            )
+            if self._mmap[offset : offset + length] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _substring_matches(self, name: bytes):
+        matches = []
+        names_start = self._names_offset
+        names_end = names_start + self._names_size
+        start = self._mmap.find(name, names_start, names_end)
+        while start >= 0:
+            relative_start = start - names_start
+            record = bisect_right(self._name_offsets, relative_start) - 1
+            length = self._name_length(record)
+            if relative_start != self._name_offsets[record]:
+                rank = 2 if self._mmap[start - 1] == ord(" ") else 3
+            else:
+                rank = 0 if length == len(name) else 1
+            matches.append((rank, length, record))
+            start = self._mmap.find(
+                name, names_start + self._name_offsets[record + 1], names_end
+            )
+        return matches
+
+    def _similar_names(self, name: str, threshold: float):
+        name_trigrams = trigrams(name)
+        shared = Counter()
+        for trigram in name_trigrams:
+            shared.update(self._find_trigram(trigram.encode("ascii")))
+        similar = []
+        for record, count in shared.items():
+            similarity = count / (
+                len(name_trigrams) + self._trigram_counts[record] - count
+            )
+            if similarity >= threshold:
+                similar.append((-similarity, record))
+        return similar
+
+    def get_cities(
+        self, city_name: str = None, limit: int = None, threshold=SIMILARITY_THRESHOLD
+    ):
+        name = normalize_name(city_name or "")
+        if len(name) == 0:
+            count = self._count if limit is None else min(limit, self._count)
+            return [self._city(record) for record in range(count)]
+        matches = self._substring_matches(name.encode("ascii"))
+        if limit is None:
+            matches.sort()
+        else:
+            matches = heapq.nsmallest(limit, matches)
+        ranked = [record for _, _, record in matches]
+        if limit is None or len(ranked) < limit:
+            found = set(ranked)
+            similar = sorted(
+                item
+                for item in self._similar_names(name, threshold)
+                if item[1] not in found
+            )
+            ranked.extend(record for _, record in similar)
+        return [self._city(record) for record in ranked[:limit]]
+
+    def suggest_cities(self, prefix: str, limit: int = 10):
+        prefix = normalize_name(prefix).encode("ascii")
+        if len(prefix) == 0:
+            return []
+        start = self._suggestion_bound(prefix)
+        end = self._suggestion_bound(prefix + b"\xff")
+        matches = {}
+        for match, record in zip(
+            self._suggestion_matches[start:end], self._suggestion_records[start:end]
+        ):
+            if match < matches.get(record, STATE_PREFIX + 1):
+                matches[record] = match
+        best = heapq.nsmallest(
+            limit,
+            (
+                (match, -self._weights[record], self._name_length(record), record)
+                for record, match in matches.items()
+            ),
+        )
+        return [self._city(record) for _, _, _, record in best]
+
+    def count_cities(self):
+        return len(self)
+
+    def get_last_modified(self):
+        return self._last_modified
+
+    def get_city(self, territory_id: str):
+        record = self._find_record(territory_id)
+        return self._city(record) if record is not None else None
+
+    def get_cities_by_ids(self, territory_ids: List[str]):
+        cities = []
+        for territory_id in dict.fromkeys(territory_ids):
+            record = self._find_record(territory_id)
+            if record is not None:
+                cities.append(self._city(record))
+        return cities
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Compile the cities CSV database into a snapshot file"
+    )
+    parser.add_argument("database_file", help="Cities CSV database file")
+    parser.add_argument("snapshot_file", help="Snapshot file to write")
+    parser.add_argument(
+        "--weight",
+        choices=sorted(SUGGESTION_WEIGHTS),
+        default=DEFAULT_SUGGESTION_WEIGHT,
+        help="Weight used to rank the city suggestions",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    compile_snapshot(arguments.database_file, arguments.snapshot_file, arguments.weight)
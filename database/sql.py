@@ -0,0 +1,323 @@
+"""
+Cities database stored in a SQL database (PostgreSQL in production, SQLite in
+the tests). Names are normalized (no accents, punctuation or case) when the
+cities are saved, so the searches use plain indexed comparisons.
+"""
+from datetime import datetime, timezone
+from typing import List
+import argparse
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    MetaData,
+    String,
+    Table,
+    Text,
+    bindparam,
+    create_engine,
+    text,
+)
+from sqlalchemy.engine.url import make_url
+from sqlalchemy.pool import StaticPool
+
+from gazettes import DatabaseInterface, City, OpennessLevel
+from .csv import DEFAULT_SUGGESTION_WEIGHT, normalize_name, read_cities
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_TIMEOUT = 30
+DEFAULT_POOL_RECYCLE = 1800
+# Used as LIMIT when the caller wants all the rows. LIMIT NULL is not portable.
+NO_LIMIT = 2 ** 31 - 1
+
+metadata = MetaData()
+
+cities_table = Table(
+    "cities",
+    metadata,
+    Column("territory_id", String(16), primary_key=True),
+    Column("territory_name", String(128), nullable=False),
+    Column("normalized_name", String(128), nullable=False),
+    Column("state_code", String(2), nullable=False),
+    Column("level", String(1), nullable=False),
+    Column("publication_urls", Text, nullable=False, default=""),
+    Column("updated_at", DateTime, nullable=False),
+    # text_pattern_ops allows PostgreSQL to use the index for LIKE 'prefix%'
+    Index(
+        "ix_cities_normalized_name",
+        "normalized_name",
+        postgresql_ops={"normalized_name": "text_pattern_ops"},
+    ),
+    Index("ix_cities_state_code", "state_code"),
+    Index("ix_cities_updated_at", "updated_at"),
+)
+
+# Trigram index used by PostgreSQL for LIKE '%substring%'
+TRIGRAM_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_cities_normalized_name_trigram
+ON cities USING gin (normalized_name gin_trgm_ops)
+"""
+
+# SQL expressions with the same ranking as SUGGESTION_WEIGHTS in the CSV
+# implementation.
+SUGGESTION_WEIGHTS = {
+    "openness_level": "CAST(level AS INTEGER)",
+    "publication_urls": (
+        "CASE WHEN publication_urls = '' THEN 0 ELSE "
+        "length(publication_urls) - length(replace(publication_urls, ',', '')) + 1 "
+        "END"
+    ),
+}
+
+CITY_COLUMNS = "territory_id, territory_name, state_code, level, publication_urls"
+
+ALL_CITIES = text(
+    f"SELECT {CITY_COLUMNS} FROM cities ORDER BY territory_id LIMIT :limit"
+)
+
+SEARCH_CITIES = text(
+    f"""
+    SELECT {CITY_COLUMNS},
+        CASE
+            WHEN normalized_name = :name THEN 0
+            WHEN normalized_name LIKE :prefix THEN 1
+            WHEN normalized_name LIKE :word THEN 2
+            ELSE 3
+        END AS match_rank
+    FROM cities
+    WHERE normalized_name LIKE :substring
+    ORDER BY match_rank, length(normalized_name), normalized_name
+    LIMIT :limit
+    """
+)
+
+LAST_MODIFIED = text("SELECT max(updated_at) FROM cities")
+COUNT_CITIES = text("SELECT count(*) FROM cities")
+
+GET_CITY = text(f"SELECT {CITY_COLUMNS} FROM cities WHERE territory_id = :territory_id")
+
+GET_CITIES_BY_IDS = text(
+    f"SELECT {CITY_COLUMNS} FROM cities WHERE territory_id IN :territory_ids"
+).bindparams(bindparam("territory_ids", expanding=True))
+
+UPDATE_CITY = text(
+    """
+    UPDATE cities SET
+        territory_name = :territory_name,
+        normalized_name = :normalized_name,
+        state_code = :state_code,
+        level = :level,
+        publication_urls = :publication_urls,
+        updated_at = :updated_at
+    WHERE territory_id = :territory_id
+    """
+)
+
+INSERT_CITY = text(
+    """
+    INSERT INTO cities (territory_id, territory_name, normalized_name, state_code,
+        level, publication_urls, updated_at)
+    VALUES (:territory_id, :territory_name, :normalized_name, :state_code, :level,
+        :publication_urls, :updated_at)
+    """
+)
+
+
+def suggest_cities_statement(weight: str):
+    return text(
+        f"""
+        SELECT {CITY_COLUMNS},
+            CASE
+                WHEN normalized_name LIKE :prefix THEN 0
+                WHEN normalized_name LIKE :word THEN 1
+                ELSE 2
+            END AS match_kind
+        FROM cities
+        WHERE normalized_name LIKE :prefix
+            OR normalized_name LIKE :word
+            OR lower(state_code) LIKE :prefix
+        ORDER BY match_kind, {SUGGESTION_WEIGHTS[weight]} DESC, length(normalized_name),
+            normalized_name
+        LIMIT :limit
+        """
+    )
+
+
+def create_sql_engine(
+    database_url: str,
+    pool_size: int = DEFAULT_POOL_SIZE,
+    max_overflow: int = DEFAULT_MAX_OVERFLOW,
+    pool_timeout: int = DEFAULT_POOL_TIMEOUT,
+    pool_recycle: int = DEFAULT_POOL_RECYCLE,
+):
+    """
+    Create the engine with a connection pool shared by the API threads.
+    Connections are checked before use (pool_pre_ping) and replaced after
+    pool_recycle seconds, so the API survives database restarts and idle
+    connection timeouts.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite":
+        # SQLite connections cannot be shared by threads by default and an in
+        # memory database exists only in its connection.
+        return create_engine(
+            url, connect_args={"check_same_thread": False}, poolclass=StaticPool,
+        )
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_recycle=pool_recycle,
+        pool_pre_ping=True,
+    )
+
+
+def create_schema(engine):
+    metadata.create_all(engine)
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as connection:
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            connection.execute(text(TRIGRAM_INDEX))
+
+
+def city_from_row(row):
+    return City(
+        row["territory_name"],
+        row["territory_id"],
+        row["state_code"],
+        OpennessLevel(row["level"]),
+        row["publication_urls"].split(",") if row["publication_urls"] else None,
+    )
+
+
+class SQLDatabase(DatabaseInterface):
+    """
+    Database interface implementation backed by a SQL database. Several API
+    processes can share the same database and the cities can be updated
+    while the API is running.
+
+    Unlike the in memory implementations, city names with typos are not
+    found. Only names containing the searched name are returned.
+    """
+
+    def __init__(
+        self,
+        database_url: str = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        max_overflow: int = DEFAULT_MAX_OVERFLOW,
+        pool_timeout: int = DEFAULT_POOL_TIMEOUT,
+        pool_recycle: int = DEFAULT_POOL_RECYCLE,
+        suggestion_weight: str = DEFAULT_SUGGESTION_WEIGHT,
+        engine=None,
+    ):
+        if engine is None:
+            if database_url is None or len(database_url.strip()) == 0:
+                raise Exception("Missing database URL")
+            engine = create_sql_engine(
+                database_url.strip(),
+                pool_size,
+                max_overflow,
+                pool_timeout,
+                pool_recycle,
+            )
+        if suggestion_weight not in SUGGESTION_WEIGHTS:
+            raise Exception("Invalid suggestion weight")
+        self._engine = engine
+        self._suggest_cities = suggest_cities_statement(suggestion_weight)
+
+    def close(self):
+        self._engine.dispose()
+
+    def _query(self, statement, **parameters):
+        with self._engine.connect() as connection:
+            return [
+                city_from_row(row) for row in connection.execute(statement, parameters)
+            ]
+
+    def save_cities(self, cities: List[City]):
+        """
+        Insert or update the given cities in a single transaction
+        """
+        updated_at = datetime.utcnow()
+        with self._engine.begin() as connection:
+            for city in cities:
+                parameters = {
+                    "territory_id": city.territory_id,
+                    "territory_name": city.territory_name,
+                    "normalized_name": normalize_name(city.territory_name),
+                    "state_code": city.state_code,
+                    "level": city.level.value,
+                    "publication_urls": ",".join(city.publication_urls or []),
+                    "updated_at": updated_at,
+                }
+                if connection.execute(UPDATE_CITY, parameters).rowcount == 0:
+                    connection.execute(INSERT_CITY, parameters)
+
+    def get_cities(self, city_name: str = None, limit: int = None):
+        name = normalize_name(city_name or "")
+        limit = NO_LIMIT if limit is None else limit
+        if len(name) == 0:
+            return self._query(ALL_CITIES, limit=limit)
+        return self._query(
+            SEARCH_CITIES,
+            name=name,
+            prefix=f"{name}%",
+            word=f"% {name}%",
+            substring=f"%{name}%",
+            limit=limit,
+        )
+
+    def suggest_cities(self, prefix: str, limit: int = 10):
+        prefix = normalize_name(prefix)
+        if len(prefix) == 0:
+            return []
+        return self._query(
+            self._suggest_cities, prefix=f"{prefix}%", word=f"% {prefix}%", limit=limit
+        )
+
+    def get_last_modified(self):
+        with self._engine.connect() as connection:
+            last_modified = connection.execute(LAST_MODIFIED).scalar()
+        if last_modified is None:
+            return None
+        # SQLite returns the timestamp as text
+        if isinstance(last_modified, str):
+            last_modified = datetime.fromisoformat(last_modified)
+        return last_modified.replace(tzinfo=timezone.utc)
+
+    def count_cities(self):
+        with self._engine.connect() as connection:
+            return connection.execute(COUNT_CITIES).scalar()
+
+    def get_city(self, territory_id: str):
+        cities = self._query(GET_CITY, territory_id=territory_id)
+        return cities[0] if cities else None
+
+    def get_cities_by_ids(self, territory_ids: List[str]):
+        territory_ids = list(dict.fromkeys(territory_ids))
+        if len(territory_ids) == 0:
+            return []
+        cities = {
+            city.territory_id: city
+            for city in self._query(GET_CITIES_BY_IDS, territory_ids=territory_ids)
+        }
+        return [cities[id] for id in territory_ids if id in cities]
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Create the cities table and load the cities from the CSV file"
+    )
+    parser.add_argument("database_url", help="SQLAlchemy database URL")
+    parser.add_argument("database_file", help="Cities CSV database file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_arguments()
+    engine = create_sql_engine(arguments.database_url)
+    create_schema(engine)
+    SQLDatabase(engine=engine).save_cities(read_cities(arguments.database_file))
@@ -0,0 +1,6 @@
+from .server import (
+    ElasticsearchError,
+    FakeElasticsearch,
+    FakeElasticsearchServer,
+    FaultInjection,
+)
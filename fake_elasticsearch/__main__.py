@@ -0,0 +1,68 @@
+import argparse
+import json
+
+from fake_elasticsearch import (
+    FakeElasticsearch,
+    FakeElasticsearchServer,
+    FaultInjection,
+)
+
+
+def load_corpus(elasticsearch, corpus_file, index, id_field):
+    with open(corpus_file) as corpus:
+        documents = [json.loads(line) for line in corpus if line.strip()]
+    elasticsearch.add_documents(index, documents, id_field)
+    print(f"{len(documents)} documents loaded into the index {index}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Local stand-in for the Elasticsearch API used by the Querido Diário API"
+    )
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument(
+        "--corpus", help="NDJSON file with one document per line loaded at startup"
+    )
+    parser.add_argument("--index", default="gazettes")
+    parser.add_argument("--id-field", default="file_checksum")
+    parser.add_argument("--latency", type=float, default=0, help="Latency in ms")
+    parser.add_argument("--jitter", type=float, default=0, help="Jitter in ms")
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--hang-rate", type=float, default=0)
+    parser.add_argument("--hang-time", type=float, default=30, help="Hang in seconds")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--verbose", action="store_true")
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+    elasticsearch = FakeElasticsearch(
+        FaultInjection(
+            latency=arguments.latency,
+            jitter=arguments.jitter,
+            error_rate=arguments.error_rate,
+            error_status=arguments.error_status,
+            hang_rate=arguments.hang_rate,
+            hang_time=arguments.hang_time,
+            seed=arguments.seed,
+        )
+    )
+    if arguments.corpus:
+        load_corpus(
+            elasticsearch, arguments.corpus, arguments.index, arguments.id_field
+        )
+    server = FakeElasticsearchServer(
+        arguments.host, arguments.port, elasticsearch, arguments.verbose
+    )
+    print(f"Fake Elasticsearch listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
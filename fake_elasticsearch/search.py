@@ -0,0 +1,464 @@
+import re
+import time
+
+TOKEN_PATTERN = re.compile(r"\w+(?:[.,]\w+)*")
+
+
+def tokenize(text):
+    return [token.lower() for token in TOKEN_PATTERN.findall(str(text))]
+
+
+def get_field(source: dict, field: str):
+    """
+    Get the value of a field from the document. It ignores the ".keyword"
+    suffix used by the dynamic mappings multi-fields
+    """
+    if field.endswith(".keyword"):
+        field = field[: -len(".keyword")]
+    value = source
+    for part in field.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def field_values(source: dict, field: str):
+    value = get_field(source, field)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def same_value(left, right):
+    if isinstance(left, str) or isinstance(right, str):
+        return str(left).lower() == str(right).lower()
+    return left == right
+
+
+def comparable(value):
+    return value if isinstance(value, (int, float)) else str(value)
+
+
+def in_range(value, conditions: dict):
+    try:
+        value = comparable(value)
+        for operator, limit in conditions.items():
+            if operator in ("format", "time_zone", "boost", "relation"):
+                continue
+            limit = comparable(limit)
+            if operator == "gte" and not value >= limit:
+                return False
+            if operator == "gt" and not value > limit:
+                return False
+            if operator == "lte" and not value <= limit:
+                return False
+            if operator == "lt" and not value < limit:
+                return False
+    except TypeError:
+        return False
+    return True
+
+
+def match_score(source: dict, field: str, options):
+    """
+    Number of query terms found in the field or None when the document does
+    not match the query
+    """
+    if not isinstance(options, dict):
+        options = {"query": options}
+    terms = tokenize(options.get("query", ""))
+    if not terms:
+        return None
+    document_terms = set()
+    for value in field_values(source, field):
+        document_terms.update(tokenize(value))
+    found = sum(1 for term in terms if term in document_terms)
+    if options.get("operator", "OR").upper() == "AND":
+        return found if found == len(terms) else None
+    return found if found > 0 else None
+
+
+def clause_list(clauses):
+    if clauses is None:
+        return []
+    return clauses if isinstance(clauses, list) else [clauses]
+
+
+def evaluate(query: dict, source: dict, document_id: str):
+    """
+    Return the document score when it matches the query or None otherwise
+    """
+    if not query:
+        return 1.0
+    ((query_type, options),) = query.items()
+    if query_type == "match_all":
+        return 1.0
+    if query_type == "match_none":
+        return None
+    if query_type == "ids":
+        return 1.0 if document_id in options.get("values", []) else None
+    if query_type == "term":
+        ((field, value),) = options.items()
+        if isinstance(value, dict):
+            value = value.get("value")
+        values = field_values(source, field)
+        return 1.0 if any(same_value(item, value) for item in values) else None
+    if query_type == "terms":
+        field, accepted = next(
+            (field, values) for field, values in options.items() if field != "boost"
+        )
+        values = field_values(source, field)
+        return (
+            1.0
+            if any(same_value(item, value) for item in values for value in accepted)
+            else None
+        )
+    if query_type == "exists":
+        return 1.0 if field_values(source, options["field"]) else None
+    if query_type == "range":
+        ((field, conditions),) = options.items()
+        values = field_values(source, field)
+        return 1.0 if any(in_range(value, conditions) for value in values) else None
+    if query_type == "match":
+        ((field, match_options),) = options.items()
+        score = match_score(source, field, match_options)
+        return None if score is None else float(score)
+    if query_type == "bool":
+        return evaluate_bool(options, source, document_id)
+    raise ValueError(f"Query [{query_type}] is not supported by the fake server")
+
+
+def evaluate_bool(options: dict, source: dict, document_id: str):
+    score = 0.0
+    for clause in clause_list(options.get("must")):
+        clause_score = evaluate(clause, source, document_id)
+        if clause_score is None:
+            return None
+        score += clause_score
+    for clause in clause_list(options.get("filter")):
+        if evaluate(clause, source, document_id) is None:
+            return None
+    for clause in clause_list(options.get("must_not")):
+        if evaluate(clause, source, document_id) is not None:
+            return None
+    should = clause_list(options.get("should"))
+    should_scores = [evaluate(clause, source, document_id) for clause in should]
+    matched_should = [value for value in should_scores if value is not None]
+    default_minimum = 0 if options.get("must") or options.get("filter") else 1
+    minimum_should_match = int(options.get("minimum_should_match", default_minimum))
+    if should and len(matched_should) < minimum_should_match:
+        return None
+    return score + sum(matched_should) or 1.0
+
+
+def sort_key(sort_field: str, order: str):
+    def key(hit):
+        if sort_field == "_score":
+            return hit["_score"]
+        value = get_field(hit["_source"], sort_field)
+        return comparable(value) if value is not None else None
+
+    return key, order == "desc"
+
+
+def sort_hits(hits: list, sort):
+    """
+    Sort the hits using the fields in the sort clause, starting by the last
+    one to keep the ordering of the previous fields
+    """
+    values = []
+    for clause in reversed(clause_list(sort)):
+        if isinstance(clause, str):
+            field, order = clause, "desc" if clause == "_score" else "asc"
+        else:
+            ((field, options),) = clause.items()
+            order = (
+                options.get("order", "asc") if isinstance(options, dict) else options
+            )
+        key, reverse = sort_key(field, order)
+        missing = [hit for hit in hits if key(hit) is None]
+        present = [hit for hit in hits if key(hit) is not None]
+        present.sort(key=key, reverse=reverse)
+        hits = present + missing
+        values.insert(0, key)
+    for hit in hits:
+        hit["sort"] = [key(hit) for key in values]
+    return hits
+
+
+def highlight_terms(query: dict, field: str, terms: set):
+    """
+    Collect the terms from the match queries executed against the field
+    """
+    if not isinstance(query, dict):
+        return terms
+    for query_type, options in query.items():
+        if query_type == "match" and field in options:
+            match_options = options[field]
+            if isinstance(match_options, dict):
+                match_options = match_options.get("query", "")
+            terms.update(tokenize(match_options))
+        elif isinstance(options, dict):
+            highlight_terms(options, field, terms)
+        elif isinstance(options, list):
+            for clause in options:
+                highlight_terms(clause, field, terms)
+    return terms
+
+
+def highlight_fragments(text: str, terms: set, options: dict):
+    fragment_size = options.get("fragment_size", 100)
+    number_of_fragments = options.get("number_of_fragments", 5)
+    pre_tag = clause_list(options.get("pre_tags", ["<em>"]))[0]
+    post_tag = clause_list(options.get("post_tags", ["</em>"]))[0]
+    matches = [
+        match
+        for match in TOKEN_PATTERN.finditer(text)
+        if match.group().lower() in terms
+    ]
+    if not matches:
+        return []
+    if number_of_fragments == 0:
+        windows = [(0, len(text))]
+    else:
+        windows = []
+        for match in matches:
+            if windows and match.start() < windows[-1][1]:
+                continue
+            start = max(0, match.start() - (fragment_size - len(match.group())) // 2)
+            windows.append((start, min(len(text), start + fragment_size)))
+            if len(windows) == number_of_fragments:
+                break
+    fragments = []
+    for start, end in windows:
+        fragment = ""
+        position = start
+        for match in matches:
+            if match.start() >= start and match.end() <= end:
+                fragment += text[position : match.start()]
+                fragment += f"{pre_tag}{match.group()}{post_tag}"
+                position = match.end()
+        fragments.append((fragment + text[position:end]).strip())
+    return fragments
+
+
+def highlight(hit: dict, query: dict, highlight_options: dict):
+    fields = {}
+    for field, options in highlight_options.get("fields", {}).items():
+        terms = highlight_terms(query, field, set())
+        fragments = []
+        for value in field_values(hit["_source"], field):
+            fragments.extend(highlight_fragments(str(value), terms, options))
+        if fragments:
+            fields[field] = fragments
+    return fields
+
+
+def aggregate(aggregations: dict, hits: list):
+    results = {}
+    for name, aggregation in aggregations.items():
+        ((aggregation_type, options),) = aggregation.items()
+        values = [
+            value
+            for hit in hits
+            for value in field_values(hit["_source"], options["field"])
+        ]
+        if aggregation_type == "max":
+            value = max((comparable(value) for value in values), default=None)
+            results[name] = {"value": value}
+        elif aggregation_type == "min":
+            value = min((comparable(value) for value in values), default=None)
+            results[name] = {"value": value}
+        elif aggregation_type == "cardinality":
+            results[name] = {"value": len({str(value) for value in values})}
+        elif aggregation_type == "value_count":
+            results[name] = {"value": len(values)}
+        else:
+            raise ValueError(
+                f"Aggregation [{aggregation_type}] is not supported by the fake server"
+            )
+    return results
+
+
+def collapse_hits(hits: list, collapse: dict):
+    """
+    Keep the first hit of each group of hits with the same value in the
+    collapse field. Inner hits only report the number of hits in the group.
+    """
+    groups = {}
+    collapsed = []
+    for hit in hits:
+        key = str(get_field(hit["_source"], collapse["field"]))
+        if key not in groups:
+            groups[key] = []
+            collapsed.append(hit)
+        groups[key].append(hit)
+    for inner_hits in clause_list(collapse.get("inner_hits")):
+        for hit in collapsed:
+            group = groups[str(get_field(hit["_source"], collapse["field"]))]
+            size = inner_hits.get("size", 3)
+            hit.setdefault("inner_hits", {})[inner_hits["name"]] = {
+                "hits": {
+                    "total": {"value": len(group), "relation": "eq"},
+                    "max_score": None,
+                    "hits": [dict(inner) for inner in group[:size]],
+                }
+            }
+    return collapsed
+
+
+def describe_clauses(options: dict):
+    prefixes = (("must", "+"), ("filter", "#"), ("should", ""), ("must_not", "-"))
+    return [
+        f"{prefix}{describe(clause)}"
+        for occur, prefix in prefixes
+        for clause in clause_list(options.get(occur))
+    ]
+
+
+def describe(query: dict):
+    """
+    Describe the query as the Lucene query string shown by the explain of
+    the validate API
+    """
+    if not query:
+        return "*:*"
+    ((query_type, options),) = query.items()
+    if query_type == "match_all":
+        return "*:*"
+    if query_type == "match_none":
+        return 'MatchNoDocsQuery("")'
+    if query_type == "ids":
+        return "_id:(" + " ".join(options.get("values", [])) + ")"
+    if query_type == "term":
+        ((field, value),) = options.items()
+        if isinstance(value, dict):
+            value = value.get("value")
+        return f"{field}:{value}"
+    if query_type == "terms":
+        field, accepted = next(
+            (field, values) for field, values in options.items() if field != "boost"
+        )
+        return f"{field}:(" + " ".join(str(value) for value in accepted) + ")"
+    if query_type == "exists":
+        return f"_exists_:{options['field']}"
+    if query_type == "range":
+        ((field, conditions),) = options.items()
+        lower = conditions.get("gte", conditions.get("gt", "*"))
+        upper = conditions.get("lte", conditions.get("lt", "*"))
+        opening = "{" if "gt" in conditions else "["
+        closing = "}" if "lt" in conditions else "]"
+        return f"{field}:{opening}{lower} TO {upper}{closing}"
+    if query_type == "match":
+        ((field, match_options),) = options.items()
+        if not isinstance(match_options, dict):
+            match_options = {"query": match_options}
+        operator = (
+            "+" if str(match_options.get("operator", "OR")).upper() == "AND" else ""
+        )
+        return " ".join(
+            f"{operator}{field}:{token}"
+            for token in tokenize(match_options.get("query", ""))
+        )
+    if query_type == "bool":
+        return "(" + " ".join(describe_clauses(options)) + ")"
+    raise ValueError(f"Query [{query_type}] is not supported by the fake server")
+
+
+def profile_query(query: dict, time_in_nanos: int):
+    """
+    Profile in the format returned by Elasticsearch. The fake server does not
+    measure each query, so the whole search time is given to the top query.
+    """
+    query = query or {"match_all": {}}
+    ((query_type, options),) = query.items()
+    children = []
+    if query_type == "bool":
+        children = [
+            profile_query(clause, 0)
+            for occur in ("must", "filter", "should", "must_not")
+            for clause in clause_list(options.get(occur))
+        ]
+    return {
+        "type": query_type,
+        "description": describe(query),
+        "time_in_nanos": time_in_nanos,
+        "breakdown": {},
+        "children": children,
+    }
+
+
+def search_documents(documents: list, body: dict, params: dict):
+    """
+    Execute the search request body against the documents. Documents are
+    tuples with the index name, the document ID and the document source.
+    """
+    started = time.monotonic()
+    query = body.get("query", {"match_all": {}})
+    hits = []
+    for index, document_id, source in documents:
+        score = evaluate(query, source, document_id)
+        if score is not None:
+            hits.append(
+                {
+                    "_index": index,
+                    "_type": "_doc",
+                    "_id": document_id,
+                    "_score": score,
+                    "_source": source,
+                }
+            )
+    total = len(hits)
+    if "sort" in body:
+        hits = sort_hits(hits, body["sort"])
+        for hit in hits:
+            hit["_score"] = None
+    else:
+        hits.sort(key=lambda hit: hit["_score"], reverse=True)
+    aggregations = aggregate(body.get("aggs", body.get("aggregations", {})), hits)
+    if "collapse" in body:
+        hits = collapse_hits(hits, body["collapse"])
+    offset = int(body.get("from", params.get("from", 0)))
+    size = int(body.get("size", params.get("size", 10)))
+    page = hits[offset : offset + size]
+    if "highlight" in body:
+        for hit in page:
+            fields = highlight(hit, query, body["highlight"])
+            if fields:
+                hit["highlight"] = fields
+    max_score = max(
+        (hit["_score"] for hit in page if hit["_score"] is not None), default=None
+    )
+    response = {
+        "took": int((time.monotonic() - started) * 1000),
+        "timed_out": False,
+        "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+        "hits": {
+            "total": {"value": total, "relation": "eq"},
+            "max_score": max_score,
+            "hits": page,
+        },
+    }
+    if aggregations:
+        response["aggregations"] = aggregations
+    if body.get("profile"):
+        time_in_nanos = int((time.monotonic() - started) * 1_000_000_000)
+        response["profile"] = {
+            "shards": [
+                {
+                    "id": "[fake-elasticsearch][{}][0]".format(
+                        ",".join(sorted({index for index, _, _ in documents}))
+                    ),
+                    "searches": [
+                        {
+                            "query": [profile_query(query, time_in_nanos)],
+                            "rewrite_time": 0,
+                            "collector": [],
+                        }
+                    ],
+                    "aggregations": [],
+                }
+            ]
+        }
+    return response
@@ -0,0 +1,484 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+from .search import describe, search_documents
+
+ES_VERSION = "7.9.1"
+
+
+class FaultInjection:
+    """
+    Latency and failures added to the requests handled by the fake server
+
+    latency and jitter are in milliseconds. error_rate is the probability of a
+    request failing with error_status. hang_rate is the probability of a
+    request taking hang_time seconds to be answered, which is useful to
+    trigger client timeouts.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0,
+        jitter: float = 0,
+        error_rate: float = 0,
+        error_status: int = 503,
+        hang_rate: float = 0,
+        hang_time: float = 30,
+        seed: int = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.hang_time = hang_time
+        self._random = random.Random(seed)
+
+    def delay(self):
+        if self.hang_rate > 0 and self._random.random() < self.hang_rate:
+            return self.hang_time
+        delay = self.latency
+        if self.jitter > 0:
+            delay += self._random.uniform(-self.jitter, self.jitter)
+        return max(delay, 0) / 1000
+
+    def should_fail(self):
+        return self.error_rate > 0 and self._random.random() < self.error_rate
+
+
+class Index:
+    def __init__(self, name: str, mappings: dict = None):
+        self.name = name
+        self.mappings = mappings or {}
+        self.documents = {}
+        self.uuid = uuid.uuid4().hex
+
+
+class ElasticsearchError(Exception):
+    def __init__(self, status: int, error_type: str, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.error_type = error_type
+        self.reason = reason
+
+    def body(self):
+        return {
+            "error": {
+                "root_cause": [{"type": self.error_type, "reason": self.reason}],
+                "type": self.error_type,
+                "reason": self.reason,
+            },
+            "status": self.status,
+        }
+
+
+class FakeElasticsearch:
+    """
+    In memory corpus answering the subset of the Elasticsearch API used by
+    ElasticSearchDataMapper and by the scripts loading data into the index.
+    """
+
+    def __init__(self, faults: FaultInjection = None):
+        self.faults = faults or FaultInjection()
+        self._indices = {}
+        self._lock = threading.Lock()
+
+    def index_exists(self, name: str):
+        return all(index in self._indices for index in name.split(","))
+
+    def get_index(self, name: str):
+        if name not in self._indices:
+            raise ElasticsearchError(
+                404, "index_not_found_exception", f"no such index [{name}]"
+            )
+        return self._indices[name]
+
+    def create_index(self, name: str, body: dict = None):
+        with self._lock:
+            if name in self._indices:
+                raise ElasticsearchError(
+                    400,
+                    "resource_already_exists_exception",
+                    f"index [{name}/{self._indices[name].uuid}] already exists",
+                )
+            self._indices[name] = Index(name, (body or {}).get("mappings"))
+        return {"acknowledged": True, "shards_acknowledged": True, "index": name}
+
+    def delete_index(self, name: str, ignore_unavailable: bool = False):
+        with self._lock:
+            if name not in self._indices and not ignore_unavailable:
+                self.get_index(name)
+            self._indices.pop(name, None)
+        return {"acknowledged": True}
+
+    def add_documents(self, index: str, documents, id_field: str = None):
+        """
+        Add documents into the index, creating it when necessary
+        """
+        with self._lock:
+            if index not in self._indices:
+                self._indices[index] = Index(index)
+            target = self._indices[index]
+            for document in documents:
+                document_id = document.get(id_field) if id_field else None
+                target.documents[document_id or uuid.uuid4().hex] = document
+
+    def bulk(self, operations: list, default_index: str = None):
+        items = []
+        errors = False
+        operations = iter(operations)
+        for action in operations:
+            ((operation, metadata),) = action.items()
+            index = metadata.get("_index", default_index)
+            document_id = metadata.get("_id") or uuid.uuid4().hex
+            source = next(operations) if operation != "delete" else None
+            status, result = self._bulk_operation(operation, index, document_id, source)
+            errors = errors or status >= 400
+            items.append(
+                {
+                    operation: {
+                        "_index": index,
+                        "_type": "_doc",
+                        "_id": document_id,
+                        "result": result,
+                        "status": status,
+                    }
+                }
+            )
+        return {"took": 1, "errors": errors, "items": items}
+
+    def _bulk_operation(self, operation, index, document_id, source):
+        with self._lock:
+            if index not in self._indices:
+                self._indices[index] = Index(index)
+            documents = self._indices[index].documents
+            exists = document_id in documents
+            if operation == "delete":
+                documents.pop(document_id, None)
+                return (200, "deleted") if exists else (404, "not_found")
+            if operation == "create" and exists:
+                return 409, "version_conflict"
+            if operation == "update":
+                if not exists:
+                    return 404, "document_missing"
+                documents[document_id] = {**documents[document_id], **source["doc"]}
+                return 200, "updated"
+            documents[document_id] = source
+            return (200, "updated") if exists else (201, "created")
+
+    def search(self, index: str = None, body: dict = None, params: dict = None):
+        # Copied under the lock, as bulk can change the documents meanwhile
+        with self._lock:
+            names = index.split(",") if index else list(self._indices)
+            documents = []
+            for name in names:
+                documents.extend(
+                    (name, document_id, source)
+                    for document_id, source in self.get_index(name).documents.items()
+                )
+        return search_documents(documents, body or {}, params or {})
+
+    def msearch(self, lines: list, default_index: str = None):
+        started = time.monotonic()
+        responses = []
+        for header, body in zip(lines[::2], lines[1::2]):
+            try:
+                response = self.search(header.get("index", default_index), body)
+                response["status"] = 200
+            except ElasticsearchError as error:
+                response = error.body()
+            responses.append(response)
+        took = int((time.monotonic() - started) * 1000)
+        return {"took": took, "responses": responses}
+
+    def count(self, index: str = None, body: dict = None):
+        body = {"query": (body or {}).get("query", {"match_all": {}}), "size": 0}
+        total = self.search(index, body)["hits"]["total"]["value"]
+        return {
+            "count": total,
+            "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+        }
+
+    def validate_query(self, index: str = None, body: dict = None, explain=False):
+        """
+        Validate the query of the body as the validate API. The fake server
+        only knows whether it supports the query.
+        """
+        names = index.split(",") if index else list(self._indices)
+        for name in names:
+            self.get_index(name)
+        query = (body or {}).get("query", {"match_all": {}})
+        try:
+            explanation = describe(query)
+            error = None
+        except (ValueError, AttributeError, KeyError, StopIteration) as exception:
+            error = f"[{names[0] if names else '_all'}] {exception}"
+        response = {
+            "_shards": {"total": 1, "successful": 1, "failed": 0},
+            "valid": error is None,
+        }
+        if explain or error is not None:
+            response["explanations"] = [
+                {"index": name, "valid": error is None, "explanation": explanation}
+                if error is None
+                else {"index": name, "valid": False, "error": error}
+                for name in names
+            ]
+        return response
+
+    def cluster_health(self):
+        return {
+            "cluster_name": "fake-elasticsearch",
+            "status": "green",
+            "timed_out": False,
+            "number_of_nodes": 1,
+            "number_of_data_nodes": 1,
+            "active_primary_shards": len(self._indices),
+            "active_shards": len(self._indices),
+            "relocating_shards": 0,
+            "initializing_shards": 0,
+            "unassigned_shards": 0,
+        }
+
+    def info(self):
+        return {
+            "name": "fake-elasticsearch",
+            "cluster_name": "fake-elasticsearch",
+            "version": {"number": ES_VERSION, "build_flavor": "default"},
+            "tagline": "You Know, for Search",
+        }
+
+
+def _acknowledged_shards():
+    return {"_shards": {"total": 1, "successful": 1, "failed": 0}}
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeElasticsearch/" + ES_VERSION
+
+    ROUTES = [
+        ("GET", re.compile(r"^/$"), "info"),
+        ("HEAD", re.compile(r"^/$"), "ping"),
+        ("GET", re.compile(r"^/_cluster/health(?:/(?P<index>[^/_][^/]*))?$"), "health"),
+        ("POST", re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_bulk$"), "bulk"),
+        ("PUT", re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_bulk$"), "bulk"),
+        ("GET", re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_search$"), "search"),
+        ("POST", re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_search$"), "search"),
+        ("GET", re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_msearch$"), "msearch"),
+        ("POST", re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_msearch$"), "msearch"),
+        ("GET", re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_count$"), "count"),
+        ("POST", re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_count$"), "count"),
+        (
+            "GET",
+            re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_validate/query$"),
+            "validate_query",
+        ),
+        (
+            "POST",
+            re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_validate/query$"),
+            "validate_query",
+        ),
+        ("GET", re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_refresh$"), "refresh"),
+        ("POST", re.compile(r"^(?:/(?P<index>[^/_][^/]*))?/_refresh$"), "refresh"),
+        ("PUT", re.compile(r"^/(?P<index>[^/_][^/]*)/_doc/(?P<id>[^/]+)$"), "document"),
+        (
+            "POST",
+            re.compile(r"^/(?P<index>[^/_][^/]*)/_doc(?:/(?P<id>[^/]+))?$"),
+            "document",
+        ),
+        ("HEAD", re.compile(r"^/(?P<index>[^/_][^/]*)$"), "index_exists"),
+        ("PUT", re.compile(r"^/(?P<index>[^/_][^/]*)$"), "create_index"),
+        ("DELETE", re.compile(r"^/(?P<index>[^/_][^/]*)$"), "delete_index"),
+    ]
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self.handle_method("GET")
+
+    def do_POST(self):
+        self.handle_method("POST")
+
+    def do_PUT(self):
+        self.handle_method("PUT")
+
+    def do_DELETE(self):
+        self.handle_method("DELETE")
+
+    def do_HEAD(self):
+        self.handle_method("HEAD")
+
+    def handle_method(self, method: str):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        payload = self.read_payload()
+        faults = self.server.elasticsearch.faults
+        time.sleep(faults.delay())
+        if faults.should_fail():
+            error = ElasticsearchError(
+                faults.error_status, "fake_failure", "Failure injected by the server"
+            )
+            return self.send_json(error.status, error.body())
+        for route_method, pattern, name in self.ROUTES:
+            match = pattern.match(url.path)
+            if match and route_method == method:
+                if "id" in pattern.groupindex:
+                    params["_id"] = match.group("id")
+                try:
+                    status, body = getattr(self, f"handle_{name}")(
+                        match.group("index") if "index" in pattern.groupindex else None,
+                        params,
+                        payload,
+                    )
+                except ElasticsearchError as error:
+                    status, body = error.status, error.body()
+                except (ValueError, KeyError, TypeError) as error:
+                    error = ElasticsearchError(400, "parsing_exception", str(error))
+                    status, body = error.status, error.body()
+                return self.send_json(status, body)
+        error = ElasticsearchError(
+            405, "unsupported_operation", f"{method} {url.path} is not supported"
+        )
+        self.send_json(error.status, error.body())
+
+    def read_payload(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length > 0 else b""
+
+    def send_json(self, status: int, body):
+        content = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(content)
+
+    @staticmethod
+    def json_body(payload: bytes):
+        return json.loads(payload) if payload.strip() else {}
+
+    @staticmethod
+    def ndjson_body(payload: bytes):
+        return [json.loads(line) for line in payload.splitlines() if line.strip()]
+
+    def handle_info(self, index, params, payload):
+        return 200, self.server.elasticsearch.info()
+
+    def handle_ping(self, index, params, payload):
+        return 200, None
+
+    def handle_health(self, index, params, payload):
+        return 200, self.server.elasticsearch.cluster_health()
+
+    def handle_bulk(self, index, params, payload):
+        return 200, self.server.elasticsearch.bulk(self.ndjson_body(payload), index)
+
+    def handle_search(self, index, params, payload):
+        body = self.json_body(payload)
+        return 200, self.server.elasticsearch.search(index, body, params)
+
+    def handle_msearch(self, index, params, payload):
+        return 200, self.server.elasticsearch.msearch(self.ndjson_body(payload), index)
+
+    def handle_count(self, index, params, payload):
+        return 200, self.server.elasticsearch.count(index, self.json_body(payload))
+
+    def handle_validate_query(self, index, params, payload):
+        explain = params.get("explain", "false").lower() in ("", "true")
+        return (
+            200,
+            self.server.elasticsearch.validate_query(
+                index, self.json_body(payload), explain
+            ),
+        )
+
+    def handle_refresh(self, index, params, payload):
+        if index is not None:
+            self.server.elasticsearch.get_index(index)
+        return 200, _acknowledged_shards()
+
+    def handle_document(self, index, params, payload):
+        metadata = {"_index": index}
+        if params.get("_id"):
+            metadata["_id"] = params["_id"]
+        item = self.server.elasticsearch.bulk(
+            [{"index": metadata}, self.json_body(payload)]
+        )["items"][0]["index"]
+        return (
+            item["status"],
+            {
+                "_index": index,
+                "_type": "_doc",
+                "_id": item["_id"],
+                "result": item["result"],
+                "_shards": {"total": 1, "successful": 1, "failed": 0},
+            },
+        )
+
+    def handle_index_exists(self, index, params, payload):
+        return (200 if self.server.elasticsearch.index_exists(index) else 404), None
+
+    def handle_create_index(self, index, params, payload):
+        return (
+            200,
+            self.server.elasticsearch.create_index(index, self.json_body(payload)),
+        )
+
+    def handle_delete_index(self, index, params, payload):
+        ignore_unavailable = params.get("ignore_unavailable", "false") == "true"
+        return 200, self.server.elasticsearch.delete_index(index, ignore_unavailable)
+
+
+class FakeElasticsearchServer(ThreadingHTTPServer):
+    """
+    HTTP server exposing a FakeElasticsearch. Use port 0 to let the operating
+    system choose a free port.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 0,
+        elasticsearch: FakeElasticsearch = None,
+        verbose: bool = False,
+    ):
+        super().__init__((host, port), RequestHandler)
+        self.elasticsearch = elasticsearch or FakeElasticsearch()
+        self.verbose = verbose
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
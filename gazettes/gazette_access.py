@@ -2,6 +2,8 @@ import abc
 from typing import List
 from enum import Enum, unique
 
+from monitoring import span, timed
+
 
 class GazetteRequest:
     """
@@ -22,6 +24,8 @@ class GazetteRequest:
         number_of_fragments: int = 1,
         pre_tags: List[str] = [""],
         post_tags: List[str] = [""],
+        collapse: bool = False,
+        include_city: bool = False,
     ):
         self.territory_id = territory_id
         self.since = since
@@ -33,6 +37,8 @@ class GazetteRequest:
         self.number_of_fragments = number_of_fragments
         self.pre_tags = pre_tags
         self.post_tags = post_tags
+        self.collapse = collapse
+        self.include_city = include_city
 
 
 class GazetteDataGateway(abc.ABC):
@@ -52,11 +58,43 @@ class GazetteDataGateway(abc.ABC):
         number_of_fragments: int = 1,
         pre_tags: List[str] = [""],
         post_tags: List[str] = [""],
+        collapse: bool = False,
     ):
         """
         Method to get the gazette from storage
         """
 
+    @abc.abstractmethod
+    def get_index_generation(self):
+        """
+        Method to get a value which changes when the stored gazettes change
+        """
+
+    @abc.abstractmethod
+    def explain_gazettes(
+        self,
+        territory_id=None,
+        since=None,
+        until=None,
+        page: int = 0,
+        size: int = 10,
+        fragment_size: int = 150,
+        number_of_fragments: int = 1,
+        pre_tags: List[str] = [""],
+        post_tags: List[str] = [""],
+        collapse: bool = False,
+    ):
+        """
+        Method to get the query which get_gazettes would run, without running it
+        """
+
+    @abc.abstractmethod
+    def get_health(self):
+        """
+        Method to get the state of the storage: its status (green, yellow or
+        red, None when it cannot be reached) and whether the index exists
+        """
+
 
 class GazetteAccessInterface(abc.ABC):
     """
@@ -70,11 +108,54 @@ class GazetteAccessInterface(abc.ABC):
         """
 
     @abc.abstractmethod
-    def get_cities(self, citi_name: str = ""):
+    def explain_gazettes(self, filters: GazetteRequest = None):
+        """
+        Method to get how the gazettes would be searched, without searching
+        """
+
+    @abc.abstractmethod
+    def get_gazettes_version(self):
+        """
+        Method to get a value which changes when the gazettes change
+        """
+
+    @abc.abstractmethod
+    def get_cities_last_modified(self):
+        """
+        Method to get when the cities data changed for the last time
+        """
+
+    @abc.abstractmethod
+    def get_cities(self, citi_name: str = "", limit: int = None):
         """
         Method to get information about the cities
         """
 
+    @abc.abstractmethod
+    def suggest_cities(self, prefix: str, limit: int = 10):
+        """
+        Method to get the cities to suggest while the user types the prefix
+        """
+
+    @abc.abstractmethod
+    def get_city(self, territory_id: str):
+        """
+        Method to get information about the city with the given IBGE id
+        """
+
+    @abc.abstractmethod
+    def get_cities_by_ids(self, territory_ids: List[str]):
+        """
+        Method to get information about the cities with the given IBGE ids
+        """
+
+    @abc.abstractmethod
+    def get_health(self):
+        """
+        Method to get the state of the gazettes storage and of the cities
+        database
+        """
+
 
 class DatabaseInterface(abc.ABC):
     """
@@ -82,9 +163,43 @@ class DatabaseInterface(abc.ABC):
     """
 
     @abc.abstractmethod
-    def get_cities(self, city_name: str = None):
+    def get_cities(self, city_name: str = None, limit: int = None):
+        """
+        Get the cities and their openness level. The most relevant cities for
+        the given name come first. limit is the maximum number of cities.
+        """
+
+    @abc.abstractmethod
+    def suggest_cities(self, prefix: str, limit: int = 10):
+        """
+        Get the most relevant cities with the name or the state code starting
+        with the given prefix.
+        """
+
+    @abc.abstractmethod
+    def get_city(self, territory_id: str):
+        """
+        Get the city with the given IBGE id. None when it does not exist.
+        """
+
+    @abc.abstractmethod
+    def get_last_modified(self):
         """
-        Get the cities and their openness level.
+        Get when the cities data changed for the last time as an UTC datetime.
+        None when it is unknown.
+        """
+
+    @abc.abstractmethod
+    def get_cities_by_ids(self, territory_ids: List[str]):
+        """
+        Get the cities with the given IBGE ids in the same order. Unknown and
+        repeated ids are ignored.
+        """
+
+    @abc.abstractmethod
+    def count_cities(self):
+        """
+        Get the number of cities in the database.
         """
 
 
@@ -97,7 +212,7 @@ class GazetteAccess(GazetteAccessInterface):
         self._index_gateway = gazette_data_gateway
         self._database_gateway = database_gateway
 
-    def get_gazettes(self, filters: GazetteRequest = None):
+    def search_parameters(self, filters: GazetteRequest = None):
         territory_id = filters.territory_id if filters is not None else None
         since = filters.since if filters is not None else None
         until = filters.until if filters is not None else None
@@ -108,7 +223,8 @@ class GazetteAccess(GazetteAccessInterface):
         number_of_fragments = filters.number_of_fragments if filters is not None else 1
         pre_tags = filters.pre_tags if filters is not None else [""]
         post_tags = filters.post_tags if filters is not None else [""]
-        total_number_gazettes, gazettes = self._index_gateway.get_gazettes(
+        collapse = filters.collapse if filters is not None else False
+        return dict(
             territory_id=territory_id,
             since=since,
             until=until,
@@ -119,11 +235,70 @@ class GazetteAccess(GazetteAccessInterface):
             number_of_fragments=number_of_fragments,
             pre_tags=pre_tags,
             post_tags=post_tags,
+            collapse=collapse,
         )
-        return (total_number_gazettes, [vars(gazette) for gazette in gazettes])
 
-    def get_cities(self, city_name: str = ""):
-        return [vars(city) for city in self._database_gateway.get_cities(city_name)]
+    @span("gazettes.get_gazettes")
+    def get_gazettes(self, filters: GazetteRequest = None):
+        include_city = filters.include_city if filters is not None else False
+        total_number_gazettes, gazettes = self._index_gateway.get_gazettes(
+            **self.search_parameters(filters)
+        )
+        with timed("to_dict", "Gazette objects to dicts"):
+            gazettes = [gazette.as_dict() for gazette in gazettes]
+        if include_city:
+            self.add_cities(gazettes)
+        return (total_number_gazettes, gazettes)
+
+    def explain_gazettes(self, filters: GazetteRequest = None):
+        return self._index_gateway.explain_gazettes(**self.search_parameters(filters))
+
+    def add_cities(self, gazettes: List[dict]):
+        """
+        Add the city of each gazette. The cities of the whole page are fetched
+        in a single lookup.
+        """
+        territory_ids = [gazette["territory_id"] for gazette in gazettes]
+        cities = {
+            city.territory_id: city.as_dict()
+            for city in self._database_gateway.get_cities_by_ids(territory_ids)
+        }
+        for gazette in gazettes:
+            gazette["city"] = cities.get(gazette["territory_id"])
+
+    def get_gazettes_version(self):
+        return self._index_gateway.get_index_generation()
+
+    def get_cities_last_modified(self):
+        return self._database_gateway.get_last_modified()
+
+    def get_cities(self, city_name: str = "", limit: int = None):
+        return [
+            city.as_dict()
+            for city in self._database_gateway.get_cities(city_name, limit)
+        ]
+
+    def suggest_cities(self, prefix: str, limit: int = 10):
+        return [
+            city.as_dict()
+            for city in self._database_gateway.suggest_cities(prefix, limit)
+        ]
+
+    def get_city(self, territory_id: str):
+        city = self._database_gateway.get_city(territory_id)
+        return city.as_dict() if city is not None else None
+
+    def get_cities_by_ids(self, territory_ids: List[str]):
+        return [
+            city.as_dict()
+            for city in self._database_gateway.get_cities_by_ids(territory_ids)
+        ]
+
+    def get_health(self):
+        return {
+            "index": self._index_gateway.get_health(),
+            "database": {"cities": self._database_gateway.count_cities()},
+        }
 
 
 @unique
@@ -135,6 +310,15 @@ class OpennessLevel(str, Enum):
 
 
 class City:
+
+    __slots__ = (
+        "publication_urls",
+        "territory_id",
+        "territory_name",
+        "level",
+        "state_code",
+    )
+
     def __init__(
         self,
         name: str,
@@ -149,6 +333,15 @@ class City:
         self.level = openness_level
         self.state_code = uf
 
+    def as_dict(self):
+        return {
+            "publication_urls": self.publication_urls,
+            "territory_id": self.territory_id,
+            "territory_name": self.territory_name,
+            "level": self.level,
+            "state_code": self.state_code,
+        }
+
     def __eq__(self, other):
         return (
             self.territory_id == other.territory_id
@@ -172,6 +365,20 @@ class Gazette:
     Item to represent a gazette in memory inside the module
     """
 
+    __slots__ = (
+        "territory_id",
+        "date",
+        "url",
+        "territory_name",
+        "state_code",
+        "highlight_texts",
+        "edition",
+        "is_extra_edition",
+        "checksum",
+        "file_raw_txt",
+        "copies",
+    )
+
     def __init__(
         self,
         territory_id,
@@ -184,6 +391,7 @@ class Gazette:
         edition=None,
         is_extra_edition=None,
         file_raw_txt=None,
+        copies=None,
     ):
         self.territory_id = territory_id
         self.date = date
@@ -195,6 +403,24 @@ class Gazette:
         self.is_extra_edition = is_extra_edition
         self.checksum = checksum
         self.file_raw_txt = file_raw_txt
+        # Number of documents indexed for the same gazette file. It is only
+        # available when the search collapses the duplicated documents.
+        self.copies = copies
+
+    def as_dict(self):
+        return {
+            "territory_id": self.territory_id,
+            "date": self.date,
+            "url": self.url,
+            "territory_name": self.territory_name,
+            "state_code": self.state_code,
+            "highlight_texts": self.highlight_texts,
+            "edition": self.edition,
+            "is_extra_edition": self.is_extra_edition,
+            "checksum": self.checksum,
+            "file_raw_txt": self.file_raw_txt,
+            "copies": self.copies,
+        }
 
     def __hash__(self):
         return hash(
@@ -204,7 +430,7 @@ class Gazette:
                 self.url,
                 self.territory_name,
                 self.state_code,
-                str(self.highlight_texts),
+                tuple(self.highlight_texts),
                 self.edition,
                 self.is_extra_edition,
                 self.checksum,
@@ -220,7 +446,7 @@ class Gazette:
             and self.url == other.url
             and self.territory_name == other.territory_name
             and self.state_code == other.state_code
-            and str(self.highlight_texts) == str(other.highlight_texts)
+            and self.highlight_texts == other.highlight_texts
             and self.edition == other.edition
             and self.is_extra_edition == other.is_extra_edition
             and self.file_raw_txt == other.file_raw_txt
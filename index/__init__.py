@@ -1 +1,3 @@
 from .elasticsearch import ElasticSearchDataMapper, create_elasticsearch_data_mapper
+from .query_log import QueryLog, create_query_log, read_query_log
+from .slow_log import SlowQueryLog, create_slow_query_log
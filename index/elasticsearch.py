@@ -1,19 +1,111 @@
-from datetime import date, datetime
+from datetime import date
 import json
+import logging
+import time
 from typing import Dict, List
 
 import elasticsearch
+from elasticsearch.connection import Urllib3HttpConnection
 
 from gazettes import GazetteDataGateway, Gazette
+from monitoring import (
+    current_span,
+    histogram,
+    profile_elasticsearch,
+    record_elasticsearch_profile,
+    record_timing,
+    span,
+    timed,
+)
+from monitoring.metrics import COUNT_BUCKETS
+from .query_log import QueryLog, anonymize_request
+from .slow_log import SlowQueryLog
+
+SEARCH_DURATION = histogram(
+    "querido_diario_elasticsearch_request_duration_seconds",
+    "Round trip time of the searches sent to Elasticsearch",
+)
+SEARCH_TOOK = histogram(
+    "querido_diario_elasticsearch_took_seconds",
+    "Time spent by Elasticsearch in the searches, as reported in took",
+)
+SEARCH_OVERHEAD = histogram(
+    "querido_diario_elasticsearch_overhead_seconds",
+    "Round trip time minus took: network, queueing and JSON (de)serialization",
+)
+SEARCH_HITS = histogram(
+    "querido_diario_elasticsearch_hits",
+    "Number of gazettes found by the searches",
+    buckets=COUNT_BUCKETS,
+)
+
+
+class TracedConnection(Urllib3HttpConnection):
+    """
+    Record each request sent to an Elasticsearch node in a span. The
+    transport retries the failed requests in other nodes, so a search can
+    have more than one span. The span is sent in the traceparent header.
+    """
+
+    def perform_request(
+        self,
+        method,
+        url,
+        params=None,
+        body=None,
+        timeout=None,
+        ignore=(),
+        headers=None,
+    ):
+        attributes = {
+            "db.system": "elasticsearch",
+            "http.method": method,
+            "http.url": url,
+            "net.peer.name": self.host,
+        }
+        with span("elasticsearch.request", attributes, "client") as current:
+            if current is None:
+                return super().perform_request(
+                    method, url, params, body, timeout, ignore, headers
+                )
+            headers = {**(headers or {}), "traceparent": current.traceparent}
+            try:
+                status, response_headers, data = super().perform_request(
+                    method, url, params, body, timeout, ignore, headers
+                )
+            except elasticsearch.TransportError as error:
+                current.set_attribute("http.status_code", error.status_code)
+                raise
+            current.set_attribute("http.status_code", status)
+            return status, response_headers, data
 
 
 class ElasticSearchDataMapper(GazetteDataGateway):
 
     GAZETTE_CONTENT_FIELD = "source_text"
+    GAZETTE_CHECKSUM_FIELD = "file_checksum"
+    COPIES_INNER_HITS = "copies"
+    TOTAL_GAZETTES_AGGREGATION = "total_gazettes"
+    NEWEST_DATE_AGGREGATION = "newest_date"
+    # Seconds. The health is checked in the background, not by the requests.
+    HEALTH_TIMEOUT = 5
 
-    def __init__(self, host: str, index: str):
+    def __init__(
+        self,
+        host: str,
+        index: str,
+        query_log: QueryLog = None,
+        generation_ttl: float = 60,
+        slow_query_log: SlowQueryLog = None,
+    ):
         self._index = index
-        self._es = elasticsearch.Elasticsearch(hosts=[host])
+        self._query_log = query_log
+        self._slow_query_log = slow_query_log
+        self._generation_ttl = generation_ttl
+        self._generation = None
+        self._es = elasticsearch.Elasticsearch(
+            hosts=[host], connection_class=TracedConnection
+        )
         if not self._es.indices.exists(index=self._index):
             raise Exception("Index does not exist")
 
@@ -71,6 +163,22 @@ class ElasticSearchDataMapper(GazetteDataGateway):
             }
         }
 
+    def add_collapse(self, query):
+        """
+        Return only one document for each gazette file. The same file can be
+        indexed more than once (e.g. republished editions). The total uses the
+        number of distinct files because the hits total counts every document.
+        """
+        query["collapse"] = {
+            "field": self.GAZETTE_CHECKSUM_FIELD,
+            "inner_hits": {"name": self.COPIES_INNER_HITS, "size": 0},
+        }
+        query["aggs"] = {
+            self.TOTAL_GAZETTES_AGGREGATION: {
+                "cardinality": {"field": self.GAZETTE_CHECKSUM_FIELD}
+            }
+        }
+
     def build_query(
         self,
         territory_id: str = None,
@@ -83,6 +191,7 @@ class ElasticSearchDataMapper(GazetteDataGateway):
         number_of_fragments: int = 1,
         pre_tags: List[str] = [""],
         post_tags: List[str] = [""],
+        collapse: bool = False,
     ):
         if (
             territory_id is None
@@ -104,31 +213,63 @@ class ElasticSearchDataMapper(GazetteDataGateway):
         self.add_highlight(
             query, fragment_size, number_of_fragments, pre_tags, post_tags
         )
+        if collapse:
+            self.add_collapse(query)
 
         return query
 
     def _assemble_gazette_object(self, gazette):
+        source = gazette["_source"]
+        highlight = gazette.get("highlight")
+        inner_hits = gazette.get("inner_hits")
         return Gazette(
-            gazette["_source"]["territory_id"],
-            datetime.strptime(gazette["_source"]["date"], "%Y-%m-%d").date(),
-            gazette["_source"]["url"],
-            gazette["_source"]["file_checksum"],
-            gazette["_source"]["territory_name"],
-            gazette["_source"]["state_code"],
-            gazette["highlight"].get("source_text", [])
-            if "highlight" in gazette
-            else [],
-            gazette["_source"].get("edition_number", None),
-            gazette["_source"].get("is_extra_edition", None),
-            gazette["_source"].get("file_raw_txt", None),
+            source["territory_id"],
+            date.fromisoformat(source["date"]),
+            source["url"],
+            source["file_checksum"],
+            source["territory_name"],
+            source["state_code"],
+            highlight.get("source_text", []) if highlight is not None else [],
+            source.get("edition_number"),
+            source.get("is_extra_edition"),
+            source.get("file_raw_txt"),
+            inner_hits[self.COPIES_INNER_HITS]["hits"]["total"]["value"]
+            if inner_hits is not None
+            else None,
         )
 
     def create_list_with_gazette_objects(self, gazette_hits: List[Dict]):
         return [self._assemble_gazette_object(gazette) for gazette in gazette_hits]
 
     def get_total_number_items(self, search_response_json: Dict):
+        aggregations = search_response_json.get("aggregations")
+        if aggregations is not None and self.TOTAL_GAZETTES_AGGREGATION in aggregations:
+            return aggregations[self.TOTAL_GAZETTES_AGGREGATION]["value"]
         return search_response_json["hits"]["total"]["value"]
 
+    def record_query(self, request: Dict, search_response_json: Dict, elapsed: float):
+        request = anonymize_request(request)
+        self._query_log.record(
+            request,
+            self.build_query(**request),
+            elapsed,
+            search_response_json.get("took"),
+            self.get_total_number_items(search_response_json),
+        )
+
+    def record_metrics(
+        self, search_response_json: Dict, elapsed: float, total_number_items: int
+    ):
+        SEARCH_DURATION.observe(elapsed)
+        SEARCH_HITS.observe(total_number_items)
+        record_timing("es", elapsed, "Elasticsearch round trip")
+        took = search_response_json.get("took")
+        if took is not None:
+            record_timing("es_took", took / 1000, "Elasticsearch took")
+            SEARCH_TOOK.observe(took / 1000)
+            SEARCH_OVERHEAD.observe(max(0.0, elapsed - took / 1000))
+
+    @span("index.get_gazettes")
     def get_gazettes(
         self,
         territory_id=None,
@@ -141,7 +282,95 @@ class ElasticSearchDataMapper(GazetteDataGateway):
         number_of_fragments: int = 1,
         pre_tags: List[str] = [""],
         post_tags: List[str] = [""],
+        collapse: bool = False,
+    ):
+        query = self.build_query(
+            territory_id,
+            since,
+            until,
+            keywords,
+            offset,
+            size,
+            fragment_size,
+            number_of_fragments,
+            pre_tags,
+            post_tags,
+            collapse,
+        )
+        profile = profile_elasticsearch()
+        options = {}
+        current = current_span()
+        if current is not None:
+            # Shown in the Elasticsearch slow logs and tasks
+            options["opaque_id"] = current.trace_id
+        started = time.perf_counter()
+        gazettes = self._es.search(
+            body={**query, "profile": True} if profile else query,
+            index=self._index,
+            **options,
+        )
+        elapsed = time.perf_counter() - started
+        if profile:
+            record_elasticsearch_profile(gazettes.get("profile"))
+        total_number_items = self.get_total_number_items(gazettes)
+        self.record_metrics(gazettes, elapsed, total_number_items)
+        if current is not None:
+            current.set_attribute("elasticsearch.took", gazettes.get("took"))
+            current.set_attribute(
+                "elasticsearch.shards.failed",
+                gazettes.get("_shards", {}).get("failed"),
+            )
+            current.set_attribute("gazettes.total", total_number_items)
+        if self._query_log is not None or (
+            self._slow_query_log is not None and self._slow_query_log.is_slow(elapsed)
+        ):
+            request = {
+                "territory_id": territory_id,
+                "since": since,
+                "until": until,
+                "keywords": keywords,
+                "offset": offset,
+                "size": size,
+                "fragment_size": fragment_size,
+                "number_of_fragments": number_of_fragments,
+                "pre_tags": pre_tags,
+                "post_tags": post_tags,
+                "collapse": collapse,
+            }
+            if self._query_log is not None:
+                self.record_query(request, gazettes, elapsed)
+            if self._slow_query_log is not None:
+                self._slow_query_log.record(
+                    request,
+                    query,
+                    elapsed,
+                    gazettes,
+                    total_number_items,
+                    self.build_query,
+                )
+
+        with timed("decode", "create_list_with_gazette_objects"):
+            gazettes = self.create_list_with_gazette_objects(gazettes["hits"]["hits"])
+        return (total_number_items, gazettes)
+
+    def explain_gazettes(
+        self,
+        territory_id=None,
+        since=None,
+        until=None,
+        keywords=None,
+        offset=0,
+        size=10,
+        fragment_size: int = 150,
+        number_of_fragments: int = 1,
+        pre_tags: List[str] = [""],
+        post_tags: List[str] = [""],
+        collapse: bool = False,
     ):
+        """
+        Return the query which get_gazettes would send and how Elasticsearch
+        rewrites it, without running the search
+        """
         query = self.build_query(
             territory_id,
             since,
@@ -153,20 +382,72 @@ class ElasticSearchDataMapper(GazetteDataGateway):
             number_of_fragments,
             pre_tags,
             post_tags,
+            collapse,
         )
-        gazettes = self._es.search(body=query, index=self._index)
+        validation = self._es.indices.validate_query(
+            index=self._index, body={"query": query["query"]}, explain=True
+        )
+        return {"query": query, "validation": validation}
 
-        return (
-            self.get_total_number_items(gazettes),
-            self.create_list_with_gazette_objects(gazettes["hits"]["hits"]),
+    def get_index_generation(self):
+        """
+        Return a string which changes when gazettes are added to or removed
+        from the index: the number of documents and the newest gazette date.
+        It is cached for generation_ttl seconds, so it can be checked on every
+        request. None when the index cannot be queried.
+        """
+        now = time.monotonic()
+        if (
+            self._generation is not None
+            and now - self._generation[0] < self._generation_ttl
+        ):
+            return self._generation[1]
+        try:
+            response = self._es.search(
+                index=self._index,
+                body={
+                    "size": 0,
+                    "track_total_hits": True,
+                    "aggs": {self.NEWEST_DATE_AGGREGATION: {"max": {"field": "date"}}},
+                },
+            )
+        except elasticsearch.ElasticsearchException:
+            logging.exception("Could not get the index generation")
+            return None
+        newest_date = response["aggregations"][self.NEWEST_DATE_AGGREGATION]
+        generation = "{}-{}".format(
+            response["hits"]["total"]["value"],
+            newest_date.get("value_as_string", newest_date.get("value")),
         )
+        self._generation = (now, generation)
+        return generation
+
+    def get_health(self):
+        """
+        Return the cluster status and whether the index exists. The status is
+        None when Elasticsearch cannot be reached.
+        """
+        try:
+            health = self._es.cluster.health(request_timeout=self.HEALTH_TIMEOUT)
+            index_exists = self._es.indices.exists(
+                index=self._index, request_timeout=self.HEALTH_TIMEOUT
+            )
+        except elasticsearch.ElasticsearchException:
+            logging.exception("Could not get the Elasticsearch health")
+            return {"status": None, "index_exists": None}
+        return {"status": health["status"], "index_exists": index_exists}
 
 
 def create_elasticsearch_data_mapper(
-    host: str = None, index: str = None
+    host: str = None,
+    index: str = None,
+    query_log: QueryLog = None,
+    slow_query_log: SlowQueryLog = None,
 ) -> GazetteDataGateway:
     if host is None or len(host.strip()) == 0:
         raise Exception("Missing host")
     if index is None or len(index.strip()) == 0:
         raise Exception("Missing index name")
-    return ElasticSearchDataMapper(host.strip(), index.strip())
+    return ElasticSearchDataMapper(
+        host.strip(), index.strip(), query_log, slow_query_log=slow_query_log
+    )
@@ -0,0 +1,103 @@
+from datetime import date
+from logging.handlers import RotatingFileHandler
+import json
+import logging
+import re
+import time
+
+CPF_PATTERN = re.compile(r"\b\d{3}\.?\d{3}\.?\d{3}-?\d{2}\b")
+CNPJ_PATTERN = re.compile(r"\b\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}\b")
+EMAIL_PATTERN = re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")
+
+
+def mask_digits(match):
+    return re.sub(r"\d", "0", match.group())
+
+
+def anonymize_keyword(keyword: str):
+    """
+    Replace personal documents (CPF and CNPJ) and emails from the keyword
+    keeping their shape. So the replayed queries still hit the same analyzer
+    paths in the index.
+    """
+    keyword = EMAIL_PATTERN.sub("user@example.com", keyword)
+    keyword = CNPJ_PATTERN.sub(mask_digits, keyword)
+    return CPF_PATTERN.sub(mask_digits, keyword)
+
+
+def anonymize_request(request: dict):
+    keywords = request.get("keywords")
+    if keywords is None:
+        return dict(request)
+    return {**request, "keywords": [anonymize_keyword(k) for k in keywords]}
+
+
+def serialize_value(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class QueryLog:
+    """
+    Record the searches executed in the index into a rotating NDJSON file.
+    Each line has the anonymized request, the query body sent to the index,
+    the time spent in the request and the number of hits found.
+    """
+
+    def __init__(self, file_name: str, max_bytes: int = 0, backup_count: int = 0):
+        self.file_name = file_name
+        self._handler = RotatingFileHandler(
+            file_name, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger = logging.getLogger(f"{__name__}.{file_name}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(self._handler)
+
+    def record(
+        self,
+        request: dict,
+        query: dict,
+        elapsed: float,
+        took: int = None,
+        total: int = None,
+    ):
+        """
+        Write an entry in the log. elapsed is the round trip time in seconds
+        and took the time reported by the index in milliseconds.
+        """
+        entry = {
+            "timestamp": time.time(),
+            "request": request,
+            "query": query,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "took": took,
+            "total": total,
+        }
+        self._logger.info(
+            json.dumps(entry, default=serialize_value, ensure_ascii=False)
+        )
+
+    def close(self):
+        self._logger.removeHandler(self._handler)
+        self._handler.close()
+
+
+def read_query_log(file_name: str):
+    """
+    Read the entries from a query log file
+    """
+    with open(file_name, encoding="utf-8") as log:
+        for line in log:
+            if line.strip():
+                yield json.loads(line)
+
+
+def create_query_log(
+    file_name: str = None, max_bytes: int = 0, backup_count: int = 0
+) -> QueryLog:
+    if file_name is None or len(file_name.strip()) == 0:
+        return None
+    return QueryLog(file_name.strip(), max_bytes, backup_count)
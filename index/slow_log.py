@@ -0,0 +1,155 @@
+from logging.handlers import RotatingFileHandler
+import json
+import logging
+import threading
+import time
+
+from monitoring import counter
+from .query_log import anonymize_request, serialize_value
+
+DEFAULT_THRESHOLD_MS = 1000
+DEFAULT_RATE = 1.0
+DEFAULT_BURST = 10
+
+SLOW_QUERIES = counter(
+    "querido_diario_elasticsearch_slow_queries",
+    "Searches slower than the slow query log threshold, logged or suppressed",
+    ("result",),
+)
+
+
+class TokenBucket:
+    """
+    Allow rate operations per second on average and up to burst operations
+    at once.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """
+        Return True and consume a token when one is available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class SlowQueryLog:
+    """
+    Record the searches slower than threshold_ms into a rotating NDJSON file.
+    Each line has the anonymized request, the exact query body sent to the
+    index, the round trip time, the time reported by the index, the number of
+    hits and the size of the response.
+
+    The entries are rate limited, so a storm of slow queries does not slow
+    down the API writing the log. The number of slow queries not logged since
+    the previous entry is in the suppressed field.
+    """
+
+    def __init__(
+        self,
+        file_name: str,
+        threshold_ms: float = DEFAULT_THRESHOLD_MS,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        max_bytes: int = 0,
+        backup_count: int = 0,
+    ):
+        self.file_name = file_name
+        self.threshold_ms = threshold_ms
+        self._bucket = TokenBucket(rate, burst)
+        self._suppressed = 0
+        self._lock = threading.Lock()
+        self._handler = RotatingFileHandler(
+            file_name, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        self._handler.setFormatter(logging.Formatter("%(message)s"))
+        self._logger = logging.getLogger(f"{__name__}.{file_name}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(self._handler)
+
+    def is_slow(self, elapsed: float):
+        return elapsed * 1000 >= self.threshold_ms
+
+    def record(
+        self,
+        request: dict,
+        query: dict,
+        elapsed: float,
+        search_response_json: dict,
+        total: int = None,
+        build_query=None,
+    ):
+        """
+        Write an entry in the log when the search is slow and the rate limit
+        allows. Return True when the entry has been written. build_query
+        creates the query body from the request.
+
+        The query is built again from the anonymized request when the
+        keywords have personal documents or emails.
+        """
+        if not self.is_slow(elapsed):
+            return False
+        with self._lock:
+            if not self._bucket.take():
+                self._suppressed += 1
+                SLOW_QUERIES.labels("suppressed").inc()
+                return False
+            suppressed, self._suppressed = self._suppressed, 0
+        SLOW_QUERIES.labels("logged").inc()
+        anonymized_request = anonymize_request(request)
+        if anonymized_request != request and build_query is not None:
+            query = build_query(**anonymized_request)
+        entry = {
+            "timestamp": time.time(),
+            "request": anonymized_request,
+            "query": query,
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "took": search_response_json.get("took"),
+            "total": total,
+            # The client does not expose the raw response, so this is the
+            # size of the response encoded again.
+            "response_bytes": len(
+                json.dumps(search_response_json, ensure_ascii=False).encode("utf-8")
+            ),
+            "suppressed": suppressed,
+        }
+        self._logger.info(
+            json.dumps(
+                entry, default=serialize_value, ensure_ascii=False, sort_keys=True
+            )
+        )
+        return True
+
+    def close(self):
+        self._logger.removeHandler(self._handler)
+        self._handler.close()
+
+
+def create_slow_query_log(
+    file_name: str = None,
+    threshold_ms: float = DEFAULT_THRESHOLD_MS,
+    rate: float = DEFAULT_RATE,
+    burst: int = DEFAULT_BURST,
+    max_bytes: int = 0,
+    backup_count: int = 0,
+) -> SlowQueryLog:
+    if file_name is None or len(file_name.strip()) == 0:
+        return None
+    return SlowQueryLog(
+        file_name.strip(), threshold_ms, rate, burst, max_bytes, backup_count
+    )
@@ -2,16 +2,62 @@ import os
 
 import uvicorn
 
-from api import app, configure_api_app
+from api import app, configure_api_app, read_warm_up_queries, start_warm_up
 from gazettes import create_gazettes_interface
-from index import create_elasticsearch_data_mapper
+from index import (
+    create_elasticsearch_data_mapper,
+    create_query_log,
+    create_slow_query_log,
+)
 from config import load_configuration
 from database import create_database_interface
+from monitoring import configure_tracing, create_span_exporter
 
 configuration = load_configuration()
-datagateway = create_elasticsearch_data_mapper(configuration.host, configuration.index)
-database = create_database_interface()
+configure_tracing(create_span_exporter(configuration.trace_file))
+query_log = create_query_log(
+    configuration.query_log_file,
+    configuration.query_log_max_bytes,
+    configuration.query_log_backup_count,
+)
+slow_query_log = create_slow_query_log(
+    configuration.slow_query_log_file,
+    configuration.slow_query_threshold_ms,
+    configuration.slow_query_log_rate,
+    configuration.slow_query_log_burst,
+    configuration.query_log_max_bytes,
+    configuration.query_log_backup_count,
+)
+datagateway = create_elasticsearch_data_mapper(
+    configuration.host, configuration.index, query_log, slow_query_log
+)
+database = create_database_interface(
+    configuration.database_url,
+    configuration.database_pool_size,
+    configuration.database_max_overflow,
+    configuration.database_pool_timeout,
+    configuration.database_pool_recycle,
+)
 gazettes_interface = create_gazettes_interface(datagateway, database)
-configure_api_app(gazettes_interface, configuration.root_path)
+configure_api_app(
+    gazettes_interface,
+    configuration.root_path,
+    configuration.compression_minimum_size,
+    configuration.gzip_level,
+    configuration.brotli_level,
+    configuration.response_cache_size,
+    configuration.server_timing,
+    configuration.admin_token,
+    configuration.event_loop_stall_threshold_ms,
+    configuration.top_queries_file,
+    configuration.health_check_interval,
+)
+start_warm_up(
+    read_warm_up_queries(
+        [configuration.warm_up_queries_file, configuration.top_queries_file],
+        configuration.warm_up_max_queries,
+    ),
+    configuration.warm_up_budget,
+)
 
 uvicorn.run(app, host="0.0.0.0", port=8080, root_path=configuration.root_path)
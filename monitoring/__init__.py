@@ -0,0 +1,43 @@
+from .metrics import (
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    Registry,
+    counter,
+    gauge,
+    histogram,
+    render,
+)
+from .event_loop import (
+    BlockingCallMiddleware,
+    BlockingCallSettings,
+    EventLoopMonitor,
+)
+from .heavy_hitters import CountMinSketch, HeavyHitters, QueryStatistics
+from .middleware import MetricsMiddleware
+from .profiling import (
+    SamplingProfiler,
+    elasticsearch_profiles,
+    profile_elasticsearch,
+    record_elasticsearch_profile,
+    start_elasticsearch_profiling,
+    stop_elasticsearch_profiling,
+)
+from .tracing import (
+    InMemoryExporter,
+    FileExporter,
+    Tracer,
+    TracingMiddleware,
+    configure_tracing,
+    create_span_exporter,
+    current_span,
+    set_span_attribute,
+    span,
+)
+from .timing import (
+    ServerTimingMiddleware,
+    ServerTimingSettings,
+    record_timing,
+    timed,
+)
@@ -0,0 +1,195 @@
+"""
+Detection of the code blocking the event loop.
+
+The endpoints are coroutines, so any blocking work done by them (e.g. a
+search in Elasticsearch) stops every other request handled by the process.
+The EventLoopMonitor measures how late the event loop runs a task and
+captures the stack of the loop thread while it is blocked. The
+BlockingCallMiddleware measures the longest time each request kept the loop
+busy and, in the test mode, fails the requests which blocked it too long.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from .metrics import counter, histogram
+
+DEFAULT_INTERVAL = 0.05
+DEFAULT_THRESHOLD_MS = 100
+
+EVENT_LOOP_LAG = histogram(
+    "querido_diario_event_loop_lag_seconds",
+    "Delay of the event loop to run a task scheduled to run",
+)
+EVENT_LOOP_STALLS = counter(
+    "querido_diario_event_loop_stalls",
+    "Times the event loop was blocked longer than the stall threshold",
+)
+REQUEST_BLOCKING = histogram(
+    "querido_diario_http_request_blocking_seconds",
+    "Longest time each HTTP request kept the event loop busy without awaiting",
+)
+
+
+class EventLoopMonitor:
+    """
+    Measure the event loop lag every interval seconds. A watchdog thread
+    captures the stack of the loop thread when the loop has not run the
+    measurement for threshold_ms, so the stall is logged with the code which
+    blocked the loop. A threshold of 0 disables the monitor.
+    """
+
+    def __init__(
+        self, threshold_ms: float = DEFAULT_THRESHOLD_MS, interval=DEFAULT_INTERVAL
+    ):
+        self.threshold_ms = threshold_ms
+        self.interval = interval
+        self._task = None
+        self._watchdog = None
+        self._stop = threading.Event()
+        self._beat = None
+        self._loop_thread_id = None
+        self._stack = None
+
+    @property
+    def enabled(self):
+        return self.threshold_ms > 0
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self):
+        """
+        Start the monitor in the running event loop
+        """
+        if not self.enabled or self.running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="event-loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._stop.set()
+        self._watchdog.join()
+        self._watchdog = None
+
+    async def _measure(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - scheduled)
+            self._beat = time.monotonic()
+            stack, self._stack = self._stack, None
+            EVENT_LOOP_LAG.observe(lag)
+            if lag * 1000 >= self.threshold_ms:
+                self.report_stall(lag, stack)
+
+    def _watch(self):
+        threshold = self.threshold_ms / 1000
+        while not self._stop.wait(min(self.interval, threshold) / 2):
+            if (
+                self._stack is None
+                and time.monotonic() - self._beat > self.interval + threshold
+            ):
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is not None:
+                    self._stack = "".join(traceback.format_stack(frame))
+
+    def report_stall(self, lag: float, stack: str = None):
+        EVENT_LOOP_STALLS.inc()
+        if stack is None:
+            logging.warning("Event loop blocked for %.1f ms", lag * 1000)
+        else:
+            logging.warning("Event loop blocked for %.1f ms in:\n%s", lag * 1000, stack)
+
+
+class TimedCoroutine:
+    """
+    Await the coroutine recording the duration of its longest step, the time
+    between being resumed by the event loop and awaiting again
+    """
+
+    def __init__(self, coroutine):
+        self.coroutine = coroutine
+        self.longest_step = 0.0
+
+    def __await__(self):
+        value, error = None, None
+        while True:
+            started = time.perf_counter()
+            try:
+                if error is None:
+                    future = self.coroutine.send(value)
+                else:
+                    future = self.coroutine.throw(error)
+            except StopIteration as stop:
+                self.record_step(time.perf_counter() - started)
+                return stop.value
+            except BaseException:
+                self.record_step(time.perf_counter() - started)
+                raise
+            self.record_step(time.perf_counter() - started)
+            try:
+                value, error = (yield future), None
+            except GeneratorExit:
+                self.coroutine.close()
+                raise
+            except BaseException as exception:
+                value, error = None, exception
+
+    def record_step(self, duration: float):
+        self.longest_step = max(self.longest_step, duration)
+
+
+class BlockingCallSettings:
+    """
+    fail_threshold_ms enables the test mode: the requests which block the
+    event loop longer than it raise an exception. None disables it.
+    """
+
+    def __init__(self, fail_threshold_ms: float = None):
+        self.fail_threshold_ms = fail_threshold_ms
+
+
+class BlockingCallMiddleware:
+    """
+    Record the longest time each request kept the event loop busy
+    """
+
+    def __init__(self, app, settings: BlockingCallSettings):
+        self.app = app
+        self.settings = settings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = TimedCoroutine(self.app(scope, receive, send))
+        try:
+            await request
+        finally:
+            REQUEST_BLOCKING.observe(request.longest_step)
+        threshold = self.settings.fail_threshold_ms
+        if threshold is not None and request.longest_step * 1000 > threshold:
+            raise Exception(
+                f"{scope['method']} {scope['path']} blocked the event loop for "
+                f"{request.longest_step * 1000:.1f} ms (limit: {threshold} ms)"
+            )
@@ -0,0 +1,190 @@
+"""
+Tracking of the most frequent searches with bounded memory.
+
+Counting each distinct search exactly is not possible: the keywords make the
+number of distinct searches unbounded. The count-min sketch estimates the
+count of any item in a fixed table of counters, never under counting it, and
+the top-k heap keeps only the items with the largest estimates. The memory
+used depends on the table size and on the number of items kept, not on the
+traffic.
+"""
+from array import array
+from hashlib import blake2b
+import heapq
+import json
+import math
+import threading
+import time
+
+DEFAULT_WIDTH = 4096
+DEFAULT_DEPTH = 4
+DEFAULT_CAPACITY = 100
+
+
+class CountMinSketch:
+    """
+    Estimate how many times each item has been added. The estimate is never
+    below the real count and, with probability 1 - e ** -depth, not above it
+    by more than e / width of the total added.
+    """
+
+    def __init__(self, width: int = DEFAULT_WIDTH, depth: int = DEFAULT_DEPTH):
+        if width < 1 or depth < 1:
+            raise Exception("Invalid count-min sketch size")
+        self.width = width
+        self.depth = depth
+        self.total = 0
+        self._counters = array("Q", bytes(8 * width * depth))
+
+    def _cells(self, item: str):
+        """
+        Index of the item counter in each row. The row hashes are derived from
+        two halves of a single hash (Kirsch-Mitzenmacher).
+        """
+        digest = blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return [
+            row * self.width + (first + row * second) % self.width
+            for row in range(self.depth)
+        ]
+
+    def add(self, item: str, count: int = 1):
+        """
+        Add the item and return its new estimate. Only the smallest counters
+        are increased (conservative update), which lowers the over counting.
+        """
+        cells = self._cells(item)
+        estimate = min(self._counters[cell] for cell in cells) + count
+        for cell in cells:
+            if self._counters[cell] < estimate:
+                self._counters[cell] = estimate
+        self.total += count
+        return estimate
+
+    def estimate(self, item: str):
+        return min(self._counters[cell] for cell in self._cells(item))
+
+    @property
+    def error_bound(self):
+        """
+        Over counting of an estimate with probability 1 - e ** -depth
+        """
+        return math.ceil(math.e / self.width * self.total)
+
+
+class HeavyHitters:
+    """
+    The capacity items added most often, by their count-min sketch estimate
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_CAPACITY,
+        width: int = DEFAULT_WIDTH,
+        depth: int = DEFAULT_DEPTH,
+    ):
+        if capacity < 1:
+            raise Exception("Invalid heavy hitters capacity")
+        self.capacity = capacity
+        self.sketch = CountMinSketch(width, depth)
+        # The heap entries of the items updated after being pushed have their
+        # old counts. They are fixed when they reach the top of the heap, as
+        # the counts only increase.
+        self._counts = {}
+        self._heap = []
+        self._lock = threading.Lock()
+
+    def add(self, item: str, count: int = 1):
+        with self._lock:
+            estimate = self.sketch.add(item, count)
+            if item in self._counts:
+                self._counts[item] = estimate
+            elif len(self._counts) < self.capacity:
+                self._counts[item] = estimate
+                heapq.heappush(self._heap, (estimate, item))
+            elif estimate > self._minimum():
+                _, evicted = heapq.heapreplace(self._heap, (estimate, item))
+                del self._counts[evicted]
+                self._counts[item] = estimate
+
+    def _minimum(self):
+        while True:
+            count, item = self._heap[0]
+            if self._counts[item] == count:
+                return count
+            heapq.heapreplace(self._heap, (self._counts[item], item))
+
+    def top(self, limit: int = None):
+        """
+        List of (item, estimated count) from the most frequent item
+        """
+        with self._lock:
+            items = sorted(self._counts.items(), key=lambda item: (-item[1], item[0]))
+        return items if limit is None else items[:limit]
+
+    @property
+    def total(self):
+        return self.sketch.total
+
+    @property
+    def error_bound(self):
+        return self.sketch.error_bound
+
+
+def canonical_query(request: dict):
+    """
+    Key of the search parameters. The same search always has the same key
+    and the key can be parsed back with json.loads.
+    """
+    return json.dumps(request, sort_keys=True, default=str, ensure_ascii=False)
+
+
+class QueryStatistics:
+    """
+    Heavy hitters of the gazettes searches: the whole searches, the
+    territories and the keywords
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_CAPACITY,
+        width: int = DEFAULT_WIDTH,
+        depth: int = DEFAULT_DEPTH,
+    ):
+        self.since = time.time()
+        self.queries = HeavyHitters(capacity, width, depth)
+        self.territories = HeavyHitters(capacity, width, depth)
+        self.keywords = HeavyHitters(capacity, width, depth)
+
+    def record(self, request: dict):
+        self.queries.add(canonical_query(request))
+        if request.get("territory_id") is not None:
+            self.territories.add(request["territory_id"])
+        for keyword in request.get("keywords") or []:
+            keyword = " ".join(keyword.lower().split())
+            if keyword:
+                self.keywords.add(keyword)
+
+    def top_queries(self, limit: int = None):
+        """
+        The most frequent searches, with their parameters parsed back
+        """
+        return [(json.loads(query), count) for query, count in self.queries.top(limit)]
+
+    def report(self, limit: int = None):
+        def section(heavy_hitters: HeavyHitters, key: str, items):
+            return {
+                "total": heavy_hitters.total,
+                "error_bound": heavy_hitters.error_bound,
+                "items": [{key: item, "count": count} for item, count in items],
+            }
+
+        return {
+            "since": self.since,
+            "queries": section(self.queries, "query", self.top_queries(limit)),
+            "territories": section(
+                self.territories, "territory_id", self.territories.top(limit)
+            ),
+            "keywords": section(self.keywords, "keyword", self.keywords.top(limit)),
+        }
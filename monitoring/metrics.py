@@ -0,0 +1,318 @@
+"""
+Metrics exported in the Prometheus text format.
+
+Each thread updates its own copy (shard) of the values, so recording a value
+takes no lock. The shards are added up when the metrics are scraped.
+"""
+from bisect import bisect_left
+import math
+import threading
+from typing import Callable, Iterable, Tuple
+
+# Seconds. From a cached lookup to a slow search.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+COUNT_BUCKETS = (0, 1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+# The charset is added by the response
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+class Shards:
+    """
+    Values of a metric (one per thread). Creating the shard of a thread is
+    the only operation which takes the lock.
+    """
+
+    __slots__ = ("_size", "_local", "_shards", "_lock")
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = [0] * self._size
+            with self._lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def total(self):
+        with self._lock:
+            shards = list(self._shards)
+        return [sum(values) for values in zip(*shards)] or [0] * self._size
+
+
+class Metric:
+    """
+    Base class of the metrics. Metrics with labels have a child metric for
+    each combination of label values, returned by labels().
+    """
+
+    type_name = None
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise Exception(f"Invalid labels for the metric {self.name}")
+            with self._lock:
+                child = self._children.setdefault(values, self.create_child())
+        return child
+
+    def default_child(self):
+        if self.label_names:
+            raise Exception(f"The metric {self.name} requires labels")
+        return self.labels()
+
+    def create_child(self):
+        raise NotImplementedError
+
+    def children(self):
+        with self._lock:
+            return list(self._children.items())
+
+    def samples(self) -> Iterable[Tuple[str, dict, float]]:
+        for values, child in self.children():
+            labels = dict(zip(self.label_names, values))
+            for suffix, extra_labels, value in child.samples():
+                yield self.name + suffix, {**labels, **extra_labels}, value
+
+
+class CounterChild:
+    __slots__ = ("_shards",)
+
+    def __init__(self):
+        self._shards = Shards(1)
+
+    def inc(self, amount: float = 1):
+        self._shards.get()[0] += amount
+
+    @property
+    def value(self):
+        return self._shards.total()[0]
+
+    def samples(self):
+        yield "_total", {}, self.value
+
+
+class Counter(Metric):
+    """
+    Value which only goes up, e.g. the number of requests. The name should
+    not have the _total suffix, it is added in the export.
+    """
+
+    type_name = "counter"
+
+    def create_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.default_child().inc(amount)
+
+
+class GaugeChild:
+    __slots__ = ("_shards", "_function")
+
+    def __init__(self):
+        self._shards = Shards(1)
+        self._function = None
+
+    def inc(self, amount: float = 1):
+        self._shards.get()[0] += amount
+
+    def dec(self, amount: float = 1):
+        self._shards.get()[0] -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """
+        Compute the value with the given function when it is read
+        """
+        self._function = function
+
+    @property
+    def value(self):
+        if self._function is not None:
+            return self._function()
+        return self._shards.total()[0]
+
+    def samples(self):
+        yield "", {}, self.value
+
+
+class Gauge(Metric):
+    """
+    Value which goes up and down, e.g. the number of requests in progress
+    """
+
+    type_name = "gauge"
+
+    def create_child(self):
+        return GaugeChild()
+
+    def inc(self, amount: float = 1):
+        self.default_child().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self.default_child().dec(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self.default_child().set_function(function)
+
+
+class HistogramChild:
+    """
+    The shard has the count of each bucket, then the sum and the count of the
+    observed values.
+    """
+
+    __slots__ = ("buckets", "_shards")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self._shards = Shards(len(buckets) + 3)
+
+    def observe(self, value: float):
+        shard = self._shards.get()
+        shard[bisect_left(self.buckets, value)] += 1
+        shard[-2] += value
+        shard[-1] += 1
+
+    @property
+    def count(self):
+        return self._shards.total()[-1]
+
+    def samples(self):
+        total = self._shards.total()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), total):
+            cumulative += count
+            yield "_bucket", {"le": format_value(bound)}, cumulative
+        yield "_sum", {}, total[-2]
+        yield "_count", {}, total[-1]
+
+
+class Histogram(Metric):
+    """
+    Distribution of the observed values (e.g. latencies) in the buckets
+    """
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Tuple[str] = (),
+        buckets: Tuple[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def create_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.default_child().observe(value)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise Exception(f"Metric already registered: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, documentation: str, labels: Tuple[str] = ()):
+    return REGISTRY.register(Counter(name, documentation, labels))
+
+
+def gauge(name: str, documentation: str, labels: Tuple[str] = ()):
+    return REGISTRY.register(Gauge(name, documentation, labels))
+
+
+def histogram(
+    name: str,
+    documentation: str,
+    labels: Tuple[str] = (),
+    buckets: Tuple[float] = LATENCY_BUCKETS,
+):
+    return REGISTRY.register(Histogram(name, documentation, labels, buckets))
+
+
+def format_value(value: float):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def escape_label_value(value: str):
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def render(registry: Registry = REGISTRY):
+    """
+    Return the metrics in the Prometheus text exposition format
+    """
+    lines = []
+    for metric in registry.metrics():
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        for name, labels, value in metric.samples():
+            if labels:
+                labels = ",".join(
+                    f'{label}="{escape_label_value(label_value)}"'
+                    for label, label_value in labels.items()
+                )
+                name = f"{name}{{{labels}}}"
+            lines.append(f"{name} {format_value(value)}")
+    lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,70 @@
+import time
+
+from starlette.routing import Match
+
+from .metrics import SIZE_BUCKETS, gauge, histogram
+
+UNMATCHED_ROUTE = "unmatched"
+
+REQUEST_DURATION = histogram(
+    "querido_diario_http_request_duration_seconds",
+    "Time to handle the HTTP requests",
+    ("method", "route", "status"),
+)
+REQUESTS_IN_FLIGHT = gauge(
+    "querido_diario_http_requests_in_flight", "HTTP requests being handled"
+)
+RESPONSE_BYTES = histogram(
+    "querido_diario_http_response_bytes",
+    "Size of the HTTP response bodies sent, after compression",
+    ("route",),
+    SIZE_BUCKETS,
+)
+
+
+def route_template(scope):
+    """
+    Path of the route which handled the request, e.g. /gazettes/{territory_id}.
+    The paths with the parameters would create a time series per city.
+    """
+    for route in scope["app"].routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, the status and the size of the HTTP responses
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        body_size = 0
+
+        async def record_response(message):
+            nonlocal status, body_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, record_response)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            route = route_template(scope)
+            REQUEST_DURATION.labels(scope["method"], route, status).observe(
+                time.perf_counter() - started
+            )
+            RESPONSE_BYTES.labels(route).observe(body_size)
@@ -0,0 +1,124 @@
+"""
+Profiling of a single request, used by the admins to find why a search is
+slow.
+
+The Python profile samples the stack of the thread handling the request, so
+the code runs at full speed between the samples. The Elasticsearch profile
+is requested by the code sending the searches when profile_elasticsearch()
+is True, and collected with record_elasticsearch_profile().
+"""
+from collections import Counter
+from contextvars import ContextVar
+import os
+import sys
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.001
+DEFAULT_LIMIT = 30
+
+_elasticsearch_profiles = ContextVar("elasticsearch_profiles", default=None)
+
+
+def start_elasticsearch_profiling():
+    """
+    Ask for the Elasticsearch profile of the searches sent in the current
+    context. Return the token used to stop.
+    """
+    return _elasticsearch_profiles.set([])
+
+
+def stop_elasticsearch_profiling(token):
+    _elasticsearch_profiles.reset(token)
+
+
+def profile_elasticsearch():
+    return _elasticsearch_profiles.get() is not None
+
+
+def record_elasticsearch_profile(profile: dict):
+    profiles = _elasticsearch_profiles.get()
+    if profiles is not None:
+        profiles.append(profile)
+
+
+def elasticsearch_profiles():
+    return _elasticsearch_profiles.get() or []
+
+
+def frame_name(code):
+    file_name = os.path.relpath(code.co_filename)
+    if file_name.startswith(".."):
+        file_name = code.co_filename
+    return f"{code.co_name} ({file_name}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """
+    Sample the stack of the thread which entered the with block every
+    interval seconds from a background thread.
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self.duration = 0.0
+        self._stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+        self._thread_id = None
+        self._started = None
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._sample, name="request-profiler", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exception):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                self._stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def result(self, limit: int = DEFAULT_LIMIT):
+        """
+        The functions with the most samples where the function was running
+        (self), then in the stack (total), and the most sampled stacks in the
+        collapsed format used by the flame graph tools.
+        """
+        own = Counter()
+        total = Counter()
+        for stack, count in self._stacks.items():
+            own[stack[-1]] += count
+            for code in set(stack):
+                total[code] += count
+        codes = sorted(total, key=lambda code: (own[code], total[code]), reverse=True)
+        functions = [
+            {"function": frame_name(code), "self": own[code], "total": total[code]}
+            for code in codes[:limit]
+        ]
+        stacks = [
+            {"stack": ";".join(frame_name(code) for code in stack), "samples": count}
+            for stack, count in self._stacks.most_common(limit)
+        ]
+        return {
+            "interval_ms": self.interval * 1000,
+            "duration_ms": round(self.duration * 1000, 3),
+            "samples": self.samples,
+            "functions": functions,
+            "stacks": stacks,
+        }
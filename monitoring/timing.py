@@ -0,0 +1,98 @@
+"""
+Server-Timing header with the time spent in each phase of the request.
+
+The phases are recorded in a collector stored in a context variable, so the
+code recording them does not need a reference to the request. Nothing is
+recorded when the collector is not active.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import time
+
+from starlette.datastructures import MutableHeaders
+
+_timings = ContextVar("server_timings", default=None)
+
+
+class ServerTimingSettings:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+
+
+def start_collecting():
+    """
+    Start collecting the timings in the current context. Return the token
+    used to stop collecting.
+    """
+    return _timings.set([])
+
+
+def stop_collecting(token):
+    _timings.reset(token)
+
+
+def collected_timings():
+    return _timings.get()
+
+
+def record_timing(name: str, seconds: float, description: str = None):
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds, description))
+
+
+@contextmanager
+def timed(name: str, description: str = None):
+    """
+    Record the time spent in the with block
+    """
+    if _timings.get() is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - started, description)
+
+
+def header_value(timings):
+    metrics = []
+    for name, seconds, description in timings:
+        metric = f"{name};dur={seconds * 1000:.2f}"
+        if description is not None:
+            description = description.replace("\\", "\\\\").replace('"', '\\"')
+            metric = f'{metric};desc="{description}"'
+        metrics.append(metric)
+    return ", ".join(metrics)
+
+
+class ServerTimingMiddleware:
+    """
+    Add the Server-Timing header to the responses when it is enabled in the
+    settings. The total is the time until the response starts to be sent.
+    """
+
+    def __init__(self, app, settings: ServerTimingSettings):
+        self.app = app
+        self.settings = settings
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.settings.enabled:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        token = start_collecting()
+        timings = collected_timings()
+
+        async def add_header(message):
+            if message["type"] == "http.response.start":
+                timings.append(("total", time.perf_counter() - started, None))
+                headers = MutableHeaders(raw=message["headers"])
+                headers.append("Server-Timing", header_value(timings))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, add_header)
+        finally:
+            stop_collecting(token)
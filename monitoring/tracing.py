@@ -0,0 +1,257 @@
+"""
+Tracing of the requests in spans compatible with OpenTelemetry and the W3C
+Trace Context.
+
+The current span is stored in a context variable, so the nested spans find
+their parent without receiving it. Nothing is recorded while there is no
+exporter: span() yields None and costs a context variable lookup.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import json
+import random
+import re
+import threading
+import time
+
+from starlette.datastructures import Headers
+
+from .middleware import route_template
+
+TRACEPARENT_PATTERN = re.compile(
+    r"^(?P<version>[0-9a-f]{2})-(?P<trace_id>[0-9a-f]{32})-"
+    r"(?P<parent_id>[0-9a-f]{16})-(?P<flags>[0-9a-f]{2})$"
+)
+INVALID_TRACE_ID = "0" * 32
+INVALID_SPAN_ID = "0" * 16
+
+_current_span = ContextVar("current_span", default=None)
+
+
+def generate_id(bits: int):
+    value = 0
+    while value == 0:
+        value = random.getrandbits(bits)
+    return f"{value:0{bits // 4}x}"
+
+
+def parse_traceparent(traceparent: str):
+    """
+    Return the trace id and the parent span id of the traceparent header.
+    None when the header is invalid.
+    """
+    match = TRACEPARENT_PATTERN.match((traceparent or "").strip().lower())
+    if match is None or match.group("version") == "ff":
+        return None
+    if match.group("trace_id") == INVALID_TRACE_ID:
+        return None
+    if match.group("parent_id") == INVALID_SPAN_ID:
+        return None
+    return match.group("trace_id"), match.group("parent_id")
+
+
+class Span:
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "kind",
+        "attributes",
+        "status",
+        "start_time",
+        "duration",
+        "_started",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: str = None,
+        kind: str = "internal",
+        attributes: dict = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = generate_id(64)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start_time = time.time_ns()
+        self.duration = None
+        self._started = time.perf_counter_ns()
+
+    def set_attribute(self, name: str, value):
+        self.attributes[name] = value
+
+    def end(self):
+        self.duration = time.perf_counter_ns() - self._started
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_time,
+            "end_time_unix_nano": self.start_time + (self.duration or 0),
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class InMemoryExporter:
+    """
+    Keep the finished spans in a list, for the tests
+    """
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span: Span):
+        self.spans.append(span)
+
+    def clear(self):
+        self.spans.clear()
+
+    def close(self):
+        pass
+
+
+class FileExporter:
+    """
+    Write the finished spans in a file, one JSON object per line
+    """
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self._file = open(file_name, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span: Span):
+        line = json.dumps(span.as_dict(), default=str, sort_keys=True)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class Tracer:
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        attributes: dict = None,
+        kind: str = "internal",
+        traceparent: str = None,
+    ):
+        """
+        Record the with block in a span, child of the current span or of the
+        remote span in traceparent. Exceptions are recorded as errors.
+        """
+        exporter = self.exporter
+        if exporter is None:
+            yield None
+            return
+        parent = _current_span.get()
+        remote = parse_traceparent(traceparent) if parent is None else None
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        elif remote is not None:
+            trace_id, parent_id = remote
+        else:
+            trace_id, parent_id = generate_id(128), None
+        span = Span(name, trace_id, parent_id, kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exception:
+            span.status = "error"
+            span.set_attribute("exception.type", type(exception).__name__)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+            exporter.export(span)
+
+
+TRACER = Tracer()
+
+
+def configure_tracing(exporter=None):
+    """
+    Set where the spans are exported. None disables the tracing.
+    """
+    previous, TRACER.exporter = TRACER.exporter, exporter
+    if previous is not None and previous is not exporter:
+        previous.close()
+
+
+def create_span_exporter(file_name: str = None):
+    if file_name is None or len(file_name.strip()) == 0:
+        return None
+    return FileExporter(file_name.strip())
+
+
+def span(name: str, attributes: dict = None, kind: str = "internal"):
+    """
+    Span of the default tracer. It can be used as a decorator too.
+    """
+    return TRACER.span(name, attributes, kind)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def set_span_attribute(name: str, value):
+    current = _current_span.get()
+    if current is not None:
+        current.set_attribute(name, value)
+
+
+class TracingMiddleware:
+    """
+    Record each HTTP request in a server span. It continues the trace of the
+    client when the request has a valid traceparent header.
+    """
+
+    def __init__(self, app, tracer: Tracer = TRACER):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+        traceparent = Headers(scope=scope).get("traceparent")
+        name = f"{scope['method']} {route_template(scope)}"
+        attributes = {"http.method": scope["method"], "http.target": scope["path"]}
+        with self.tracer.span(name, attributes, "server", traceparent) as current:
+
+            async def record_status(message):
+                if message["type"] == "http.response.start":
+                    current.set_attribute("http.status_code", message["status"])
+                    if message["status"] >= 500:
+                        current.status = "error"
+                await send(message)
+
+            await self.app(scope, receive, record_status)
@@ -27,7 +27,14 @@ def create_index(es):
         try:
             es.indices.create(
                 index=INDEX,
-                body={"mappings": {"properties": {"date": {"type": "date"}}}},
+                body={
+                    "mappings": {
+                        "properties": {
+                            "date": {"type": "date"},
+                            "file_checksum": {"type": "keyword"},
+                        }
+                    }
+                },
                 timeout="30s",
             )
             es.indices.refresh()
@@ -0,0 +1,149 @@
+"""
+Replay the queries recorded in the query log (QUERIDO_DIARIO_QUERY_LOG_FILE)
+against the API or directly against Elasticsearch keeping the original
+inter-arrival times. Use --speed to replay faster (e.g. 2) or slower (e.g. 0.5)
+than the original traffic.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import glob
+import os
+import threading
+import time
+
+import requests
+
+from index import read_query_log
+
+
+def log_files(file_name):
+    """
+    Return the log file and its rotated backups from the oldest to the newest
+    """
+    backups = [
+        backup
+        for backup in glob.glob(f"{glob.escape(file_name)}.*")
+        if backup.rsplit(".", 1)[-1].isdigit()
+    ]
+    backups.sort(key=lambda backup: int(backup.rsplit(".", 1)[-1]), reverse=True)
+    if os.path.exists(file_name):
+        backups.append(file_name)
+    return backups
+
+
+def read_entries(file_names):
+    for file_name in file_names:
+        yield from read_query_log(file_name)
+
+
+def api_request(session, url, entry):
+    request = entry["request"]
+    path = "/gazettes/"
+    if request.get("territory_id") is not None:
+        path += request["territory_id"]
+    params = {
+        key: value
+        for key, value in request.items()
+        if key != "territory_id" and value is not None
+    }
+    return session.get(url.rstrip("/") + path, params=params)
+
+
+def elasticsearch_request(session, url, entry, index):
+    return session.post(f"{url.rstrip('/')}/{index}/_search", json=entry["query"])
+
+
+class ReplayStatistics:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.lags = []
+        self._lock = threading.Lock()
+
+    def add(self, latency, lag, failed):
+        with self._lock:
+            self.latencies.append(latency)
+            self.lags.append(lag)
+            self.errors += 1 if failed else 0
+
+    def percentile(self, values, percentile):
+        if not values:
+            return 0
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+    def report(self, elapsed):
+        count = len(self.latencies)
+        print(f"Requests: {count} in {elapsed:.1f}s ({count / elapsed:.1f} req/s)")
+        print(f"Errors: {self.errors}")
+        for percentile in (50, 90, 99, 100):
+            latency = self.percentile(self.latencies, percentile) * 1000
+            print(f"p{percentile} latency: {latency:.1f} ms")
+        lag = self.percentile(self.lags, 99) * 1000
+        print(f"p99 schedule lag: {lag:.1f} ms")
+
+
+def replay(entries, send, speed=1.0, concurrency=32):
+    """
+    Send the entries keeping the interval between them divided by speed.
+    Requests are sent from a thread pool so slow responses do not delay the
+    following ones.
+    """
+    statistics = ReplayStatistics()
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=concurrency, pool_maxsize=concurrency
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def execute(entry, scheduled):
+        started = time.monotonic()
+        try:
+            failed = send(session, entry).status_code >= 400
+        except requests.RequestException:
+            failed = True
+        statistics.add(time.monotonic() - started, started - scheduled, failed)
+
+    replay_start = time.monotonic()
+    first_timestamp = None
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for entry in entries:
+            if first_timestamp is None:
+                first_timestamp = entry["timestamp"]
+            scheduled = replay_start + (entry["timestamp"] - first_timestamp) / speed
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(execute, entry, scheduled)
+    statistics.report(max(time.monotonic() - replay_start, 0.001))
+    return statistics
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("log_file", help="Query log file. Backups are replayed too")
+    parser.add_argument("url", help="API or Elasticsearch URL")
+    parser.add_argument(
+        "--target", choices=["api", "elasticsearch"], default="api",
+    )
+    parser.add_argument("--index", default="gazettes")
+    parser.add_argument("--speed", type=float, default=1.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+    if arguments.target == "api":
+        send = lambda session, entry: api_request(session, arguments.url, entry)
+    else:
+        send = lambda session, entry: elasticsearch_request(
+            session, arguments.url, entry, arguments.index
+        )
+    entries = read_entries(log_files(arguments.log_file))
+    replay(entries, send, arguments.speed, arguments.concurrency)
+
+
+if __name__ == "__main__":
+    main()
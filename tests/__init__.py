@@ -0,0 +1,10 @@
+import os
+
+from api import app
+
+# Test mode: fail the requests which block the event loop longer than the
+# given milliseconds, e.g. QUERIDO_DIARIO_FAIL_ON_BLOCKING_MS=50
+if os.environ.get("QUERIDO_DIARIO_FAIL_ON_BLOCKING_MS"):
+    app.blocking_calls.fail_threshold_ms = float(
+        os.environ["QUERIDO_DIARIO_FAIL_ON_BLOCKING_MS"]
+    )
@@ -1,10 +1,15 @@
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta, timezone
 from unittest.mock import MagicMock
 from unittest import TestCase, expectedFailure
 
 from fastapi.testclient import TestClient
+import cbor2
+import msgpack
 
 from api import app, configure_api_app
+from api.api import CityLevel
+from api.compression import negotiate_encoding
+from api.serialization import compact, negotiate_media_type
 from gazettes import GazetteAccessInterface, GazetteRequest
 
 
@@ -14,10 +19,26 @@ class MockGazetteAccessInterface:
 
 
 class ApiGazettesEndpointTests(TestCase):
-    def create_mock_gazette_interface(self, return_value=(0, []), cities_info=[]):
+    def create_mock_gazette_interface(
+        self,
+        return_value=(0, []),
+        cities_info=[],
+        gazettes_version=None,
+        cities_last_modified=None,
+    ):
         interface = MockGazetteAccessInterface()
+        interface.get_gazettes_version = MagicMock(return_value=gazettes_version)
+        interface.get_cities_last_modified = MagicMock(
+            return_value=cities_last_modified
+        )
         interface.get_gazettes = MagicMock(return_value=return_value)
+        interface.explain_gazettes = MagicMock(return_value={})
         interface.get_cities = MagicMock(return_value=cities_info)
+        interface.suggest_cities = MagicMock(return_value=cities_info)
+        interface.get_city = MagicMock(
+            return_value=cities_info[0] if cities_info else None
+        )
+        interface.get_cities_by_ids = MagicMock(return_value=cities_info)
         return interface
 
     def test_api_should_fail_when_try_to_set_any_object_as_gazettes_interface(self):
@@ -452,6 +473,122 @@ class ApiGazettesEndpointTests(TestCase):
         response = client.get("/cities", params={"city_name": "pirapo"})
         interface.get_cities.assert_called_once()
 
+    def test_suggest_cities(self):
+        interface = self.create_mock_gazette_interface(
+            cities_info=[
+                {
+                    "territory_id": "1234",
+                    "territory_name": "Piraporinha",
+                    "state_code": "SC",
+                    "publication_urls": ["https://querido-diario.org.br"],
+                    "level": "1",
+                }
+            ]
+        )
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get("/cities/suggest", params={"prefix": "pira"})
+        self.assertEqual(response.status_code, 200)
+        interface.suggest_cities.assert_called_once_with("pira", 10)
+        self.assertEqual(
+            {
+                "cities": [
+                    {
+                        "territory_id": "1234",
+                        "territory_name": "Piraporinha",
+                        "state_code": "SC",
+                        "level": "1",
+                    }
+                ]
+            },
+            response.json(),
+        )
+        self.assertEqual("public, max-age=3600", response.headers["Cache-Control"])
+
+    def test_suggest_cities_validate_parameters(self):
+        interface = self.create_mock_gazette_interface()
+        configure_api_app(interface)
+        client = TestClient(app)
+        self.assertEqual(422, client.get("/cities/suggest").status_code)
+        response = client.get("/cities/suggest", params={"prefix": ""})
+        self.assertEqual(422, response.status_code)
+        response = client.get("/cities/suggest", params={"prefix": "p", "limit": 51})
+        self.assertEqual(422, response.status_code)
+        response = client.get("/cities/suggest", params={"prefix": "p", "limit": 3})
+        interface.suggest_cities.assert_called_once_with("p", 3)
+
+    def test_get_city(self):
+        city = {
+            "territory_id": "1234",
+            "territory_name": "Piraporinha",
+            "state_code": "SC",
+            "publication_urls": ["https://querido-diario.org.br"],
+            "level": "1",
+        }
+        interface = self.create_mock_gazette_interface(cities_info=[city])
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get("/cities/1234")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(city, response.json())
+        self.assertEqual("public, max-age=86400", response.headers["Cache-Control"])
+        interface.get_city.assert_called_once_with("1234")
+
+    def test_get_city_not_found(self):
+        interface = self.create_mock_gazette_interface()
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get("/cities/9999")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("Cache-Control", response.headers)
+
+    def test_suggest_route_is_not_a_territory_id(self):
+        interface = self.create_mock_gazette_interface()
+        configure_api_app(interface)
+        client = TestClient(app)
+        client.get("/cities/suggest", params={"prefix": "pira"})
+        interface.get_city.assert_not_called()
+
+    def test_get_cities_by_ids(self):
+        city = {
+            "territory_id": "1234",
+            "territory_name": "Piraporinha",
+            "state_code": "SC",
+            "level": "1",
+        }
+        interface = self.create_mock_gazette_interface(cities_info=[city])
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.post(
+            "/cities/_batch", json={"territory_ids": ["1234", "9999"]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({"cities": [city]}, response.json())
+        self.assertEqual("public, max-age=86400", response.headers["Cache-Control"])
+        interface.get_cities_by_ids.assert_called_once_with(["1234", "9999"])
+
+    def test_get_cities_by_ids_limit_number_of_ids(self):
+        configure_api_app(self.create_mock_gazette_interface())
+        client = TestClient(app)
+        response = client.post("/cities/_batch", json={"territory_ids": []})
+        self.assertEqual(response.status_code, 422)
+        response = client.post(
+            "/cities/_batch", json={"territory_ids": [str(id) for id in range(1001)]},
+        )
+        self.assertEqual(response.status_code, 422)
+
+    def test_cities_should_forward_limit(self):
+        interface = self.create_mock_gazette_interface()
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get("/cities", params={"city_name": "pirapo"})
+        interface.get_cities.assert_called_with("pirapo", None)
+        response = client.get("/cities", params={"city_name": "pirapo", "limit": 5})
+        self.assertEqual(response.status_code, 200)
+        interface.get_cities.assert_called_with("pirapo", 5)
+        response = client.get("/cities", params={"city_name": "pirapo", "limit": 0})
+        self.assertEqual(response.status_code, 422)
+
     def test_cities_should_return_data_returned_by_gazettes_interface(self):
         configure_api_app(
             self.create_mock_gazette_interface(
@@ -483,3 +620,517 @@ class ApiGazettesEndpointTests(TestCase):
                 ]
             },
         )
+
+    def test_gazettes_endpoint_should_forward_collapse(self):
+        interface = self.create_mock_gazette_interface()
+        configure_api_app(interface)
+        client = TestClient(app)
+        client.get("/gazettes/4205902")
+        self.assertFalse(interface.get_gazettes.call_args.args[0].collapse)
+        client.get("/gazettes", params={"collapse": True})
+        self.assertTrue(interface.get_gazettes.call_args.args[0].collapse)
+
+    def test_gazettes_endpoint_should_send_etag(self):
+        interface = self.create_mock_gazette_interface(gazettes_version="10-2021-01-01")
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get("/gazettes/4205902")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual("public, max-age=300", response.headers["Cache-Control"])
+        etag = response.headers["ETag"]
+        self.assertTrue(etag.startswith('W/"'))
+        self.assertEqual(etag, client.get("/gazettes/4205902").headers["ETag"])
+        self.assertNotEqual(etag, client.get("/gazettes/4205903").headers["ETag"])
+        self.assertNotEqual(
+            etag, client.get("/gazettes/4205902", params={"size": 20}).headers["ETag"]
+        )
+        interface.get_gazettes_version.return_value = "11-2021-01-02"
+        self.assertNotEqual(etag, client.get("/gazettes/4205902").headers["ETag"])
+
+    def test_gazettes_endpoint_should_not_search_when_not_modified(self):
+        interface = self.create_mock_gazette_interface(gazettes_version="10-2021-01-01")
+        configure_api_app(interface)
+        client = TestClient(app)
+        etag = client.get("/gazettes", params={"keywords": ["ok"]}).headers["ETag"]
+        interface.get_gazettes.reset_mock()
+        response = client.get(
+            "/gazettes",
+            params={"keywords": ["ok"]},
+            headers={"If-None-Match": f'"other", {etag[2:]}'},
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(etag, response.headers["ETag"])
+        self.assertEqual(b"", response.content)
+        interface.get_gazettes.assert_not_called()
+        response = client.get(
+            "/gazettes",
+            params={"keywords": ["other"]},
+            headers={"If-None-Match": etag},
+        )
+        self.assertEqual(response.status_code, 200)
+        interface.get_gazettes.assert_called_once()
+
+    def test_gazettes_endpoint_without_version_has_no_etag(self):
+        interface = self.create_mock_gazette_interface()
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get("/gazettes/4205902", headers={"If-None-Match": "*"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response.headers)
+
+    def test_cities_endpoints_should_send_last_modified(self):
+        last_modified = datetime(2021, 1, 1, 12, 30, tzinfo=timezone.utc)
+        interface = self.create_mock_gazette_interface(
+            cities_last_modified=last_modified
+        )
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get("/cities", params={"city_name": "pira"})
+        self.assertEqual("public, max-age=86400", response.headers["Cache-Control"])
+        self.assertEqual(
+            "Fri, 01 Jan 2021 12:30:00 GMT", response.headers["Last-Modified"]
+        )
+        etag = response.headers["ETag"]
+        response = client.get(
+            "/cities", params={"city_name": "pira"}, headers={"If-None-Match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+        response = client.get(
+            "/cities/suggest",
+            params={"prefix": "pira"},
+            headers={"If-Modified-Since": "Fri, 01 Jan 2021 12:30:00 GMT"},
+        )
+        self.assertEqual(response.status_code, 304)
+        interface.suggest_cities.assert_not_called()
+        response = client.get(
+            "/cities/suggest",
+            params={"prefix": "pira"},
+            headers={"If-Modified-Since": "Fri, 01 Jan 2021 12:29:59 GMT"},
+        )
+        self.assertEqual(response.status_code, 200)
+        interface.suggest_cities.assert_called_once()
+
+    def test_gazettes_endpoint_should_forward_include_city(self):
+        interface = self.create_mock_gazette_interface()
+        configure_api_app(interface)
+        client = TestClient(app)
+        client.get("/gazettes/4205902")
+        self.assertFalse(interface.get_gazettes.call_args.args[0].include_city)
+        client.get("/gazettes", params={"include_city": True})
+        self.assertTrue(interface.get_gazettes.call_args.args[0].include_city)
+        client.get("/gazettes/4205902", params={"include_city": True})
+        self.assertTrue(interface.get_gazettes.call_args.args[0].include_city)
+
+    def test_gazettes_endpoint_should_return_city(self):
+        today = date.today()
+        city = {
+            "territory_id": "4205902",
+            "territory_name": "My city",
+            "state_code": "SC",
+            "publication_urls": ["https://querido-diario.org.br"],
+            "level": "2",
+        }
+        interface = self.create_mock_gazette_interface(
+            (
+                1,
+                [
+                    {
+                        "territory_id": "4205902",
+                        "date": today,
+                        "url": "https://queridodiario.ok.org.br/",
+                        "territory_name": "My city",
+                        "state_code": "SC",
+                        "highlight_texts": ["test"],
+                        "city": city,
+                    }
+                ],
+            )
+        )
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get("/gazettes/4205902", params={"include_city": True})
+        self.assertEqual(city, response.json()["gazettes"][0]["city"])
+
+    def test_gazettes_endpoint_should_return_number_of_copies(self):
+        today = date.today()
+        interface = self.create_mock_gazette_interface(
+            (
+                1,
+                [
+                    {
+                        "territory_id": "4205902",
+                        "date": today,
+                        "url": "https://queridodiario.ok.org.br/",
+                        "territory_name": "My city",
+                        "state_code": "My state",
+                        "highlight_texts": ["test"],
+                        "copies": 2,
+                    }
+                ],
+            )
+        )
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get("/gazettes/4205902", params={"collapse": True})
+        self.assertEqual(2, response.json()["gazettes"][0]["copies"])
+
+    def create_gazettes(self, count):
+        return [
+            {
+                "territory_id": "4205902",
+                "date": date.today(),
+                "url": f"https://queridodiario.ok.org.br/{number}",
+                "territory_name": "My city",
+                "state_code": "My state",
+                "highlight_texts": ["test"],
+            }
+            for number in range(count)
+        ]
+
+    def test_gazettes_endpoint_should_compress_big_responses(self):
+        interface = self.create_mock_gazette_interface((20, self.create_gazettes(20)))
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get("/gazettes/4205902", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(20, len(response.json()["gazettes"]))
+        response = client.get(
+            "/gazettes/4205902", headers={"Accept-Encoding": "identity"}
+        )
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(20, len(response.json()["gazettes"]))
+
+    def test_gazettes_endpoint_should_not_compress_small_responses(self):
+        interface = self.create_mock_gazette_interface((1, self.create_gazettes(1)))
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get("/gazettes/4205902", headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        configure_api_app(interface, compression_minimum_size=0)
+        response = client.get("/gazettes/4205902", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+
+    def test_gazettes_endpoint_should_serve_cached_responses(self):
+        interface = self.create_mock_gazette_interface(
+            (20, self.create_gazettes(20)), gazettes_version="10-2021-01-01"
+        )
+        configure_api_app(interface)
+        client = TestClient(app)
+        first = client.get("/gazettes/4205902", headers={"Accept-Encoding": "gzip"})
+        second = client.get("/gazettes/4205902", headers={"Accept-Encoding": "gzip"})
+        interface.get_gazettes.assert_called_once()
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first.headers["ETag"], second.headers["ETag"])
+        self.assertEqual("public, max-age=300", second.headers["Cache-Control"])
+        entry = app.response_cache.get(first.headers["ETag"])
+        self.assertEqual(["gzip"], list(entry.variants))
+        identity = client.get(
+            "/gazettes/4205902", headers={"Accept-Encoding": "identity"}
+        )
+        self.assertEqual(first.json(), identity.json())
+        client.get("/gazettes/4205903")
+        self.assertEqual(2, interface.get_gazettes.call_count)
+
+    def test_gazettes_endpoint_without_version_should_not_cache_responses(self):
+        interface = self.create_mock_gazette_interface((20, self.create_gazettes(20)))
+        configure_api_app(interface)
+        client = TestClient(app)
+        client.get("/gazettes/4205902")
+        client.get("/gazettes/4205902")
+        self.assertEqual(2, interface.get_gazettes.call_count)
+        self.assertEqual(0, len(app.response_cache))
+
+    def test_response_cache_size(self):
+        interface = self.create_mock_gazette_interface(
+            (20, self.create_gazettes(20)), gazettes_version="10-2021-01-01"
+        )
+        configure_api_app(interface, response_cache_size=1)
+        client = TestClient(app)
+        client.get("/gazettes/4205902")
+        client.get("/gazettes/4205903")
+        client.get("/gazettes/4205902")
+        self.assertEqual(3, interface.get_gazettes.call_count)
+        self.assertEqual(1, len(app.response_cache))
+        configure_api_app(interface, response_cache_size=0)
+        client.get("/gazettes/4205902")
+        client.get("/gazettes/4205902")
+        self.assertEqual(5, interface.get_gazettes.call_count)
+
+    def test_cities_endpoints_should_compress_big_responses(self):
+        cities = [
+            {
+                "territory_id": str(4205900 + number),
+                "territory_name": f"My city {number}",
+                "state_code": "SC",
+                "publication_urls": ["https://querido-diario.org"],
+                "level": "1",
+            }
+            for number in range(20)
+        ]
+        interface = self.create_mock_gazette_interface(cities_info=cities)
+        configure_api_app(interface)
+        client = TestClient(app)
+        response = client.get(
+            "/cities/", params={"city_name": "my"}, headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertEqual(20, len(response.json()["cities"]))
+        response = client.get(
+            "/cities/suggest",
+            params={"prefix": "my"},
+            headers={"Accept-Encoding": "gzip"},
+        )
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(20, len(response.json()["cities"]))
+
+    def test_configure_api_should_fail_with_invalid_compression_level(self):
+        interface = self.create_mock_gazette_interface()
+        with self.assertRaises(Exception):
+            configure_api_app(interface, gzip_level=10)
+        with self.assertRaises(Exception):
+            configure_api_app(interface, brotli_level=12)
+
+    def test_gazettes_endpoint_should_send_msgpack(self):
+        gazettes = self.create_gazettes(2)
+        gazettes[0]["checksum"] = "ignored"
+        gazettes[0]["edition"] = None
+        interface = self.create_mock_gazette_interface((2, gazettes))
+        configure_api_app(interface)
+        client = TestClient(app)
+        json_response = client.get("/gazettes/4205902")
+        self.assertEqual("application/json", json_response.headers["Content-Type"])
+        response = client.get(
+            "/gazettes/4205902", headers={"Accept": "application/msgpack"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual("application/msgpack", response.headers["Content-Type"])
+        self.assertIn("Accept", response.headers["Vary"])
+        self.assertEqual(json_response.json(), msgpack.unpackb(response.content))
+
+    def test_gazettes_endpoint_should_send_cbor(self):
+        interface = self.create_mock_gazette_interface((20, self.create_gazettes(20)))
+        configure_api_app(interface)
+        client = TestClient(app)
+        json_response = client.get("/gazettes")
+        response = client.get(
+            "/gazettes",
+            headers={"Accept": "application/cbor", "Accept-Encoding": "gzip"},
+        )
+        self.assertEqual("application/cbor", response.headers["Content-Type"])
+        self.assertEqual("gzip", response.headers["Content-Encoding"])
+        self.assertEqual(json_response.json(), cbor2.loads(response.content))
+
+    def test_gazettes_endpoint_should_send_json_by_default(self):
+        interface = self.create_mock_gazette_interface((2, self.create_gazettes(2)))
+        configure_api_app(interface)
+        client = TestClient(app)
+        for accept in ["*/*", "text/html", "application/json, application/msgpack"]:
+            response = client.get("/gazettes", headers={"Accept": accept})
+            self.assertEqual("application/json", response.headers["Content-Type"])
+            self.assertEqual(2, response.json()["total_gazettes"])
+
+    def test_gazettes_etag_depends_on_the_media_type(self):
+        interface = self.create_mock_gazette_interface(
+            (2, self.create_gazettes(2)), gazettes_version="10-2021-01-01"
+        )
+        configure_api_app(interface)
+        client = TestClient(app)
+        json_response = client.get("/gazettes")
+        response = client.get("/gazettes", headers={"Accept": "application/msgpack"})
+        self.assertNotEqual(json_response.headers["ETag"], response.headers["ETag"])
+        self.assertEqual(2, msgpack.unpackb(response.content)["total_gazettes"])
+        response = client.get(
+            "/gazettes",
+            headers={
+                "Accept": "application/msgpack",
+                "If-None-Match": response.headers["ETag"],
+            },
+        )
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(2, interface.get_gazettes.call_count)
+
+    def test_cities_endpoints_should_send_msgpack(self):
+        cities = [
+            {
+                "territory_id": "4205902",
+                "territory_name": "My city",
+                "state_code": "SC",
+                "publication_urls": None,
+                "level": "1",
+            }
+        ]
+        interface = self.create_mock_gazette_interface(cities_info=cities)
+        configure_api_app(interface)
+        client = TestClient(app)
+        headers = {"Accept": "application/x-msgpack"}
+        requests = [
+            ("get", "/cities/", {"params": {"city_name": "my"}}),
+            ("get", "/cities/suggest", {"params": {"prefix": "my"}}),
+            ("get", "/cities/4205902", {}),
+            ("post", "/cities/_batch", {"json": {"territory_ids": ["4205902"]}}),
+        ]
+        for method, path, arguments in requests:
+            json_response = getattr(client, method)(path, **arguments)
+            response = getattr(client, method)(path, headers=headers, **arguments)
+            self.assertEqual("application/msgpack", response.headers["Content-Type"])
+            self.assertEqual(json_response.json(), msgpack.unpackb(response.content))
+
+    def test_admin_modes_should_require_the_admin_token(self):
+        interface = self.create_mock_gazette_interface(
+            (20, self.create_gazettes(20)), gazettes_version="10-2021-01-01"
+        )
+        configure_api_app(interface)
+        client = TestClient(app)
+        authorization = {"Authorization": "Bearer "}
+        for mode in ("_profile", "_dry_run"):
+            response = client.get(f"/gazettes?{mode}=true", headers=authorization)
+            self.assertEqual(403, response.status_code)
+        configure_api_app(interface, admin_token="secret")
+        for authorization in ({}, {"Authorization": "Bearer wrong"}):
+            response = client.get("/gazettes?_profile=true", headers=authorization)
+            self.assertEqual(403, response.status_code)
+        interface.get_gazettes.assert_not_called()
+        interface.explain_gazettes.assert_not_called()
+        response = client.get("/gazettes?_profile=false")
+        self.assertEqual(200, response.status_code)
+
+    def test_gazettes_endpoint_profile_mode(self):
+        interface = self.create_mock_gazette_interface(
+            (20, self.create_gazettes(20)), gazettes_version="10-2021-01-01"
+        )
+        configure_api_app(interface, admin_token="secret")
+        client = TestClient(app)
+        response = client.get(
+            "/gazettes/4205902?keywords=test&_profile=true",
+            headers={"Authorization": "Bearer secret"},
+        )
+        self.assertEqual(200, response.status_code)
+        content = response.json()
+        self.assertEqual(20, content["total_gazettes"])
+        self.assertEqual(20, len(content["gazettes"]))
+        self.assertEqual([], content["_profile"]["elasticsearch"])
+        self.assertCountEqual(
+            ["interval_ms", "duration_ms", "samples", "functions", "stacks"],
+            content["_profile"]["python"],
+        )
+        self.assertEqual("no-store", response.headers["Cache-Control"])
+        self.assertNotIn("ETag", response.headers)
+        self.assertEqual(0, len(app.response_cache))
+        filters = interface.get_gazettes.call_args.args[0]
+        self.assertEqual("4205902", filters.territory_id)
+        self.assertEqual(["test"], filters.keywords)
+
+    def test_gazettes_endpoint_dry_run_mode(self):
+        interface = self.create_mock_gazette_interface(
+            (20, self.create_gazettes(20)), gazettes_version="10-2021-01-01"
+        )
+        explanation = {
+            "query": {"query": {"match_none": {}}},
+            "validation": {"valid": True},
+        }
+        interface.explain_gazettes = MagicMock(return_value=explanation)
+        configure_api_app(interface, admin_token="secret")
+        client = TestClient(app)
+        response = client.get(
+            "/gazettes?since=2021-01-01&_dry_run=true",
+            headers={"Authorization": "Bearer secret"},
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(explanation, response.json())
+        self.assertEqual("no-store", response.headers["Cache-Control"])
+        interface.get_gazettes.assert_not_called()
+        filters = interface.explain_gazettes.call_args.args[0]
+        self.assertEqual(date(2021, 1, 1), filters.since)
+
+    def test_top_queries_endpoint(self):
+        interface = self.create_mock_gazette_interface(
+            (20, self.create_gazettes(20)), gazettes_version="10-2021-01-01"
+        )
+        configure_api_app(interface, admin_token="secret")
+        client = TestClient(app)
+        self.assertEqual(403, client.get("/stats/top-queries").status_code)
+        for _ in range(3):
+            client.get("/gazettes/4205902?keywords=saúde&since=2021-01-01")
+        client.get("/gazettes/?keywords=decreto&keywords=saúde")
+        headers = {"Authorization": "Bearer secret"}
+        client.get("/gazettes/?keywords=ignored&_profile=true", headers=headers)
+        response = client.get("/stats/top-queries?limit=1", headers=headers)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("no-store", response.headers["Cache-Control"])
+        content = response.json()
+        (top_query,) = content["queries"]["items"]
+        self.assertEqual(3, top_query["count"])
+        self.assertEqual("4205902", top_query["query"]["territory_id"])
+        self.assertEqual("2021-01-01", top_query["query"]["since"])
+        self.assertEqual(["saúde"], top_query["query"]["keywords"])
+        self.assertEqual(4, content["queries"]["total"])
+        self.assertEqual(
+            [{"territory_id": "4205902", "count": 3}], content["territories"]["items"]
+        )
+        self.assertEqual(
+            [{"keyword": "saúde", "count": 4}], content["keywords"]["items"]
+        )
+
+
+class SerializationTests(TestCase):
+    def test_negotiate_media_type(self):
+        media_types = ["application/json", "application/msgpack", "application/cbor"]
+        self.assertEqual("application/json", negotiate_media_type("", media_types))
+        self.assertEqual(
+            "application/msgpack",
+            negotiate_media_type("application/msgpack", media_types),
+        )
+        self.assertEqual(
+            "application/cbor",
+            negotiate_media_type(
+                "application/json;q=0.5, application/cbor", media_types
+            ),
+        )
+        self.assertEqual(
+            "application/json",
+            negotiate_media_type("application/*, text/html", media_types),
+        )
+        self.assertEqual(
+            "application/json",
+            negotiate_media_type("application/cbor", ["application/json"]),
+        )
+
+    def test_compact(self):
+        fields = {"date": None, "items": {"name": None}, "city": {"level": None}}
+        self.assertEqual(
+            {
+                "date": "2021-01-01",
+                "items": [{"name": "a"}, {}],
+                "city": {"level": "1"},
+            },
+            compact(
+                {
+                    "date": date(2021, 1, 1),
+                    "items": [{"name": "a", "other": 1}, {"name": None}],
+                    "city": {"level": CityLevel.ONE},
+                    "checksum": "abc",
+                    "edition": None,
+                },
+                fields,
+            ),
+        )
+
+
+class NegotiateEncodingTests(TestCase):
+    def test_no_accepted_encoding(self):
+        self.assertIsNone(negotiate_encoding("", ("br", "gzip")))
+        self.assertIsNone(negotiate_encoding("identity", ("br", "gzip")))
+        self.assertIsNone(negotiate_encoding("deflate", ("br", "gzip")))
+
+    def test_preferred_encoding(self):
+        self.assertEqual("br", negotiate_encoding("gzip, br", ("br", "gzip")))
+        self.assertEqual("gzip", negotiate_encoding("gzip, br", ("gzip",)))
+        self.assertEqual("br", negotiate_encoding("*", ("br", "gzip")))
+
+    def test_quality_values(self):
+        self.assertEqual("gzip", negotiate_encoding("br;q=0.5, gzip", ("br", "gzip")))
+        self.assertEqual("br", negotiate_encoding("br, gzip;q=0", ("br", "gzip")))
+        self.assertIsNone(negotiate_encoding("gzip;q=0, *;q=0", ("br", "gzip")))
+        self.assertIsNone(negotiate_encoding("gzip;q=x, *", ("gzip",)))
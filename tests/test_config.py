@@ -80,3 +80,192 @@ class BasicConfigurationTests(TestCase):
         }
         configuration = load_configuration()
         self.check_configuration_values(configuration, expected_config_dict)
+
+    @patch.dict(
+        "os.environ", {}, True,
+    )
+    def test_query_log_is_disabled_by_default(self):
+        configuration = load_configuration()
+        self.assertEqual("", configuration.query_log_file)
+        self.assertEqual(100 * 1024 * 1024, configuration.query_log_max_bytes)
+        self.assertEqual(10, configuration.query_log_backup_count)
+
+    @patch.dict(
+        "os.environ",
+        {
+            "QUERIDO_DIARIO_QUERY_LOG_FILE": "/var/log/queries.ndjson",
+            "QUERIDO_DIARIO_QUERY_LOG_MAX_BYTES": "1024",
+            "QUERIDO_DIARIO_QUERY_LOG_BACKUP_COUNT": "3",
+        },
+        True,
+    )
+    def test_load_query_log_configuration(self):
+        configuration = load_configuration()
+        self.assertEqual("/var/log/queries.ndjson", configuration.query_log_file)
+        self.assertEqual(1024, configuration.query_log_max_bytes)
+        self.assertEqual(3, configuration.query_log_backup_count)
+
+    @patch.dict(
+        "os.environ", {}, True,
+    )
+    def test_database_configuration_defaults(self):
+        configuration = load_configuration()
+        self.assertEqual("", configuration.database_url)
+        self.assertEqual(5, configuration.database_pool_size)
+        self.assertEqual(10, configuration.database_max_overflow)
+        self.assertEqual(30, configuration.database_pool_timeout)
+        self.assertEqual(1800, configuration.database_pool_recycle)
+
+    @patch.dict(
+        "os.environ",
+        {
+            "QUERIDO_DIARIO_DATABASE_URL": "postgresql://user:pass@db/cities",
+            "QUERIDO_DIARIO_DATABASE_POOL_SIZE": "20",
+            "QUERIDO_DIARIO_DATABASE_MAX_OVERFLOW": "0",
+            "QUERIDO_DIARIO_DATABASE_POOL_TIMEOUT": "5",
+            "QUERIDO_DIARIO_DATABASE_POOL_RECYCLE": "300",
+        },
+        True,
+    )
+    def test_load_database_configuration(self):
+        configuration = load_configuration()
+        self.assertEqual("postgresql://user:pass@db/cities", configuration.database_url)
+        self.assertEqual(20, configuration.database_pool_size)
+        self.assertEqual(0, configuration.database_max_overflow)
+        self.assertEqual(5, configuration.database_pool_timeout)
+        self.assertEqual(300, configuration.database_pool_recycle)
+
+    @patch.dict(
+        "os.environ", {}, True,
+    )
+    def test_compression_configuration_defaults(self):
+        configuration = load_configuration()
+        self.assertEqual(500, configuration.compression_minimum_size)
+        self.assertEqual(6, configuration.gzip_level)
+        self.assertEqual(5, configuration.brotli_level)
+        self.assertEqual(1000, configuration.response_cache_size)
+
+    @patch.dict(
+        "os.environ",
+        {
+            "QUERIDO_DIARIO_COMPRESSION_MINIMUM_SIZE": "1024",
+            "QUERIDO_DIARIO_GZIP_LEVEL": "1",
+            "QUERIDO_DIARIO_BROTLI_LEVEL": "9",
+            "QUERIDO_DIARIO_RESPONSE_CACHE_SIZE": "0",
+        },
+        True,
+    )
+    def test_load_compression_configuration(self):
+        configuration = load_configuration()
+        self.assertEqual(1024, configuration.compression_minimum_size)
+        self.assertEqual(1, configuration.gzip_level)
+        self.assertEqual(9, configuration.brotli_level)
+        self.assertEqual(0, configuration.response_cache_size)
+
+    @patch.dict(
+        "os.environ", {}, True,
+    )
+    def test_server_timing_is_disabled_by_default(self):
+        self.assertFalse(load_configuration().server_timing)
+
+    @patch.dict(
+        "os.environ", {"QUERIDO_DIARIO_SERVER_TIMING": "true"}, True,
+    )
+    def test_enable_server_timing(self):
+        self.assertTrue(load_configuration().server_timing)
+
+    @patch.dict(
+        "os.environ", {}, True,
+    )
+    def test_admin_token_is_empty_by_default(self):
+        self.assertEqual("", load_configuration().admin_token)
+
+    @patch.dict(
+        "os.environ", {"QUERIDO_DIARIO_ADMIN_TOKEN": "secret"}, True,
+    )
+    def test_admin_token(self):
+        self.assertEqual("secret", load_configuration().admin_token)
+
+    @patch.dict(
+        "os.environ", {"QUERIDO_DIARIO_TRACE_FILE": "/var/log/spans.ndjson"}, True,
+    )
+    def test_trace_file(self):
+        self.assertEqual("/var/log/spans.ndjson", load_configuration().trace_file)
+
+    @patch.dict(
+        "os.environ", {}, True,
+    )
+    def test_event_loop_stall_threshold_default(self):
+        self.assertEqual(100, load_configuration().event_loop_stall_threshold_ms)
+
+    @patch.dict(
+        "os.environ", {"QUERIDO_DIARIO_EVENT_LOOP_STALL_THRESHOLD_MS": "0"}, True,
+    )
+    def test_event_loop_stall_threshold(self):
+        self.assertEqual(0, load_configuration().event_loop_stall_threshold_ms)
+
+    @patch.dict(
+        "os.environ",
+        {
+            "QUERIDO_DIARIO_SLOW_QUERY_LOG_FILE": "/var/log/slow.ndjson",
+            "QUERIDO_DIARIO_SLOW_QUERY_THRESHOLD_MS": "250",
+            "QUERIDO_DIARIO_SLOW_QUERY_LOG_RATE": "0.5",
+            "QUERIDO_DIARIO_SLOW_QUERY_LOG_BURST": "5",
+        },
+        True,
+    )
+    def test_load_slow_query_log_configuration(self):
+        configuration = load_configuration()
+        self.assertEqual("/var/log/slow.ndjson", configuration.slow_query_log_file)
+        self.assertEqual(250, configuration.slow_query_threshold_ms)
+        self.assertEqual(0.5, configuration.slow_query_log_rate)
+        self.assertEqual(5, configuration.slow_query_log_burst)
+
+    @patch.dict(
+        "os.environ", {}, True,
+    )
+    def test_slow_query_log_configuration_defaults(self):
+        configuration = load_configuration()
+        self.assertEqual("", configuration.slow_query_log_file)
+        self.assertEqual(1000, configuration.slow_query_threshold_ms)
+        self.assertEqual(1, configuration.slow_query_log_rate)
+        self.assertEqual(10, configuration.slow_query_log_burst)
+
+    @patch.dict(
+        "os.environ", {}, True,
+    )
+    def test_warm_up_configuration_defaults(self):
+        configuration = load_configuration()
+        self.assertEqual("", configuration.warm_up_queries_file)
+        self.assertEqual("", configuration.top_queries_file)
+        self.assertEqual(60, configuration.warm_up_budget)
+        self.assertEqual(100, configuration.warm_up_max_queries)
+
+    @patch.dict(
+        "os.environ",
+        {
+            "QUERIDO_DIARIO_WARM_UP_QUERIES_FILE": "/var/log/queries.ndjson",
+            "QUERIDO_DIARIO_TOP_QUERIES_FILE": "/var/lib/top-queries.ndjson",
+            "QUERIDO_DIARIO_WARM_UP_BUDGET": "30",
+            "QUERIDO_DIARIO_WARM_UP_MAX_QUERIES": "20",
+        },
+        True,
+    )
+    def test_load_warm_up_configuration(self):
+        configuration = load_configuration()
+        self.assertEqual("/var/log/queries.ndjson", configuration.warm_up_queries_file)
+        self.assertEqual("/var/lib/top-queries.ndjson", configuration.top_queries_file)
+        self.assertEqual(30, configuration.warm_up_budget)
+        self.assertEqual(20, configuration.warm_up_max_queries)
+
+    @patch.dict(
+        "os.environ", {}, True,
+    )
+    def test_health_check_interval_default(self):
+        self.assertEqual(5, load_configuration().health_check_interval)
+
+    @patch.dict(
+        "os.environ", {"QUERIDO_DIARIO_HEALTH_CHECK_INTERVAL": "10"}, True,
+    )
+    def test_health_check_interval(self):
+        self.assertEqual(10, load_configuration().health_check_interval)
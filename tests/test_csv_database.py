@@ -4,9 +4,11 @@ import os
 import unittest
 from tempfile import NamedTemporaryFile
 import csv
+import time
+from datetime import datetime, timezone
 
 from gazettes import GazetteDataGateway, Gazette, OpennessLevel, City
-from database.csv import CSVDatabase
+from database.csv import LOOKUP_DURATION, CSVDatabase, normalize_name
 
 
 class CSVDatabaseTests(TestCase):
@@ -63,6 +65,13 @@ class CSVDatabaseTests(TestCase):
             database = CSVDatabase()
             self.assertEqual(self.database_file, database.database_file)
 
+    def test_count_cities(self):
+        with patch.dict(
+            os.environ, {"QUERIDO_DIARIO_DATABASE_CSV": self.database_file}
+        ):
+            database = CSVDatabase(0)
+        self.assertEqual(len(self.fake_database_data), database.count_cities())
+
     @expectedFailure
     def test_create_csv_database_without_envvar_with_file_path(self):
         with patch.dict(
@@ -113,3 +122,202 @@ class CSVDatabaseTests(TestCase):
                 ),
             ]
             self.assertCountEqual(expected_cities, cities)
+
+    def create_database(self, reload_interval=0, suggestion_weight=None):
+        with patch.dict(
+            os.environ, {"QUERIDO_DIARIO_DATABASE_CSV": self.database_file}
+        ):
+            database = CSVDatabase(reload_interval, suggestion_weight)
+        self.addCleanup(database.close)
+        return database
+
+    def update_database_file(self):
+        self.fake_database_data[0]["city_name"] = "Piraporinha Nova"
+        self.fake_database_data[0]["gazettes_urls"] = ["https://somewebsite.org"]
+        for row in self.fake_database_data[1:]:
+            row["gazettes_urls"] = row["gazettes_urls"].split(",")
+        self.create_fake_csv_database_file(self.fake_database_data)
+        status = os.stat(self.database_file)
+        os.utime(
+            self.database_file, ns=(status.st_atime_ns, status.st_mtime_ns + 10 ** 9)
+        )
+
+    def add_city_to_database_file(self, city_name, ibge_id, uf):
+        for row in self.fake_database_data:
+            row["gazettes_urls"] = row["gazettes_urls"].split(",")
+        self.fake_database_data.append(
+            {
+                "city_name": city_name,
+                "ibge_id": ibge_id,
+                "uf": uf,
+                "openness_level": 1,
+                "gazettes_urls": ["https://somewebsite.org"],
+            }
+        )
+        self.create_fake_csv_database_file(self.fake_database_data)
+
+    def test_database_file_is_read_only_once(self):
+        database = self.create_database()
+        with patch("builtins.open") as open_mock:
+            database.get_cities("pira")
+            database.get_cities("taquarinha")
+            open_mock.assert_not_called()
+
+    def test_cities_indexes(self):
+        database = self.create_database()
+        index = database._index
+        self.assertEqual(3, len(index))
+        self.assertEqual("Piraporinha", index.by_id["1234"].territory_name)
+        self.assertEqual(
+            ["Taquarinha Do Norte"], [c.territory_name for c in index.by_state["RN"]]
+        )
+        with self.assertRaises(TypeError):
+            index.by_id["9999"] = index.by_id["1234"]
+
+    def test_reload_database_when_file_changes(self):
+        database = self.create_database()
+        self.assertFalse(database.reload_if_changed())
+        self.update_database_file()
+        self.assertTrue(database.reload_if_changed())
+        self.assertEqual(
+            ["Piraporinha Nova"],
+            [c.territory_name for c in database.get_cities("pira")],
+        )
+
+    def test_keep_previous_data_when_reload_fails(self):
+        database = self.create_database()
+        with open(self.database_file, "w") as database_file:
+            database_file.write("invalid,header\n1,2\n")
+        self.assertFalse(database.reload_if_changed())
+        self.assertEqual(1, len(database.get_cities("pira")))
+
+    def test_reload_database_in_background(self):
+        database = self.create_database(reload_interval=0.01)
+        self.update_database_file()
+        for _ in range(200):
+            if database.get_cities("pira")[0].territory_name == "Piraporinha Nova":
+                break
+            time.sleep(0.01)
+        self.assertEqual(
+            ["Piraporinha Nova"],
+            [c.territory_name for c in database.get_cities("pira")],
+        )
+
+    def test_normalize_name(self):
+        self.assertEqual("embu guacu", normalize_name("Embu-Guaçu"))
+        self.assertEqual("sao joao d alianca", normalize_name(" São João d'Aliança "))
+
+    def test_search_ignoring_accents_and_case(self):
+        self.add_city_to_database_file("São Paulo", "3550308", "SP")
+        database = self.create_database()
+        for name in ("sao paulo", "SÃO PAULO", "são"):
+            self.assertEqual(
+                ["São Paulo"], [c.territory_name for c in database.get_cities(name)]
+            )
+
+    def test_search_names_with_typos(self):
+        database = self.create_database()
+        self.assertEqual(
+            ["Piraporinha"],
+            [c.territory_name for c in database.get_cities("piraporina")],
+        )
+        self.assertEqual(
+            ["Taquarinha Do Sul", "Taquarinha Do Norte"],
+            [c.territory_name for c in database.get_cities("taquarina do sul")],
+        )
+        self.assertEqual([], database.get_cities("xyz"))
+
+    def test_search_rank_prefix_matches_first(self):
+        self.add_city_to_database_file("Nova Taquarinha", "1237", "PR")
+        database = self.create_database()
+        self.assertEqual(
+            ["Taquarinha Do Sul", "Taquarinha Do Norte", "Nova Taquarinha"],
+            [c.territory_name for c in database.get_cities("taquarinha")],
+        )
+        self.assertEqual(
+            ["Taquarinha Do Sul"],
+            [c.territory_name for c in database.get_cities("taquarinha", limit=1)],
+        )
+
+    def test_suggest_cities_by_name_prefix(self):
+        database = self.create_database()
+        self.assertEqual(
+            ["Taquarinha Do Sul", "Taquarinha Do Norte"],
+            [c.territory_name for c in database.suggest_cities("Taquá")],
+        )
+        self.assertEqual(
+            ["Piraporinha"], [c.territory_name for c in database.suggest_cities("pira")]
+        )
+        self.assertEqual([], database.suggest_cities("porinha"))
+        self.assertEqual([], database.suggest_cities(""))
+
+    def test_suggest_cities_by_word_and_state_code(self):
+        database = self.create_database()
+        self.assertEqual(
+            ["Taquarinha Do Norte"],
+            [c.territory_name for c in database.suggest_cities("nor")],
+        )
+        self.assertEqual(
+            ["Taquarinha Do Norte"],
+            [c.territory_name for c in database.suggest_cities("rn")],
+        )
+        self.add_city_to_database_file("Rio Negro", "1237", "PR")
+        database = self.create_database()
+        self.assertEqual(
+            ["Rio Negro", "Taquarinha Do Sul", "Taquarinha Do Norte"],
+            [c.territory_name for c in database.suggest_cities("r")],
+        )
+        self.assertEqual(
+            ["Rio Negro", "Taquarinha Do Sul"],
+            [c.territory_name for c in database.suggest_cities("r", limit=2)],
+        )
+
+    def test_suggest_cities_weight(self):
+        database = self.create_database()
+        self.assertEqual((2, 1, 3), database._index.weights)
+        database = self.create_database(suggestion_weight="publication_urls")
+        self.assertEqual((1, 2, 2), database._index.weights)
+        with patch.dict(
+            os.environ,
+            {
+                "QUERIDO_DIARIO_DATABASE_CSV": self.database_file,
+                "QUERIDO_DIARIO_DATABASE_CSV_SUGGESTION_WEIGHT": "publication_urls",
+            },
+        ):
+            database = CSVDatabase(0)
+        self.assertEqual("publication_urls", database.suggestion_weight)
+        with self.assertRaises(Exception):
+            self.create_database(suggestion_weight="population")
+
+    def test_get_city_by_id(self):
+        database = self.create_database()
+        self.assertEqual("Piraporinha", database.get_city("1234").territory_name)
+        self.assertIsNone(database.get_city("9999"))
+
+    def test_get_cities_by_ids(self):
+        database = self.create_database()
+        self.assertEqual(
+            ["1236", "1234"],
+            [
+                c.territory_id
+                for c in database.get_cities_by_ids(["1236", "9999", "1234", "1236"])
+            ],
+        )
+        self.assertEqual([], database.get_cities_by_ids([]))
+
+    def test_last_modified(self):
+        database = self.create_database()
+        os.utime(self.database_file, (0, 1609459200))
+        self.assertTrue(database.reload_if_changed())
+        self.assertEqual(
+            datetime(2021, 1, 1, tzinfo=timezone.utc), database.get_last_modified()
+        )
+
+    def test_record_lookup_duration(self):
+        database = self.create_database()
+        lookups = LOOKUP_DURATION.labels("get_cities")
+        count = lookups.count
+        database.get_cities("pira")
+        database.get_cities()
+        self.assertEqual(count + 2, lookups.count)
+        self.assertEqual("get_cities", database.get_cities.__name__)
@@ -9,7 +9,19 @@ import time
 import elasticsearch
 
 from index import ElasticSearchDataMapper, create_elasticsearch_data_mapper
+from index.elasticsearch import (
+    SEARCH_DURATION,
+    SEARCH_HITS,
+    SEARCH_OVERHEAD,
+    SEARCH_TOOK,
+)
 from gazettes import GazetteDataGateway, Gazette
+from monitoring.profiling import (
+    elasticsearch_profiles,
+    start_elasticsearch_profiling,
+    stop_elasticsearch_profiling,
+)
+from monitoring.timing import collected_timings, start_collecting, stop_collecting
 
 
 FILE_ENDPOINT = "http://test.com"
@@ -602,6 +614,81 @@ class ElasticSearchDataMapperTest(ElasticSearchBaseTestCase):
         self._mapper.get_gazettes(until=today, offset=5, size=15)
         self.assert_basic_function_calls(until=today, offset=5, size=15)
 
+    def test_record_server_timings(self):
+        token = start_collecting()
+        try:
+            self._mapper.get_gazettes(until=date.today())
+            timings = collected_timings()
+        finally:
+            stop_collecting(token)
+        self.assertEqual(["es", "es_took", "decode"], [name for name, _, _ in timings])
+        self.assertEqual(0.004, timings[1][1])
+
+    def test_record_search_metrics(self):
+        metrics = [SEARCH_DURATION, SEARCH_TOOK, SEARCH_OVERHEAD, SEARCH_HITS]
+        counts = [metric.default_child().count for metric in metrics]
+        took = SEARCH_TOOK.default_child()
+        took_sum = dict(
+            (name, value) for name, _, value in took.samples() if name == "_sum"
+        )["_sum"]
+        self._mapper.get_gazettes(until=date.today())
+        self.assertEqual(
+            [count + 1 for count in counts],
+            [metric.default_child().count for metric in metrics],
+        )
+        new_took_sum = dict(
+            (name, value) for name, _, value in took.samples() if name == "_sum"
+        )["_sum"]
+        self.assertAlmostEqual(0.004, new_took_sum - took_sum)
+
+    def test_request_elasticsearch_profile_when_profiling(self):
+        today = date.today()
+        self._mapper.get_gazettes(until=today)
+        self.assert_basic_function_calls(until=today)
+        profile = {"shards": [{"id": "[node][gazettes][0]", "searches": []}]}
+        self.es_mock.search.return_value["profile"] = profile
+        token = start_elasticsearch_profiling()
+        try:
+            self._mapper.get_gazettes(until=today)
+            profiles = elasticsearch_profiles()
+        finally:
+            stop_elasticsearch_profiling(token)
+        self.assertEqual([profile], profiles)
+        self.es_mock.search.assert_called_with(
+            body={**self.build_expected_query(until=today), "profile": True},
+            index=self.INDEX,
+        )
+
+    def test_explain_gazettes(self):
+        validation = {"valid": True, "explanations": []}
+        self.es_mock.indices.validate_query.return_value = validation
+        today = date.today()
+        explanation = self._mapper.explain_gazettes(until=today)
+        query = self.build_expected_query(until=today)
+        self.assertEqual({"query": query, "validation": validation}, explanation)
+        self.es_mock.indices.validate_query.assert_called_once_with(
+            index=self.INDEX, body={"query": query["query"]}, explain=True
+        )
+        self.es_mock.search.assert_not_called()
+
+    def test_get_health(self):
+        self.es_mock.cluster.health.return_value = {"status": "yellow"}
+        self.es_mock.indices.exists.return_value = True
+        self.assertEqual(
+            {"status": "yellow", "index_exists": True}, self._mapper.get_health()
+        )
+        self.es_mock.indices.exists.assert_called_with(
+            index=self.INDEX, request_timeout=ElasticSearchDataMapper.HEALTH_TIMEOUT
+        )
+
+    def test_get_health_when_elasticsearch_is_unavailable(self):
+        self.es_mock.cluster.health.side_effect = elasticsearch.ConnectionError(
+            "N/A", "Connection refused", None
+        )
+        with self.assertLogs(level="ERROR"):
+            health = self._mapper.get_health()
+        self.assertEqual({"status": None, "index_exists": None}, health)
+
 
 def is_running_integration_tests():
     return os.environ.get("RUN_INTEGRATION_TESTS", 0) == "1"
@@ -1183,3 +1270,92 @@ class Elasticsearch(TestCase):
 
         total_items, _ = es.get_gazettes("4205920", None, None, None, 1, 4)
         self.assertEqual(total_items, 8)
+
+    @patch("elasticsearch.Elasticsearch")
+    def test_build_query_with_collapse(self, es_mock):
+        es = ElasticSearchDataMapper(self.host, self.index)
+        query = es.build_query(territory_id="4205920", collapse=True)
+        self.assertEqual(
+            {"field": "file_checksum", "inner_hits": {"name": "copies", "size": 0},},
+            query["collapse"],
+        )
+        self.assertEqual(
+            {"total_gazettes": {"cardinality": {"field": "file_checksum"}}},
+            query["aggs"],
+        )
+        query = es.build_query(territory_id="4205920")
+        self.assertNotIn("collapse", query)
+        self.assertNotIn("aggs", query)
+
+    @patch("elasticsearch.Elasticsearch")
+    def test_total_number_of_items_with_collapse_uses_cardinality(self, es_mock):
+        es = ElasticSearchDataMapper(self.host, self.index)
+        self.search_result_json["aggregations"] = {"total_gazettes": {"value": 5}}
+        self.assertEqual(5, es.get_total_number_items(self.search_result_json))
+
+    @patch("elasticsearch.Elasticsearch")
+    def test_collapsed_gazettes_have_number_of_copies(self, es_mock):
+        es_mock.search.return_value = self.search_result_json
+        es = ElasticSearchDataMapper(self.host, self.index)
+        es._es = es_mock
+        for hit in self.search_result_json["hits"]["hits"]:
+            hit["inner_hits"] = {
+                "copies": {
+                    "hits": {
+                        "total": {"value": 3, "relation": "eq"},
+                        "max_score": None,
+                        "hits": [],
+                    }
+                }
+            }
+
+        _, gazettes = es.get_gazettes("4205920", collapse=True)
+        self.assertTrue(all(gazette.copies == 3 for gazette in gazettes))
+        self.assertTrue("collapse" in es_mock.search.call_args.kwargs["body"])
+
+    @patch("elasticsearch.Elasticsearch")
+    def test_index_generation(self, es_mock):
+        es_mock.search.return_value = {
+            "hits": {"total": {"value": 8, "relation": "eq"}, "hits": []},
+            "aggregations": {
+                "newest_date": {
+                    "value": 1609372800000,
+                    "value_as_string": "2020-12-31T00:00:00.000Z",
+                }
+            },
+        }
+        es = ElasticSearchDataMapper(self.host, self.index, generation_ttl=60)
+        es._es = es_mock
+        self.assertEqual("8-2020-12-31T00:00:00.000Z", es.get_index_generation())
+        es_mock.search.assert_called_once_with(
+            index=self.index,
+            body={
+                "size": 0,
+                "track_total_hits": True,
+                "aggs": {"newest_date": {"max": {"field": "date"}}},
+            },
+        )
+        es.get_index_generation()
+        es_mock.search.assert_called_once()
+
+    @patch("elasticsearch.Elasticsearch")
+    def test_index_generation_expires(self, es_mock):
+        es_mock.search.return_value = {
+            "hits": {"total": {"value": 0, "relation": "eq"}, "hits": []},
+            "aggregations": {"newest_date": {"value": None}},
+        }
+        es = ElasticSearchDataMapper(self.host, self.index, generation_ttl=0)
+        es._es = es_mock
+        self.assertEqual("0-None", es.get_index_generation())
+        es_mock.search.return_value = {
+            "hits": {"total": {"value": 1, "relation": "eq"}, "hits": []},
+            "aggregations": {"newest_date": {"value": 1609372800000}},
+        }
+        self.assertEqual("1-1609372800000", es.get_index_generation())
+
+    @patch("elasticsearch.Elasticsearch")
+    def test_index_generation_unavailable(self, es_mock):
+        es_mock.search.side_effect = elasticsearch.ConnectionError("unavailable")
+        es = ElasticSearchDataMapper(self.host, self.index)
+        es._es = es_mock
+        self.assertIsNone(es.get_index_generation())
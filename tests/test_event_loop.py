@@ -0,0 +1,155 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from gazettes import GazetteAccessInterface
+from monitoring import EventLoopMonitor
+from monitoring.event_loop import (
+    EVENT_LOOP_LAG,
+    EVENT_LOOP_STALLS,
+    REQUEST_BLOCKING,
+    TimedCoroutine,
+)
+
+
+def block_event_loop(seconds):
+    time.sleep(seconds)
+
+
+def run_in_new_loop(coroutine):
+    """
+    asyncio.run() unsets the event loop of the thread used by the TestClient
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TimedCoroutineTests(TestCase):
+    def test_longest_step(self):
+        async def steps():
+            block_event_loop(0.01)
+            await asyncio.sleep(0.05)
+            block_event_loop(0.03)
+            await asyncio.sleep(0)
+            return "result"
+
+        async def run():
+            timed = TimedCoroutine(steps())
+            return await timed, timed.longest_step
+
+        result, longest_step = run_in_new_loop(run())
+        self.assertEqual("result", result)
+        self.assertGreaterEqual(longest_step, 0.03)
+        self.assertLess(longest_step, 0.05)
+
+    def test_exceptions(self):
+        async def failure():
+            await asyncio.sleep(0)
+            raise ValueError()
+
+        async def run():
+            await TimedCoroutine(failure())
+
+        with self.assertRaises(ValueError):
+            run_in_new_loop(run())
+
+    def test_cancellation(self):
+        cancelled = []
+
+        async def wait():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        async def run():
+            task = asyncio.ensure_future(TimedCoroutine(wait()))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        run_in_new_loop(run())
+        self.assertEqual([True], cancelled)
+
+
+class BlockingCallMiddlewareTests(TestCase):
+    def create_client(self, search_time):
+        interface = MagicMock(spec=GazetteAccessInterface)
+        interface.get_gazettes_version.return_value = None
+        interface.get_gazettes.side_effect = lambda filters: (
+            block_event_loop(search_time) or (0, [])
+        )
+        configure_api_app(interface)
+        return TestClient(app)
+
+    def set_fail_threshold(self, threshold_ms):
+        previous = app.blocking_calls.fail_threshold_ms
+        app.blocking_calls.fail_threshold_ms = threshold_ms
+        self.addCleanup(setattr, app.blocking_calls, "fail_threshold_ms", previous)
+
+    def test_record_request_blocking_time(self):
+        client = self.create_client(0.02)
+        count = REQUEST_BLOCKING.default_child().count
+        self.assertEqual(200, client.get("/gazettes/").status_code)
+        self.assertEqual(count + 1, REQUEST_BLOCKING.default_child().count)
+
+    def test_fail_blocking_requests_in_test_mode(self):
+        self.set_fail_threshold(10)
+        client = self.create_client(0.05)
+        with self.assertRaises(Exception) as context:
+            client.get("/gazettes/")
+        self.assertIn("GET /gazettes/ blocked the event loop", str(context.exception))
+        self.set_fail_threshold(1000)
+        self.assertEqual(200, client.get("/gazettes/").status_code)
+
+
+class EventLoopMonitorTests(TestCase):
+    def test_report_stall_with_the_blocking_stack(self):
+        monitor = EventLoopMonitor(threshold_ms=50, interval=0.01)
+        stalls = EVENT_LOOP_STALLS.default_child().value
+        lags = EVENT_LOOP_LAG.default_child().count
+
+        async def run():
+            monitor.start()
+            self.assertTrue(monitor.running)
+            await asyncio.sleep(0.05)
+            block_event_loop(0.2)
+            await asyncio.sleep(0.05)
+            await monitor.stop()
+
+        with self.assertLogs(level="WARNING") as logs:
+            run_in_new_loop(run())
+        self.assertFalse(monitor.running)
+        self.assertEqual(stalls + 1, EVENT_LOOP_STALLS.default_child().value)
+        self.assertGreater(EVENT_LOOP_LAG.default_child().count, lags + 2)
+        (message,) = logs.output
+        self.assertIn("Event loop blocked for", message)
+        self.assertIn("in block_event_loop", message)
+        self.assertIn("in run", message)
+
+    def test_disabled_monitor(self):
+        monitor = EventLoopMonitor(threshold_ms=0)
+
+        async def run():
+            monitor.start()
+            self.assertFalse(monitor.running)
+            await monitor.stop()
+
+        run_in_new_loop(run())
+
+    def test_monitor_runs_with_the_app(self):
+        configure_api_app(
+            MagicMock(spec=GazetteAccessInterface), event_loop_stall_threshold_ms=1000
+        )
+        with TestClient(app):
+            self.assertTrue(app.event_loop_monitor.running)
+        self.assertFalse(app.event_loop_monitor.running)
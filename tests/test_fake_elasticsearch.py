@@ -0,0 +1,224 @@
+from datetime import date, timedelta
+from unittest import TestCase
+import threading
+import time
+
+import elasticsearch
+
+from fake_elasticsearch import (
+    FakeElasticsearch,
+    FakeElasticsearchServer,
+    FaultInjection,
+)
+from gazettes import Gazette
+from index import create_elasticsearch_data_mapper
+from monitoring.profiling import (
+    elasticsearch_profiles,
+    start_elasticsearch_profiling,
+    stop_elasticsearch_profiling,
+)
+
+
+class FakeElasticsearchServerTest(TestCase):
+
+    INDEX = "gazettes"
+
+    def setUp(self):
+        self.faults = FaultInjection(seed=42)
+        self.server = FakeElasticsearchServer(
+            elasticsearch=FakeElasticsearch(self.faults)
+        ).start()
+        self.addCleanup(self.server.stop)
+        self._es = elasticsearch.Elasticsearch(hosts=[self.server.url])
+        self.addCleanup(self._es.close)
+
+    def create_gazette(self, number, territory_id, gazette_date, text):
+        return {
+            "source_text": text,
+            "date": gazette_date.strftime("%Y-%m-%d"),
+            "is_extra_edition": False,
+            "edition_number": f"{number}.1",
+            "file_checksum": f"checksum{number}",
+            "url": f"https://test.com/{number}",
+            "file_raw_txt": f"https://test.com/{number}.txt",
+            "territory_id": territory_id,
+            "territory_name": "Rio de Janeiro",
+            "state_code": "RJ",
+        }
+
+    def populate_index(self):
+        today = date.today()
+        self._data = [
+            self.create_gazette(1, "3304557", today, "This is a fake gazette"),
+            self.create_gazette(
+                2, "3304557", today - timedelta(days=1), "Gazette with keyword1"
+            ),
+            self.create_gazette(
+                3, "4205902", today - timedelta(days=2), "keyword1 and keyword2"
+            ),
+        ]
+        self._es.indices.create(
+            index=self.INDEX,
+            body={"mappings": {"properties": {"date": {"type": "date"}}}},
+        )
+        bulk_data = []
+        for gazette in self._data:
+            bulk_data.append(
+                {"index": {"_index": self.INDEX, "_id": gazette["file_checksum"]}}
+            )
+            bulk_data.append(gazette)
+        self._es.bulk(bulk_data, index=self.INDEX, refresh=True)
+
+    def test_indices_api(self):
+        self.assertFalse(self._es.indices.exists(index=self.INDEX))
+        self._es.indices.create(index=self.INDEX)
+        self.assertTrue(self._es.indices.exists(index=self.INDEX))
+        with self.assertRaises(elasticsearch.RequestError):
+            self._es.indices.create(index=self.INDEX)
+        self._es.indices.delete(index=self.INDEX)
+        self.assertFalse(self._es.indices.exists(index=self.INDEX))
+        self._es.indices.delete(index=self.INDEX, ignore_unavailable=True)
+
+    def test_bulk_and_search(self):
+        self.populate_index()
+        response = self._es.search(index=self.INDEX, body={"query": {"match_all": {}}})
+        self.assertEqual(3, response["hits"]["total"]["value"])
+        self.assertCountEqual(
+            ["checksum1", "checksum2", "checksum3"],
+            [hit["_id"] for hit in response["hits"]["hits"]],
+        )
+
+    def test_search_while_bulk_loading(self):
+        fake = FakeElasticsearch()
+        fake.create_index(self.INDEX)
+        stop = threading.Event()
+
+        def load():
+            number = 0
+            while not stop.is_set():
+                fake.bulk([{"index": {"_index": self.INDEX}}, {"number": number}])
+                number += 1
+
+        loader = threading.Thread(target=load)
+        loader.start()
+        self.addCleanup(loader.join)
+        self.addCleanup(stop.set)
+        for _ in range(200):
+            fake.search(self.INDEX, {"query": {"match_all": {}}, "size": 0})
+
+    def test_data_mapper_filters(self):
+        self.populate_index()
+        mapper = create_elasticsearch_data_mapper(self.server.url, self.INDEX)
+        total, gazettes = mapper.get_gazettes(territory_id="3304557")
+        self.assertEqual(2, total)
+        self.assertEqual(["checksum1", "checksum2"], [g.checksum for g in gazettes])
+        total, gazettes = mapper.get_gazettes(keywords=["keyword1", "keyword2"])
+        self.assertEqual(1, total)
+        self.assertIsInstance(gazettes[0], Gazette)
+        self.assertEqual("checksum3", gazettes[0].checksum)
+        self.assertEqual(date.today() - timedelta(days=2), gazettes[0].date)
+        total, gazettes = mapper.get_gazettes(
+            since=date.today() - timedelta(days=1), offset=1, size=1
+        )
+        self.assertEqual(2, total)
+        self.assertEqual(["checksum2"], [g.checksum for g in gazettes])
+
+    def test_highlight(self):
+        self.populate_index()
+        mapper = create_elasticsearch_data_mapper(self.server.url, self.INDEX)
+        _, gazettes = mapper.get_gazettes(
+            keywords=["keyword1"], pre_tags=["<b>"], post_tags=["</b>"]
+        )
+        self.assertCountEqual(
+            [["Gazette with <b>keyword1</b>"], ["<b>keyword1</b> and keyword2"]],
+            [g.highlight_texts for g in gazettes],
+        )
+
+    def test_msearch(self):
+        self.populate_index()
+        response = self._es.msearch(
+            body=[
+                {"index": self.INDEX},
+                {"query": {"term": {"territory_id": "4205902"}}},
+                {"index": "does-not-exist"},
+                {"query": {"match_all": {}}},
+            ]
+        )
+        self.assertEqual(1, response["responses"][0]["hits"]["total"]["value"])
+        self.assertEqual(404, response["responses"][1]["status"])
+
+    def test_latency_injection(self):
+        self.populate_index()
+        self.faults.latency = 50
+        started = time.monotonic()
+        self._es.search(index=self.INDEX, body={"query": {"match_all": {}}})
+        self.assertGreaterEqual(time.monotonic() - started, 0.05)
+
+    def test_failure_injection(self):
+        self.populate_index()
+        self.faults.error_rate = 1
+        self.faults.error_status = 429
+        with self.assertRaises(elasticsearch.TransportError) as context:
+            self._es.search(index=self.INDEX, body={"query": {"match_all": {}}})
+        self.assertEqual(429, context.exception.status_code)
+
+    def test_hang_injection_triggers_client_timeout(self):
+        self.populate_index()
+        self.faults.hang_rate = 1
+        self.faults.hang_time = 1
+        client = elasticsearch.Elasticsearch(
+            hosts=[self.server.url], timeout=0.1, max_retries=0
+        )
+        self.addCleanup(client.close)
+        with self.assertRaises(elasticsearch.ConnectionTimeout):
+            client.search(index=self.INDEX, body={"query": {"match_all": {}}})
+
+    def test_collapse_duplicated_gazettes(self):
+        self.populate_index()
+        republished = dict(self._data[0], edition_number="1.2")
+        self._es.index(index=self.INDEX, id="republished", body=republished)
+        mapper = create_elasticsearch_data_mapper(self.server.url, self.INDEX)
+        total, gazettes = mapper.get_gazettes(
+            since=date.today() - timedelta(days=30), collapse=True
+        )
+        self.assertEqual(3, total)
+        self.assertEqual(
+            ["checksum1", "checksum2", "checksum3"], [g.checksum for g in gazettes]
+        )
+        self.assertEqual([2, 1, 1], [g.copies for g in gazettes])
+        total, gazettes = mapper.get_gazettes(since=date.today() - timedelta(days=30))
+        self.assertEqual(4, total)
+        self.assertEqual([None] * 4, [g.copies for g in gazettes])
+
+    def test_search_profile(self):
+        self.populate_index()
+        mapper = create_elasticsearch_data_mapper(self.server.url, self.INDEX)
+        token = start_elasticsearch_profiling()
+        try:
+            total, _ = mapper.get_gazettes(territory_id="3304557")
+            profiles = elasticsearch_profiles()
+        finally:
+            stop_elasticsearch_profiling(token)
+        self.assertEqual(2, total)
+        (query,) = profiles[0]["shards"][0]["searches"][0]["query"]
+        self.assertEqual("bool", query["type"])
+        self.assertEqual("(+territory_id:3304557)", query["description"])
+        self.assertEqual(["term"], [child["type"] for child in query["children"]])
+
+    def test_validate_query(self):
+        self.populate_index()
+        mapper = create_elasticsearch_data_mapper(self.server.url, self.INDEX)
+        explanation = mapper.explain_gazettes(
+            since=date(2021, 1, 1), keywords=["keyword1", "keyword2"]
+        )
+        validation = explanation["validation"]
+        self.assertTrue(validation["valid"])
+        self.assertEqual(
+            "(+date:[2021-01-01 TO *] +source_text:keyword1 +source_text:keyword2)",
+            validation["explanations"][0]["explanation"],
+        )
+        validation = self._es.indices.validate_query(
+            index=self.INDEX, body={"query": {"fuzzy": {"source_text": "gazete"}}}
+        )
+        self.assertFalse(validation["valid"])
+        self.assertIn("fuzzy", validation["explanations"][0]["error"])
@@ -1,7 +1,7 @@
 import unittest
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 
 from gazettes import (
     GazetteAccess,
@@ -192,7 +192,50 @@ class GazetteAccessTest(TestCase):
         cities = self.gazette_access.get_cities()
         self.assertEqual(len(self.database_data), len(cities))
         self.mock_database_gateway.get_cities.assert_called_once()
-        self.assertCountEqual([vars(city) for city in self.database_data], cities)
+        self.assertCountEqual([city.as_dict() for city in self.database_data], cities)
+
+    def test_suggest_cities(self):
+        self.mock_database_gateway.suggest_cities = MagicMock(
+            return_value=self.database_data[:1]
+        )
+        cities = self.gazette_access.suggest_cities("pira", 5)
+        self.mock_database_gateway.suggest_cities.assert_called_once_with("pira", 5)
+        self.assertEqual([self.database_data[0].as_dict()], cities)
+
+    def test_get_city(self):
+        self.mock_database_gateway.get_city = MagicMock(
+            return_value=self.database_data[0]
+        )
+        self.assertEqual(
+            self.database_data[0].as_dict(), self.gazette_access.get_city("1234")
+        )
+        self.mock_database_gateway.get_city.assert_called_once_with("1234")
+        self.mock_database_gateway.get_city = MagicMock(return_value=None)
+        self.assertIsNone(self.gazette_access.get_city("9999"))
+
+    def test_get_cities_by_ids(self):
+        self.mock_database_gateway.get_cities_by_ids = MagicMock(
+            return_value=self.database_data
+        )
+        cities = self.gazette_access.get_cities_by_ids(["1234", "1235", "1236"])
+        self.mock_database_gateway.get_cities_by_ids.assert_called_once_with(
+            ["1234", "1235", "1236"]
+        )
+        self.assertEqual([city.as_dict() for city in self.database_data], cities)
+
+    def test_versions(self):
+        self.mock_data_gateway.get_index_generation = MagicMock(return_value="1-2")
+        self.mock_database_gateway.get_last_modified = MagicMock(
+            return_value=datetime(2021, 1, 1)
+        )
+        self.assertEqual("1-2", self.gazette_access.get_gazettes_version())
+        self.assertEqual(
+            datetime(2021, 1, 1), self.gazette_access.get_cities_last_modified()
+        )
+
+    def test_get_cities_forward_limit(self):
+        self.gazette_access.get_cities("taquarinha", 1)
+        self.mock_database_gateway.get_cities.assert_called_once_with("taquarinha", 1)
 
     def test_get_gazettes_should_return_dictionary(self):
         expected_results = [
@@ -207,6 +250,7 @@ class GazetteAccessTest(TestCase):
                 "is_extra_edition": gazette.is_extra_edition,
                 "highlight_texts": gazette.highlight_texts,
                 "file_raw_txt": gazette.file_raw_txt,
+                "copies": gazette.copies,
             }
             for gazette in self.return_value
         ]
@@ -214,6 +258,27 @@ class GazetteAccessTest(TestCase):
         _, gazettes = self.gazette_access.get_gazettes()
         self.assertCountEqual(expected_results, gazettes)
 
+    def test_get_gazettes_include_city(self):
+        city = City("My city", "4205902", "SC", OpennessLevel("1"), None)
+        self.mock_database_gateway.get_cities_by_ids = MagicMock(return_value=[city])
+        _, gazettes = self.gazette_access.get_gazettes(
+            filters=GazetteRequest(include_city=True)
+        )
+        self.mock_database_gateway.get_cities_by_ids.assert_called_once_with(
+            [gazette.territory_id for gazette in self.return_value]
+        )
+        for gazette in gazettes:
+            if gazette["territory_id"] == "4205902":
+                self.assertEqual(city.as_dict(), gazette["city"])
+            else:
+                self.assertIsNone(gazette["city"])
+
+    def test_get_gazettes_without_city(self):
+        self.mock_database_gateway.get_cities_by_ids = MagicMock()
+        _, gazettes = self.gazette_access.get_gazettes(filters=GazetteRequest())
+        self.mock_database_gateway.get_cities_by_ids.assert_not_called()
+        self.assertTrue(all("city" not in gazette for gazette in gazettes))
+
     def test_should_foward_filter_to_gateway(self):
         gazette_access = GazetteAccess(
             self.mock_data_gateway, self.mock_database_gateway
@@ -234,6 +299,7 @@ class GazetteAccessTest(TestCase):
             number_of_fragments=1,
             pre_tags=[""],
             post_tags=[""],
+            collapse=False,
         )
 
     def test_should_foward_since_date_filter_to_gateway(self):
@@ -256,6 +322,7 @@ class GazetteAccessTest(TestCase):
             number_of_fragments=1,
             pre_tags=[""],
             post_tags=[""],
+            collapse=False,
         )
 
     def test_should_foward_until_date_filter_to_gateway(self):
@@ -278,6 +345,7 @@ class GazetteAccessTest(TestCase):
             number_of_fragments=1,
             pre_tags=[""],
             post_tags=[""],
+            collapse=False,
         )
 
     def test_should_foward_keywords_filter_to_gateway(self):
@@ -301,6 +369,7 @@ class GazetteAccessTest(TestCase):
             number_of_fragments=1,
             pre_tags=[""],
             post_tags=[""],
+            collapse=False,
         )
 
     def test_should_foward_page_fields_filter_to_gateway(self):
@@ -323,6 +392,7 @@ class GazetteAccessTest(TestCase):
             number_of_fragments=1,
             pre_tags=[""],
             post_tags=[""],
+            collapse=False,
         )
 
 
@@ -393,3 +463,66 @@ class GazetteTest(TestCase):
         self.assertIsNone(gazette.edition)
         self.assertIsNone(gazette.is_extra_edition)
         self.assertEqual(gazette.checksum, checksum)
+
+    def test_gazette_as_dict(self):
+        today = date.today()
+        gazette = Gazette(
+            "ID",
+            today,
+            "https://queridodiario.ok.org.br/",
+            "checksum",
+            "My city",
+            "My state",
+            ["highlight"],
+            "123.45",
+            False,
+            "https://queridodiario.ok.org.br/file.txt",
+        )
+        self.assertEqual(
+            {
+                "territory_id": "ID",
+                "date": today,
+                "url": "https://queridodiario.ok.org.br/",
+                "checksum": "checksum",
+                "territory_name": "My city",
+                "state_code": "My state",
+                "highlight_texts": ["highlight"],
+                "edition": "123.45",
+                "is_extra_edition": False,
+                "file_raw_txt": "https://queridodiario.ok.org.br/file.txt",
+                "copies": None,
+            },
+            gazette.as_dict(),
+        )
+
+    def test_gazette_does_not_have_instance_dictionary(self):
+        gazette = Gazette("ID", date.today(), "url", "checksum", "city", "SC", [])
+        self.assertFalse(hasattr(gazette, "__dict__"))
+        with self.assertRaises(AttributeError):
+            gazette.unknown_field = 1
+
+    def test_equal_gazettes_have_same_hash(self):
+        today = date.today()
+        gazette = Gazette("ID", today, "url", "checksum", "city", "SC", ["a", "b"])
+        same_gazette = Gazette("ID", today, "url", "checksum", "city", "SC", ["a", "b"])
+        other_gazette = Gazette("ID", today, "url", "checksum", "city", "SC", ["a"])
+        self.assertEqual(gazette, same_gazette)
+        self.assertEqual(hash(gazette), hash(same_gazette))
+        self.assertNotEqual(gazette, other_gazette)
+        self.assertEqual(1, len({gazette, same_gazette}))
+
+
+class CityTest(TestCase):
+    def test_city_as_dict(self):
+        city = City("My city", "1234", "SC", OpennessLevel("2"), ["https://city.gov"])
+        self.assertEqual(
+            {
+                "territory_id": "1234",
+                "territory_name": "My city",
+                "state_code": "SC",
+                "level": OpennessLevel("2"),
+                "publication_urls": ["https://city.gov"],
+            },
+            city.as_dict(),
+        )
+        self.assertFalse(hasattr(city, "__dict__"))
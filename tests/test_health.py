@@ -0,0 +1,143 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+import time
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from api.health import HealthMonitor
+from gazettes import GazetteAccess, GazetteAccessInterface
+
+HEALTHY = {
+    "index": {"status": "green", "index_exists": True},
+    "database": {"cities": 5570},
+}
+
+
+class HealthMonitorTests(TestCase):
+    def test_nothing_is_ready_before_the_first_check(self):
+        monitor = HealthMonitor(MagicMock(return_value=HEALTHY))
+        self.assertIsNone(monitor.snapshot)
+        self.assertEqual(
+            {"elasticsearch": False, "index": False, "database": False},
+            monitor.readiness(),
+        )
+
+    def test_readiness(self):
+        check = MagicMock(return_value=HEALTHY)
+        monitor = HealthMonitor(check)
+        snapshot = monitor.refresh()
+        self.assertIsNone(snapshot["error"])
+        self.assertEqual(HEALTHY["index"], snapshot["index"])
+        self.assertEqual(
+            {"elasticsearch": True, "index": True, "database": True},
+            monitor.readiness(),
+        )
+        check.return_value = {
+            "index": {"status": "red", "index_exists": False},
+            "database": {"cities": 0},
+        }
+        monitor.refresh()
+        self.assertEqual(
+            {"elasticsearch": False, "index": False, "database": False},
+            monitor.readiness(),
+        )
+        check.return_value = {
+            "index": {"status": None, "index_exists": None},
+            "database": {"cities": 5570},
+        }
+        monitor.refresh()
+        self.assertEqual(
+            {"elasticsearch": False, "index": False, "database": True},
+            monitor.readiness(),
+        )
+
+    def test_failed_check(self):
+        monitor = HealthMonitor(MagicMock(side_effect=Exception("Database is down")))
+        with self.assertLogs(level="ERROR"):
+            snapshot = monitor.refresh()
+        self.assertEqual("Exception: Database is down", snapshot["error"])
+        self.assertFalse(any(monitor.readiness().values()))
+
+    def test_stale_snapshot_is_not_ready(self):
+        monitor = HealthMonitor(MagicMock(return_value=HEALTHY), interval=5)
+        snapshot = monitor.refresh()
+        self.assertTrue(all(monitor.readiness(snapshot["checked_at"] + 15).values()))
+        self.assertFalse(any(monitor.readiness(snapshot["checked_at"] + 16).values()))
+
+    def test_refresh_in_background(self):
+        check = MagicMock(return_value=HEALTHY)
+        monitor = HealthMonitor(check, interval=0.01)
+        monitor.start()
+        self.assertTrue(monitor.running)
+        deadline = time.monotonic() + 5
+        while check.call_count < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        monitor.stop()
+        self.assertFalse(monitor.running)
+        self.assertGreaterEqual(check.call_count, 3)
+        calls = check.call_count
+        time.sleep(0.05)
+        self.assertEqual(calls, check.call_count)
+
+    def test_gazette_access_health(self):
+        index = MagicMock()
+        index.get_health.return_value = {"status": "green", "index_exists": True}
+        database = MagicMock()
+        database.count_cities.return_value = 5570
+        self.assertEqual(HEALTHY, GazetteAccess(index, database).get_health())
+
+
+class HealthEndpointsTests(TestCase):
+    def create_interface(self, health=HEALTHY):
+        interface = MagicMock(spec=GazetteAccessInterface)
+        interface.get_health.return_value = health
+        return interface
+
+    def test_health_endpoint(self):
+        interface = self.create_interface()
+        interface.get_health.side_effect = Exception("Elasticsearch is down")
+        configure_api_app(interface)
+        response = TestClient(app).get("/health")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual({"status": "ok"}, response.json())
+        self.assertEqual("no-store", response.headers["Cache-Control"])
+        interface.get_health.assert_not_called()
+
+    def test_ready_endpoint_uses_the_snapshot(self):
+        interface = self.create_interface()
+        configure_api_app(interface, health_check_interval=60)
+        with TestClient(app) as client:
+            deadline = time.monotonic() + 5
+            while app.health.snapshot is None and time.monotonic() < deadline:
+                time.sleep(0.01)
+            for _ in range(5):
+                response = client.get("/ready")
+                self.assertEqual(200, response.status_code)
+        self.assertEqual(1, interface.get_health.call_count)
+        content = response.json()
+        self.assertEqual("ready", content["status"])
+        self.assertEqual(
+            {"elasticsearch": True, "index": True, "database": True, "warm_up": True},
+            content["checks"],
+        )
+        self.assertEqual(app.health.snapshot["checked_at"], content["checked_at"])
+        self.assertFalse(app.health.running)
+
+    def test_not_ready_without_the_index(self):
+        interface = self.create_interface(
+            {**HEALTHY, "index": {"status": "green", "index_exists": False}}
+        )
+        configure_api_app(interface)
+        app.health.refresh()
+        response = TestClient(app).get("/ready")
+        self.assertEqual(503, response.status_code)
+        self.assertEqual("not_ready", response.json()["status"])
+        self.assertFalse(response.json()["checks"]["index"])
+        self.assertTrue(response.json()["checks"]["elasticsearch"])
+
+    def test_not_ready_before_the_first_check(self):
+        configure_api_app(self.create_interface())
+        response = TestClient(app).get("/ready")
+        self.assertEqual(503, response.status_code)
+        self.assertIsNone(response.json()["checked_at"])
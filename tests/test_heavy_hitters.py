@@ -0,0 +1,103 @@
+from datetime import date
+from unittest import TestCase
+import random
+
+from monitoring import CountMinSketch, HeavyHitters, QueryStatistics
+from monitoring.heavy_hitters import canonical_query
+
+
+class CountMinSketchTests(TestCase):
+    def test_estimates_are_never_below_the_counts(self):
+        sketch = CountMinSketch(width=64, depth=4)
+        randomizer = random.Random(1)
+        counts = {}
+        for _ in range(5000):
+            item = f"item-{int(randomizer.paretovariate(1))}"
+            counts[item] = counts.get(item, 0) + 1
+            sketch.add(item)
+        self.assertEqual(5000, sketch.total)
+        within_bound = 0
+        for item, count in counts.items():
+            self.assertGreaterEqual(sketch.estimate(item), count)
+            within_bound += sketch.estimate(item) <= count + sketch.error_bound
+        # The bound holds with probability 1 - e ** -4 for each item
+        self.assertGreaterEqual(within_bound / len(counts), 0.95)
+        self.assertEqual(0, CountMinSketch().estimate("missing"))
+
+    def test_add_returns_the_estimate(self):
+        sketch = CountMinSketch()
+        self.assertEqual(1, sketch.add("a"))
+        self.assertEqual(4, sketch.add("a", 3))
+        self.assertEqual(4, sketch.estimate("a"))
+
+    def test_invalid_size(self):
+        with self.assertRaises(Exception):
+            CountMinSketch(width=0)
+        with self.assertRaises(Exception):
+            HeavyHitters(capacity=0)
+
+
+class HeavyHittersTests(TestCase):
+    def test_keep_the_most_frequent_items(self):
+        heavy_hitters = HeavyHitters(capacity=3)
+        randomizer = random.Random(2)
+        items = ["a"] * 50 + ["b"] * 30 + ["c"] * 20
+        items += [f"rare-{number}" for number in range(200)]
+        randomizer.shuffle(items)
+        for item in items:
+            heavy_hitters.add(item)
+        self.assertEqual([("a", 50), ("b", 30), ("c", 20)], heavy_hitters.top())
+        self.assertEqual([("a", 50)], heavy_hitters.top(1))
+        self.assertEqual(300, heavy_hitters.total)
+
+    def test_late_heavy_hitter_replaces_the_least_frequent(self):
+        heavy_hitters = HeavyHitters(capacity=2)
+        for item in ["a", "a", "a", "b", "c"]:
+            heavy_hitters.add(item)
+        for _ in range(5):
+            heavy_hitters.add("d")
+        self.assertEqual(["d", "a"], [item for item, _ in heavy_hitters.top()])
+
+
+class QueryStatisticsTests(TestCase):
+    def test_record(self):
+        statistics = QueryStatistics()
+        request = {
+            "territory_id": "4205902",
+            "since": date(2021, 1, 1),
+            "keywords": ["Saúde ", "decreto"],
+        }
+        statistics.record(request)
+        statistics.record(dict(request))
+        statistics.record({"territory_id": None, "keywords": ["saúde"]})
+        self.assertEqual(
+            [
+                (
+                    {
+                        "territory_id": "4205902",
+                        "since": "2021-01-01",
+                        "keywords": ["Saúde ", "decreto"],
+                    },
+                    2,
+                ),
+                ({"territory_id": None, "keywords": ["saúde"]}, 1),
+            ],
+            statistics.top_queries(),
+        )
+        self.assertEqual([("4205902", 2)], statistics.territories.top())
+        self.assertEqual([("saúde", 3), ("decreto", 2)], statistics.keywords.top())
+        report = statistics.report(limit=1)
+        self.assertEqual(3, report["queries"]["total"])
+        self.assertEqual(1, len(report["queries"]["items"]))
+        self.assertEqual(
+            [{"keyword": "saúde", "count": 3}], report["keywords"]["items"]
+        )
+        self.assertEqual(
+            [{"territory_id": "4205902", "count": 2}], report["territories"]["items"]
+        )
+
+    def test_canonical_query(self):
+        self.assertEqual(
+            canonical_query({"size": 10, "since": date(2021, 1, 1)}),
+            canonical_query({"since": date(2021, 1, 1), "size": 10}),
+        )
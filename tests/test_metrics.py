@@ -0,0 +1,246 @@
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from gazettes import GazetteAccessInterface
+from monitoring import Counter, Gauge, Histogram, Registry, render
+from monitoring.middleware import REQUEST_DURATION, REQUESTS_IN_FLIGHT
+from monitoring.profiling import (
+    SamplingProfiler,
+    elasticsearch_profiles,
+    profile_elasticsearch,
+    record_elasticsearch_profile,
+    start_elasticsearch_profiling,
+    stop_elasticsearch_profiling,
+)
+from monitoring.timing import (
+    collected_timings,
+    header_value,
+    record_timing,
+    start_collecting,
+    stop_collecting,
+    timed,
+)
+
+
+class MetricsTests(TestCase):
+    def create_registry(self, *metrics):
+        registry = Registry()
+        for metric in metrics:
+            registry.register(metric)
+        return registry
+
+    def test_counter(self):
+        requests = Counter("requests", "Requests", ("status",))
+        requests.labels(200).inc()
+        requests.labels("200").inc(2)
+        requests.labels(404).inc()
+        self.assertEqual(3, requests.labels(200).value)
+        self.assertEqual(
+            "# HELP requests Requests\n"
+            "# TYPE requests counter\n"
+            'requests_total{status="200"} 3\n'
+            'requests_total{status="404"} 1\n',
+            render(self.create_registry(requests)),
+        )
+
+    def test_counter_requires_labels(self):
+        requests = Counter("requests", "Requests", ("status",))
+        with self.assertRaises(Exception):
+            requests.inc()
+        with self.assertRaises(Exception):
+            requests.labels(200, "GET")
+
+    def test_gauge(self):
+        in_flight = Gauge("in_flight", "In flight")
+        in_flight.inc()
+        in_flight.inc()
+        in_flight.dec()
+        size = Gauge("size", "Size")
+        size.set_function(lambda: 42)
+        self.assertEqual(
+            "# HELP in_flight In flight\n"
+            "# TYPE in_flight gauge\n"
+            "in_flight 1\n"
+            "# HELP size Size\n"
+            "# TYPE size gauge\n"
+            "size 42\n",
+            render(self.create_registry(in_flight, size)),
+        )
+
+    def test_histogram(self):
+        latency = Histogram("latency", "Latency", buckets=(0.1, 1))
+        latency.observe(0.05)
+        latency.observe(0.1)
+        latency.observe(0.5)
+        latency.observe(2)
+        self.assertEqual(
+            "# HELP latency Latency\n"
+            "# TYPE latency histogram\n"
+            'latency_bucket{le="0.1"} 2\n'
+            'latency_bucket{le="1"} 3\n'
+            'latency_bucket{le="+Inf"} 4\n'
+            "latency_sum 2.65\n"
+            "latency_count 4\n",
+            render(self.create_registry(latency)),
+        )
+
+    def test_values_recorded_by_all_threads(self):
+        requests = Counter("requests", "Requests")
+        latency = Histogram("latency", "Latency", buckets=(1,))
+
+        def record():
+            for _ in range(1000):
+                requests.inc()
+                latency.observe(0.5)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        record()
+        self.assertEqual(5000, requests.default_child().value)
+        self.assertEqual(5000, latency.default_child().count)
+
+    def test_escape_label_values(self):
+        requests = Counter("requests", "Requests", ("path",))
+        requests.labels('a"b\\c\n').inc()
+        self.assertIn(
+            'requests_total{path="a\\"b\\\\c\\n"} 1',
+            render(self.create_registry(requests)),
+        )
+
+    def test_register_metric_once(self):
+        registry = self.create_registry(Counter("requests", "Requests"))
+        with self.assertRaises(Exception):
+            registry.register(Counter("requests", "Requests"))
+
+
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        interface = MagicMock(spec=GazetteAccessInterface)
+        interface.get_gazettes.return_value = (0, [])
+        interface.get_gazettes_version.return_value = None
+        interface.get_cities_last_modified.return_value = None
+        configure_api_app(interface)
+        self.client = TestClient(app)
+
+    def test_metrics_endpoint(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.headers["Content-Type"].startswith("text/plain"))
+        self.assertIn(
+            "# TYPE querido_diario_http_request_duration_seconds histogram",
+            response.text,
+        )
+        self.assertIn("querido_diario_response_cache_hit_ratio", response.text)
+
+    def test_record_requests_by_route_template(self):
+        latency = REQUEST_DURATION.labels("GET", "/gazettes/{territory_id}", 200)
+        count = latency.count
+        self.client.get("/gazettes/4205902")
+        self.client.get("/gazettes/3304557")
+        self.assertEqual(count + 2, latency.count)
+        not_found = REQUEST_DURATION.labels("GET", "unmatched", 404)
+        count = not_found.count
+        self.client.get("/does/not/exist")
+        self.assertEqual(count + 1, not_found.count)
+        self.assertEqual(0, REQUESTS_IN_FLIGHT.default_child().value)
+        self.assertIn(
+            'querido_diario_http_request_duration_seconds_count{method="GET",route="/gazettes/{territory_id}",status="200"}',
+            self.client.get("/metrics").text,
+        )
+
+
+class ServerTimingTests(TestCase):
+    def test_nothing_is_recorded_without_collector(self):
+        record_timing("search", 0.1)
+        with timed("search"):
+            pass
+        self.assertIsNone(collected_timings())
+
+    def test_record_timings(self):
+        token = start_collecting()
+        try:
+            record_timing("es", 0.0123, "Elasticsearch")
+            with timed("decode"):
+                pass
+            timings = collected_timings()
+        finally:
+            stop_collecting(token)
+        self.assertIsNone(collected_timings())
+        self.assertEqual(["es", "decode"], [name for name, _, _ in timings])
+        self.assertTrue(
+            header_value(timings).startswith('es;dur=12.30;desc="Elasticsearch", ')
+        )
+
+    def test_escape_description(self):
+        self.assertEqual(
+            'a;dur=1.00;desc="say \\"hi\\""', header_value([("a", 0.001, 'say "hi"')]),
+        )
+
+    def create_client(self, server_timing, gazettes=(0, [])):
+        interface = MagicMock(spec=GazetteAccessInterface)
+        interface.get_gazettes.return_value = gazettes
+        interface.get_gazettes_version.return_value = "1-2021-01-01"
+        interface.get_cities_last_modified.return_value = None
+        configure_api_app(interface, server_timing=server_timing)
+        return TestClient(app)
+
+    def test_server_timing_header(self):
+        client = self.create_client(True)
+        response = client.get("/gazettes/4205902")
+        server_timing = response.headers["Server-Timing"]
+        for phase in ["cache;", "serialize;", "search;", "total;"]:
+            self.assertIn(phase, server_timing)
+        self.assertIn('cache;dur=0.00;desc="miss"', server_timing)
+        response = client.get("/gazettes/4205902")
+        self.assertIn('cache;dur=0.00;desc="hit"', response.headers["Server-Timing"])
+        self.assertNotIn("serialize;", response.headers["Server-Timing"])
+
+    def test_server_timing_is_disabled_by_default(self):
+        client = self.create_client(False)
+        response = client.get("/gazettes/4205902")
+        self.assertNotIn("Server-Timing", response.headers)
+
+
+def busy_loop(seconds):
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        pass
+
+
+class ProfilingTests(TestCase):
+    def test_sampling_profiler(self):
+        with SamplingProfiler(interval=0.001) as profiler:
+            busy_loop(0.1)
+        result = profiler.result(limit=5)
+        self.assertGreater(result["samples"], 0)
+        self.assertGreaterEqual(result["duration_ms"], 100)
+        self.assertLessEqual(len(result["functions"]), 5)
+        busy = [
+            function
+            for function in result["functions"]
+            if function["function"].startswith("busy_loop ")
+        ]
+        self.assertEqual(1, len(busy))
+        self.assertGreater(busy[0]["self"], 0)
+        self.assertIn("busy_loop", result["stacks"][0]["stack"])
+
+    def test_elasticsearch_profiles(self):
+        self.assertFalse(profile_elasticsearch())
+        record_elasticsearch_profile({"shards": []})
+        self.assertEqual([], elasticsearch_profiles())
+        token = start_elasticsearch_profiling()
+        try:
+            self.assertTrue(profile_elasticsearch())
+            record_elasticsearch_profile({"shards": []})
+            self.assertEqual([{"shards": []}], elasticsearch_profiles())
+        finally:
+            stop_elasticsearch_profiling(token)
+        self.assertFalse(profile_elasticsearch())
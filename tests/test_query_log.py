@@ -0,0 +1,104 @@
+from datetime import date
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+import glob
+import os
+
+from index import ElasticSearchDataMapper, QueryLog, create_query_log, read_query_log
+from index.query_log import anonymize_keyword
+
+
+class AnonymizationTest(TestCase):
+    def test_personal_documents_are_masked_keeping_the_shape(self):
+        self.assertEqual("000.000.000-00", anonymize_keyword("123.456.789-10"))
+        self.assertEqual("00000000000", anonymize_keyword("12345678910"))
+        self.assertEqual(
+            "empresa 00.000.000/0000-00",
+            anonymize_keyword("empresa 12.345.678/0001-90"),
+        )
+
+    def test_emails_are_masked(self):
+        self.assertEqual(
+            "contato user@example.com", anonymize_keyword("contato fulano@gmail.com")
+        )
+
+    def test_other_keywords_are_kept(self):
+        self.assertEqual("lei 8666", anonymize_keyword("lei 8666"))
+        self.assertEqual("licitação", anonymize_keyword("licitação"))
+
+
+class QueryLogTest(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.log_file = os.path.join(self.directory.name, "queries.ndjson")
+
+    def test_create_query_log_without_file_name(self):
+        self.assertIsNone(create_query_log(""))
+        self.assertIsNone(create_query_log(None))
+        self.assertIsInstance(create_query_log(self.log_file), QueryLog)
+
+    def test_record_entries(self):
+        query_log = QueryLog(self.log_file)
+        self.addCleanup(query_log.close)
+        query_log.record(
+            {"territory_id": "1234", "since": date(2020, 10, 1)},
+            {"query": {"match_none": {}}},
+            0.0125,
+            4,
+            10,
+        )
+        entries = list(read_query_log(self.log_file))
+        self.assertEqual(1, len(entries))
+        self.assertEqual(
+            {"territory_id": "1234", "since": "2020-10-01"}, entries[0]["request"]
+        )
+        self.assertEqual({"query": {"match_none": {}}}, entries[0]["query"])
+        self.assertEqual(12.5, entries[0]["elapsed_ms"])
+        self.assertEqual(4, entries[0]["took"])
+        self.assertEqual(10, entries[0]["total"])
+        self.assertIn("timestamp", entries[0])
+
+    def test_log_rotation(self):
+        query_log = QueryLog(self.log_file, max_bytes=500, backup_count=2)
+        self.addCleanup(query_log.close)
+        for _ in range(20):
+            query_log.record({"territory_id": "1234"}, {}, 0.01)
+        self.assertEqual(3, len(glob.glob(f"{self.log_file}*")))
+
+
+class ElasticSearchQueryLogTest(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.query_log = QueryLog(os.path.join(self.directory.name, "queries.ndjson"))
+        self.addCleanup(self.query_log.close)
+        patcher = patch("elasticsearch.Elasticsearch")
+        self.addCleanup(patcher.stop)
+        es_mock = patcher.start()
+        self.mapper = ElasticSearchDataMapper("localhost", "gazettes", self.query_log)
+        self.mapper._es.search.return_value = {
+            "took": 7,
+            "hits": {"total": {"value": 0, "relation": "eq"}, "hits": []},
+        }
+
+    def test_searches_are_recorded_anonymized(self):
+        self.mapper.get_gazettes(territory_id="1234", keywords=["123.456.789-10"])
+        entries = list(read_query_log(self.query_log.file_name))
+        self.assertEqual(1, len(entries))
+        self.assertEqual("1234", entries[0]["request"]["territory_id"])
+        self.assertEqual(["000.000.000-00"], entries[0]["request"]["keywords"])
+        self.assertEqual(
+            self.mapper.build_query(territory_id="1234", keywords=["000.000.000-00"]),
+            entries[0]["query"],
+        )
+        self.assertEqual(7, entries[0]["took"])
+        self.assertEqual(0, entries[0]["total"])
+
+    def test_searches_are_not_recorded_without_query_log(self):
+        with patch("elasticsearch.Elasticsearch"):
+            mapper = ElasticSearchDataMapper("localhost", "gazettes")
+        mapper._es.search.return_value = self.mapper._es.search.return_value
+        mapper.get_gazettes(territory_id="1234")
+        self.assertEqual([], list(read_query_log(self.query_log.file_name)))
@@ -0,0 +1,137 @@
+from datetime import date
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+import os
+
+from index import (
+    ElasticSearchDataMapper,
+    SlowQueryLog,
+    create_slow_query_log,
+    read_query_log,
+)
+from index.slow_log import TokenBucket
+
+
+class TokenBucketTest(TestCase):
+    def test_burst(self):
+        bucket = TokenBucket(0, 3)
+        self.assertEqual([True, True, True, False], [bucket.take() for _ in range(4)])
+
+    def test_refill(self):
+        with patch("time.monotonic", return_value=100.0):
+            bucket = TokenBucket(2, 1)
+            self.assertTrue(bucket.take())
+            self.assertFalse(bucket.take())
+        with patch("time.monotonic", return_value=100.5):
+            self.assertTrue(bucket.take())
+            self.assertFalse(bucket.take())
+        with patch("time.monotonic", return_value=200.0):
+            self.assertTrue(bucket.take())
+            self.assertFalse(bucket.take())
+
+
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.log_file = os.path.join(self.directory.name, "slow.ndjson")
+        self.response = {
+            "took": 900,
+            "hits": {"total": {"value": 3, "relation": "eq"}, "hits": []},
+        }
+
+    def create_log(self, **kwargs):
+        slow_log = SlowQueryLog(self.log_file, **kwargs)
+        self.addCleanup(slow_log.close)
+        return slow_log
+
+    def test_create_slow_query_log_without_file_name(self):
+        self.assertIsNone(create_slow_query_log(""))
+        self.assertIsNone(create_slow_query_log(None))
+        slow_log = create_slow_query_log(self.log_file, 250)
+        self.addCleanup(slow_log.close)
+        self.assertEqual(250, slow_log.threshold_ms)
+
+    def test_record_slow_queries(self):
+        slow_log = self.create_log(threshold_ms=500)
+        self.assertFalse(
+            slow_log.record({"territory_id": "1234"}, {}, 0.499, self.response, 3)
+        )
+        self.assertTrue(
+            slow_log.record(
+                {"territory_id": "1234", "since": date(2020, 10, 1)},
+                {"query": {"match_none": {}}},
+                0.95,
+                self.response,
+                3,
+            )
+        )
+        entries = list(read_query_log(self.log_file))
+        self.assertEqual(1, len(entries))
+        self.assertEqual(
+            {"territory_id": "1234", "since": "2020-10-01"}, entries[0]["request"]
+        )
+        self.assertEqual({"query": {"match_none": {}}}, entries[0]["query"])
+        self.assertEqual(950, entries[0]["elapsed_ms"])
+        self.assertEqual(900, entries[0]["took"])
+        self.assertEqual(3, entries[0]["total"])
+        self.assertGreater(entries[0]["response_bytes"], 0)
+        self.assertEqual(0, entries[0]["suppressed"])
+
+    def test_rate_limit(self):
+        slow_log = self.create_log(threshold_ms=0, rate=0, burst=2)
+        for _ in range(5):
+            slow_log.record({}, {}, 1, self.response)
+        self.assertEqual(2, len(list(read_query_log(self.log_file))))
+        slow_log._bucket.rate = 1000
+        slow_log._bucket._tokens = 1
+        slow_log.record({}, {}, 1, self.response)
+        entries = list(read_query_log(self.log_file))
+        self.assertEqual(3, len(entries))
+        self.assertEqual(3, entries[-1]["suppressed"])
+
+
+class ElasticSearchSlowQueryLogTest(TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.slow_log = SlowQueryLog(
+            os.path.join(self.directory.name, "slow.ndjson"), threshold_ms=0
+        )
+        self.addCleanup(self.slow_log.close)
+        patcher = patch("elasticsearch.Elasticsearch")
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self.mapper = ElasticSearchDataMapper(
+            "localhost", "gazettes", slow_query_log=self.slow_log
+        )
+        self.mapper._es.search.return_value = {
+            "took": 7,
+            "hits": {"total": {"value": 0, "relation": "eq"}, "hits": []},
+        }
+
+    def test_slow_searches_are_recorded_with_the_query(self):
+        self.mapper.get_gazettes(territory_id="1234", keywords=["licitação"])
+        entries = list(read_query_log(self.slow_log.file_name))
+        self.assertEqual(1, len(entries))
+        self.assertEqual(["licitação"], entries[0]["request"]["keywords"])
+        self.assertEqual(
+            self.mapper.build_query(territory_id="1234", keywords=["licitação"]),
+            entries[0]["query"],
+        )
+        self.assertEqual(7, entries[0]["took"])
+        self.assertEqual(0, entries[0]["total"])
+
+    def test_slow_searches_are_recorded_anonymized(self):
+        self.mapper.get_gazettes(keywords=["123.456.789-10"])
+        entries = list(read_query_log(self.slow_log.file_name))
+        self.assertEqual(["000.000.000-00"], entries[0]["request"]["keywords"])
+        self.assertEqual(
+            self.mapper.build_query(keywords=["000.000.000-00"]), entries[0]["query"]
+        )
+
+    def test_fast_searches_are_not_recorded(self):
+        self.slow_log.threshold_ms = 60_000
+        self.mapper.get_gazettes(territory_id="1234")
+        self.assertEqual([], list(read_query_log(self.slow_log.file_name)))
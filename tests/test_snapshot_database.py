@@ -0,0 +1,124 @@
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from unittest import TestCase
+from unittest.mock import patch
+import csv
+import os
+from datetime import datetime, timezone
+
+from database import create_database_interface
+from database.csv import CSVDatabase
+from database.snapshot import SnapshotDatabase, compile_snapshot
+from gazettes import City, OpennessLevel
+
+
+class SnapshotDatabaseTests(TestCase):
+    def setUp(self):
+        self.cities = [
+            ("Piraporinha", "1234", "SC", "2", "https://somewebsite.org"),
+            (
+                "Taquarinha Do Norte",
+                "1235",
+                "RN",
+                "1",
+                "https://somewebsite.org,https://anotherwebsite.org",
+            ),
+            ("Taquarinha Do Sul", "1236", "RS", "3", ""),
+            ("São Paulo", "3550308", "SP", "3", "https://somewebsite.org"),
+            ("Embu-Guaçu", "3515103", "SP", "0", ""),
+        ]
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.database_file = os.path.join(directory.name, "censo.csv")
+        self.snapshot_file = os.path.join(directory.name, "censo.snapshot")
+        with open(self.database_file, "w", newline="") as database_file:
+            writer = csv.writer(database_file)
+            writer.writerow(
+                ["city_name", "ibge_id", "uf", "openness_level", "gazettes_urls"]
+            )
+            writer.writerows(self.cities)
+        compile_snapshot(self.database_file, self.snapshot_file)
+        self.database = SnapshotDatabase(self.snapshot_file)
+        self.addCleanup(self.database.close)
+
+    def create_csv_database(self):
+        with patch.dict(
+            os.environ, {"QUERIDO_DIARIO_DATABASE_CSV": self.database_file}
+        ):
+            database = CSVDatabase(0)
+        self.addCleanup(database.close)
+        return database
+
+    def test_get_city(self):
+        self.assertEqual(
+            City(
+                "Taquarinha Do Norte",
+                "1235",
+                "RN",
+                OpennessLevel.ONE,
+                ["https://somewebsite.org", "https://anotherwebsite.org"],
+            ),
+            self.database.get_city("1235"),
+        )
+        self.assertIsNone(self.database.get_city("1236").publication_urls)
+        self.assertIsNone(self.database.get_city("9999"))
+        self.assertIsNone(self.database.get_city("0"))
+
+    def test_count_cities(self):
+        self.assertEqual(len(self.cities), self.database.count_cities())
+
+    def test_get_cities_by_ids(self):
+        self.assertEqual(
+            ["3550308", "1234"],
+            [
+                city.territory_id
+                for city in self.database.get_cities_by_ids(
+                    ["3550308", "9999", "1234", "3550308"]
+                )
+            ],
+        )
+
+    def test_same_results_as_csv_database(self):
+        csv_database = self.create_csv_database()
+        for name in ("", "taquarinha", "sao paulo", "SÃO", "embu guacu", "piraporina"):
+            self.assertEqual(
+                csv_database.get_cities(name), self.database.get_cities(name), name
+            )
+        self.assertEqual(
+            csv_database.get_cities("taquarinha", limit=1),
+            self.database.get_cities("taquarinha", limit=1),
+        )
+        for prefix in ("t", "sp", "guacu", "sao p", "x"):
+            self.assertEqual(
+                csv_database.suggest_cities(prefix),
+                self.database.suggest_cities(prefix),
+                prefix,
+            )
+
+    def test_invalid_snapshot_file(self):
+        with NamedTemporaryFile() as snapshot_file:
+            snapshot_file.write(b"city_name,ibge_id\n" * 10)
+            snapshot_file.flush()
+            with self.assertRaises(Exception):
+                SnapshotDatabase(snapshot_file.name)
+        with self.assertRaises(Exception):
+            SnapshotDatabase("/path/does/not/exists")
+
+    def test_create_database_interface_from_envvar(self):
+        with patch.dict(
+            os.environ,
+            {
+                "QUERIDO_DIARIO_DATABASE_CSV": self.database_file,
+                "QUERIDO_DIARIO_DATABASE_SNAPSHOT": self.snapshot_file,
+            },
+        ):
+            database = create_database_interface()
+        self.addCleanup(database.close)
+        self.assertIsInstance(database, SnapshotDatabase)
+
+    def test_last_modified(self):
+        os.utime(self.snapshot_file, (0, 1609459200))
+        database = SnapshotDatabase(self.snapshot_file)
+        self.addCleanup(database.close)
+        self.assertEqual(
+            datetime(2021, 1, 1, tzinfo=timezone.utc), database.get_last_modified()
+        )
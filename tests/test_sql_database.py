@@ -0,0 +1,115 @@
+from datetime import timezone
+from unittest import TestCase
+from unittest.mock import patch
+
+from database import create_database_interface
+from database.sql import SQLDatabase, create_schema, create_sql_engine
+from gazettes import City, OpennessLevel
+
+
+class SQLDatabaseTests(TestCase):
+    def setUp(self):
+        self.engine = create_sql_engine("sqlite://")
+        create_schema(self.engine)
+        self.database = SQLDatabase(engine=self.engine)
+        self.addCleanup(self.database.close)
+        self.cities = [
+            City("Piraporinha", "1234", "SC", OpennessLevel("2"), ["https://a.org"]),
+            City(
+                "Taquarinha Do Norte",
+                "1235",
+                "RN",
+                OpennessLevel("1"),
+                ["https://a.org", "https://b.org"],
+            ),
+            City("Taquarinha Do Sul", "1236", "RS", OpennessLevel("3"), None),
+            City("Nova Taquarinha", "1237", "PR", OpennessLevel("0"), None),
+            City("São Paulo", "3550308", "SP", OpennessLevel("3"), ["https://a.org"]),
+        ]
+        self.database.save_cities(self.cities)
+
+    def names(self, cities):
+        return [city.territory_name for city in cities]
+
+    def test_count_cities(self):
+        self.assertEqual(len(self.cities), self.database.count_cities())
+
+    def test_get_cities_ignoring_accents_and_case(self):
+        self.assertEqual(["São Paulo"], self.names(self.database.get_cities("SAO")))
+        self.assertEqual(
+            ["São Paulo"], self.names(self.database.get_cities("são paulo"))
+        )
+        self.assertEqual([], self.database.get_cities("recife"))
+
+    def test_get_cities_ranked(self):
+        self.assertEqual(
+            ["Taquarinha Do Sul", "Taquarinha Do Norte", "Nova Taquarinha"],
+            self.names(self.database.get_cities("taquarinha")),
+        )
+        self.assertEqual(
+            ["Taquarinha Do Sul"],
+            self.names(self.database.get_cities("taquarinha", limit=1)),
+        )
+        self.assertEqual(5, len(self.database.get_cities("")))
+
+    def test_suggest_cities(self):
+        self.assertEqual(
+            ["Taquarinha Do Sul", "Taquarinha Do Norte", "Nova Taquarinha"],
+            self.names(self.database.suggest_cities("taqua")),
+        )
+        self.assertEqual(
+            ["Taquarinha Do Sul"],
+            self.names(self.database.suggest_cities("r", limit=1)),
+        )
+        self.assertEqual(["São Paulo"], self.names(self.database.suggest_cities("sp")))
+        self.assertEqual([], self.database.suggest_cities(""))
+
+    def test_suggest_cities_weight(self):
+        database = SQLDatabase(engine=self.engine, suggestion_weight="publication_urls")
+        self.assertEqual(
+            ["Taquarinha Do Norte", "Taquarinha Do Sul"],
+            self.names(database.suggest_cities("taquarinha d")),
+        )
+        with self.assertRaises(Exception):
+            SQLDatabase(engine=self.engine, suggestion_weight="population")
+
+    def test_get_city(self):
+        self.assertEqual(self.cities[1], self.database.get_city("1235"))
+        self.assertIsNone(self.database.get_city("1236").publication_urls)
+        self.assertIsNone(self.database.get_city("9999"))
+
+    def test_get_cities_by_ids(self):
+        self.assertEqual(
+            [self.cities[4], self.cities[0]],
+            self.database.get_cities_by_ids(["3550308", "9999", "1234", "3550308"]),
+        )
+        self.assertEqual([], self.database.get_cities_by_ids([]))
+
+    def test_save_cities_updates_existing_cities(self):
+        self.database.save_cities(
+            [City("Piraporinha Nova", "1234", "SC", OpennessLevel("3"), None)]
+        )
+        self.assertEqual(
+            City("Piraporinha Nova", "1234", "SC", OpennessLevel("3"), None),
+            self.database.get_city("1234"),
+        )
+        self.assertEqual(5, len(self.database.get_cities("")))
+
+    def test_missing_database_url(self):
+        with self.assertRaises(Exception):
+            SQLDatabase("")
+
+    def test_create_database_interface_with_database_url(self):
+        database = create_database_interface("sqlite://")
+        self.addCleanup(database.close)
+        self.assertIsInstance(database, SQLDatabase)
+
+    def test_last_modified(self):
+        last_modified = self.database.get_last_modified()
+        self.assertEqual(timezone.utc, last_modified.tzinfo)
+        self.database.save_cities(self.cities[:1])
+        self.assertGreaterEqual(self.database.get_last_modified(), last_modified)
+        database = SQLDatabase(engine=self.engine)
+        with self.engine.begin() as connection:
+            connection.execute("DELETE FROM cities")
+        self.assertIsNone(database.get_last_modified())
@@ -0,0 +1,223 @@
+from datetime import date
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+import json
+import os
+import tempfile
+
+from elasticsearch.connection import Urllib3HttpConnection
+from fastapi.testclient import TestClient
+import elasticsearch
+
+from api import app, configure_api_app
+from fake_elasticsearch import FakeElasticsearch, FakeElasticsearchServer
+from gazettes import GazetteAccess, GazetteAccessInterface
+from index import create_elasticsearch_data_mapper
+from monitoring import (
+    FileExporter,
+    InMemoryExporter,
+    Tracer,
+    configure_tracing,
+    create_span_exporter,
+    current_span,
+    set_span_attribute,
+    span,
+)
+from monitoring.tracing import parse_traceparent
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+class TracingTestCase(TestCase):
+    def setUp(self):
+        self.exporter = InMemoryExporter()
+        configure_tracing(self.exporter)
+        self.addCleanup(configure_tracing, None)
+
+    def spans(self, name):
+        return [span for span in self.exporter.spans if span.name == name]
+
+
+class SpanTests(TracingTestCase):
+    def test_parse_traceparent(self):
+        self.assertEqual(
+            ("0af7651916cd43dd8448eb211c80319c", "b7ad6b7169203331"),
+            parse_traceparent(TRACEPARENT),
+        )
+        invalid = [
+            None,
+            "",
+            "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331",
+            "ff-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01",
+            "00-00000000000000000000000000000000-b7ad6b7169203331-01",
+            "00-0af7651916cd43dd8448eb211c80319c-0000000000000000-01",
+            "00-0af7651916cd43dd8448eb211c80319g-b7ad6b7169203331-01",
+        ]
+        for traceparent in invalid:
+            self.assertIsNone(parse_traceparent(traceparent), traceparent)
+
+    def test_nested_spans(self):
+        with span("parent", {"key": "value"}) as parent:
+            self.assertIs(parent, current_span())
+            with span("child") as child:
+                set_span_attribute("items", 10)
+            self.assertIs(parent, current_span())
+        self.assertIsNone(current_span())
+        self.assertEqual([child, parent], self.exporter.spans)
+        self.assertEqual(parent.trace_id, child.trace_id)
+        self.assertEqual(parent.span_id, child.parent_id)
+        self.assertIsNone(parent.parent_id)
+        self.assertEqual(32, len(parent.trace_id))
+        self.assertEqual(16, len(parent.span_id))
+        self.assertEqual({"key": "value"}, parent.attributes)
+        self.assertEqual({"items": 10}, child.attributes)
+        self.assertGreaterEqual(parent.duration, child.duration)
+        self.assertEqual(
+            f"00-{parent.trace_id}-{parent.span_id}-01", parent.traceparent
+        )
+
+    def test_span_as_decorator(self):
+        @span("decorated")
+        def decorated():
+            return current_span()
+
+        first, second = decorated(), decorated()
+        self.assertEqual([first, second], self.exporter.spans)
+        self.assertNotEqual(first.trace_id, second.trace_id)
+
+    def test_remote_parent(self):
+        with Tracer(self.exporter).span("server", traceparent=TRACEPARENT) as server:
+            pass
+        self.assertEqual("0af7651916cd43dd8448eb211c80319c", server.trace_id)
+        self.assertEqual("b7ad6b7169203331", server.parent_id)
+
+    def test_error_status(self):
+        with self.assertRaises(ValueError):
+            with span("failure"):
+                raise ValueError()
+        (failure,) = self.exporter.spans
+        self.assertEqual("error", failure.status)
+        self.assertEqual("ValueError", failure.attributes["exception.type"])
+
+    def test_nothing_is_recorded_without_exporter(self):
+        configure_tracing(None)
+        with span("disabled") as disabled:
+            set_span_attribute("items", 10)
+            self.assertIsNone(current_span())
+        self.assertIsNone(disabled)
+        self.assertEqual([], self.exporter.spans)
+
+    def test_file_exporter(self):
+        self.assertIsNone(create_span_exporter(""))
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "spans.ndjson")
+            exporter = create_span_exporter(f" {file_name} ")
+            self.assertIsInstance(exporter, FileExporter)
+            configure_tracing(exporter)
+            with span("parent") as parent:
+                with span("child", {"day": date(2021, 1, 1)}):
+                    pass
+            configure_tracing(None)
+            with open(file_name) as spans_file:
+                child, exported_parent = [json.loads(line) for line in spans_file]
+        self.assertEqual("child", child["name"])
+        self.assertEqual(parent.span_id, child["parent_span_id"])
+        self.assertEqual({"day": "2021-01-01"}, child["attributes"])
+        self.assertEqual(parent.as_dict(), exported_parent)
+        self.assertGreaterEqual(
+            exported_parent["end_time_unix_nano"],
+            exported_parent["start_time_unix_nano"],
+        )
+
+
+class ApiTracingTests(TracingTestCase):
+    def create_client(self):
+        interface = MagicMock(spec=GazetteAccessInterface)
+        interface.get_gazettes.return_value = (0, [])
+        interface.get_gazettes_version.return_value = "1-2021-01-01"
+        configure_api_app(interface)
+        return TestClient(app)
+
+    def test_request_spans(self):
+        client = self.create_client()
+        response = client.get("/gazettes/4205902", headers={"traceparent": TRACEPARENT})
+        self.assertEqual(200, response.status_code)
+        (server,) = self.spans("GET /gazettes/{territory_id}")
+        (search,) = self.spans("api.trigger_gazettes_search")
+        self.assertEqual("server", server.kind)
+        self.assertEqual("0af7651916cd43dd8448eb211c80319c", server.trace_id)
+        self.assertEqual("b7ad6b7169203331", server.parent_id)
+        self.assertEqual(200, server.attributes["http.status_code"])
+        self.assertEqual(server.span_id, search.parent_id)
+        self.assertEqual("miss", search.attributes["response_cache"])
+
+    def test_no_spans_without_exporter(self):
+        configure_tracing(None)
+        self.create_client().get("/gazettes/4205902")
+        self.assertEqual([], self.exporter.spans)
+
+
+class ElasticsearchTracingTests(TracingTestCase):
+
+    INDEX = "gazettes"
+
+    def setUp(self):
+        super().setUp()
+        self.fake = FakeElasticsearch()
+        self.fake.create_index(self.INDEX)
+        self.server = FakeElasticsearchServer(elasticsearch=self.fake).start()
+        self.addCleanup(self.server.stop)
+        self.mapper = create_elasticsearch_data_mapper(self.server.url, self.INDEX)
+        self.addCleanup(self.mapper._es.close)
+        self.exporter.clear()
+
+    def test_trace_context_is_sent_to_elasticsearch(self):
+        interface = GazetteAccess(self.mapper, MagicMock())
+        perform_request = Urllib3HttpConnection.perform_request
+        with patch.object(
+            Urllib3HttpConnection,
+            "perform_request",
+            autospec=True,
+            side_effect=perform_request,
+        ) as perform_request_mock:
+            with span("request"):
+                interface.get_gazettes()
+        headers = perform_request_mock.call_args.args[-1]
+        (request,) = self.spans("elasticsearch.request")
+        (index,) = self.spans("index.get_gazettes")
+        (gazettes,) = self.spans("gazettes.get_gazettes")
+        self.assertEqual(request.traceparent, headers["traceparent"])
+        self.assertEqual(request.trace_id, headers["x-opaque-id"])
+        self.assertEqual(index.span_id, request.parent_id)
+        self.assertEqual(gazettes.span_id, index.parent_id)
+        self.assertEqual(self.server.url, request.attributes["net.peer.name"])
+        self.assertEqual(200, request.attributes["http.status_code"])
+        self.assertEqual(0, index.attributes["gazettes.total"])
+
+    def test_span_for_each_attempt(self):
+        self.fake.faults.error_rate = 1
+        with self.assertRaises(elasticsearch.TransportError):
+            self.mapper.get_gazettes(territory_id="4205902")
+        attempts = self.spans("elasticsearch.request")
+        (index,) = self.spans("index.get_gazettes")
+        self.assertEqual(4, len(attempts))
+        self.assertEqual(
+            [503] * 4, [attempt.attributes["http.status_code"] for attempt in attempts]
+        )
+        self.assertEqual(["error"] * 4, [attempt.status for attempt in attempts])
+        self.assertEqual({index.span_id}, {attempt.parent_id for attempt in attempts})
+        self.assertEqual("error", index.status)
+
+    def test_no_trace_headers_without_span(self):
+        configure_tracing(None)
+        perform_request = Urllib3HttpConnection.perform_request
+        with patch.object(
+            Urllib3HttpConnection,
+            "perform_request",
+            autospec=True,
+            side_effect=perform_request,
+        ) as perform_request_mock:
+            self.mapper.get_gazettes(territory_id="4205902")
+        headers = perform_request_mock.call_args.args[-1]
+        self.assertNotIn("traceparent", headers or {})
+        self.assertNotIn("x-opaque-id", headers or {})
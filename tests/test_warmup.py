@@ -0,0 +1,185 @@
+from datetime import date
+from unittest import TestCase
+from unittest.mock import MagicMock
+import json
+import os
+import tempfile
+import threading
+
+from fastapi.testclient import TestClient
+
+from api import WarmUp, app, configure_api_app, read_warm_up_queries, start_warm_up
+from api.warmup import parse_request, save_top_queries
+from gazettes import GazetteAccessInterface
+from monitoring import QueryStatistics
+
+GAZETTE = {
+    "territory_id": "4205902",
+    "date": date(2021, 1, 1),
+    "url": "https://queridodiario.ok.org.br/1",
+    "territory_name": "My city",
+    "state_code": "My state",
+    "highlight_texts": ["test"],
+}
+
+
+class WarmUpQueriesTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write_entries(self, name, entries):
+        file_name = os.path.join(self.directory, name)
+        with open(file_name, "w") as entries_file:
+            for entry in entries:
+                entries_file.write(json.dumps(entry) + "\n")
+        return file_name
+
+    def test_parse_request(self):
+        request = parse_request(
+            {
+                "territory_id": "4205902",
+                "since": "2021-01-01",
+                "until": None,
+                "keywords": ["saúde"],
+                "size": 100,
+                "page": 1,
+            }
+        )
+        self.assertEqual("4205902", request.territory_id)
+        self.assertEqual(date(2021, 1, 1), request.since)
+        self.assertIsNone(request.until)
+        self.assertEqual(["saúde"], request.keywords)
+        self.assertEqual(100, request.size)
+        self.assertEqual(0, request.offset)
+
+    def test_most_frequent_queries_first(self):
+        query_log = self.write_entries(
+            "queries.ndjson",
+            [
+                {"request": {"keywords": ["a"]}, "query": {}, "elapsed_ms": 1},
+                {"request": {"keywords": ["b"]}, "query": {}, "elapsed_ms": 1},
+                {"request": {"keywords": ["b"]}, "query": {}, "elapsed_ms": 1},
+            ],
+        )
+        top_queries = self.write_entries(
+            "top-queries.ndjson",
+            [
+                {"request": {"keywords": ["c"]}, "count": 10},
+                {"request": {"keywords": ["a"]}, "count": 2},
+            ],
+        )
+        missing = os.path.join(self.directory, "missing.ndjson")
+        queries = read_warm_up_queries([query_log, "", missing, top_queries], 2)
+        self.assertEqual([["c"], ["a"]], [query.keywords for query in queries])
+
+    def test_save_top_queries(self):
+        statistics = QueryStatistics()
+        request = {"territory_id": "4205902", "since": date(2021, 1, 1), "size": 10}
+        for _ in range(3):
+            statistics.record(request)
+        statistics.record({"keywords": ["saúde"]})
+        file_name = os.path.join(self.directory, "top-queries.ndjson")
+        save_top_queries(file_name, statistics)
+        first, second = read_warm_up_queries([file_name], 10)
+        self.assertEqual("4205902", first.territory_id)
+        self.assertEqual(date(2021, 1, 1), first.since)
+        self.assertEqual(["saúde"], second.keywords)
+        self.assertEqual([file_name.rsplit("/", 1)[-1]], os.listdir(self.directory))
+
+
+class WarmUpTests(TestCase):
+    def test_ready_without_queries(self):
+        warm_up = WarmUp()
+        self.assertTrue(warm_up.ready)
+        self.assertEqual("done", warm_up.status())
+
+    def test_run_every_query(self):
+        warm_up_query = MagicMock(side_effect=[None, Exception("Failure"), None])
+        warm_up = WarmUp([1, 2, 3], warm_up_query)
+        self.assertFalse(warm_up.ready)
+        self.assertEqual("pending", warm_up.status())
+        with self.assertLogs(level="ERROR"):
+            warm_up.start()
+            self.assertTrue(warm_up.wait(5))
+        self.assertTrue(warm_up.ready)
+        self.assertEqual("done", warm_up.status())
+        self.assertEqual(2, warm_up.warmed)
+        self.assertEqual(1, warm_up.failed)
+        self.assertEqual(3, warm_up_query.call_count)
+
+    def test_ready_when_the_budget_runs_out(self):
+        release = threading.Event()
+        warm_up = WarmUp([1, 2], lambda query: release.wait(5), budget=0.05)
+        with self.assertLogs(level="WARNING"):
+            warm_up.start()
+            self.assertFalse(warm_up.wait(0.1))
+            self.assertTrue(warm_up.ready)
+            self.assertEqual("timed_out", warm_up.status())
+            release.set()
+            self.assertTrue(warm_up.wait(5))
+        self.assertEqual("timed_out", warm_up.status())
+        self.assertEqual(1, warm_up.warmed)
+
+
+class ApiWarmUpTests(TestCase):
+    def create_interface(self):
+        interface = MagicMock(spec=GazetteAccessInterface)
+        interface.get_gazettes.return_value = (1, [GAZETTE])
+        interface.get_gazettes_version.return_value = "1-2021-01-01"
+        interface.get_health.return_value = {
+            "index": {"status": "green", "index_exists": True},
+            "database": {"cities": 5570},
+        }
+        return interface
+
+    def test_warm_up_fills_the_response_cache(self):
+        interface = self.create_interface()
+        configure_api_app(interface)
+        query = parse_request({"territory_id": "4205902", "keywords": ["saúde"]})
+        self.assertTrue(start_warm_up([query, query], 10).wait(5))
+        self.assertEqual(1, interface.get_gazettes.call_count)
+        self.assertEqual(1, len(app.response_cache))
+        client = TestClient(app)
+        response = client.get(
+            "/gazettes/4205902?keywords=saúde", headers={"Accept-Encoding": "gzip"}
+        )
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, response.json()["total_gazettes"])
+        self.assertEqual(1, interface.get_gazettes.call_count)
+
+    def test_ready_after_the_warm_up(self):
+        configure_api_app(self.create_interface())
+        app.health.refresh()
+        client = TestClient(app)
+        response = client.get("/ready")
+        self.assertEqual(200, response.status_code)
+        self.assertEqual("ready", response.json()["status"])
+        self.assertEqual("no-store", response.headers["Cache-Control"])
+        release = threading.Event()
+        app.warm_up = WarmUp([1], lambda query: release.wait(5))
+        app.warm_up.start()
+        response = client.get("/ready")
+        self.assertEqual(503, response.status_code)
+        content = response.json()
+        self.assertEqual("not_ready", content["status"])
+        self.assertFalse(content["checks"]["warm_up"])
+        self.assertTrue(content["checks"]["elasticsearch"])
+        self.assertEqual(
+            {"status": "running", "queries": 1, "warmed": 0, "failed": 0},
+            content["warm_up"],
+        )
+        release.set()
+        app.warm_up.wait(5)
+        self.assertEqual(200, client.get("/ready").status_code)
+
+    def test_top_queries_are_saved_at_the_shutdown(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file_name = os.path.join(directory, "top-queries.ndjson")
+            configure_api_app(self.create_interface(), top_queries_file=file_name)
+            with TestClient(app) as client:
+                client.get("/gazettes/4205902?keywords=saúde")
+            (query,) = read_warm_up_queries([file_name], 10)
+        self.assertEqual("4205902", query.territory_id)
+        self.assertEqual(["saúde"], query.keywords)